@@ -3,20 +3,21 @@ from __future__ import annotations
 from decimal import Decimal, InvalidOperation
 from datetime import timedelta
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Callable, Mapping, NamedTuple
 
 from django.conf import settings
 from django.contrib.auth.views import redirect_to_login
-from django.db import transaction
-from django.db.models import Q
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 from django.urls import reverse
 from django.utils import timezone
 
+from .assinaturas import get_assinatura_atual
 from .auditoria import log_event
+from .contador_uso import get_contador_uso
+from .matriz_acesso import RegraApp, get_matriz_acesso
 from .meta_capi import send_meta_event
-from .models import AppModulo, Assinatura, OfertaUpgradeUsuario, Plano, PlanoPermissaoApp, UsoAppJanela
+from .models import Assinatura, OfertaUpgradeUsuario, Plano
 
 
 UPGRADE_PLAN_NAME = "Aprova DETRAN"
@@ -28,14 +29,7 @@ UPGRADE_PROMO_DISCOUNT_PERCENT = 50
 def get_assinatura_ativa(user) -> Assinatura | None:
     if not getattr(user, "is_authenticated", False):
         return None
-
-    now = timezone.now()
-    return (
-        Assinatura.objects.filter(usuario=user, status=Assinatura.Status.ATIVO)
-        .filter(Q(valid_until__isnull=True) | Q(valid_until__gte=now))
-        .order_by("-inicio", "-criado_em")
-        .first()
-    )
+    return get_assinatura_atual(user)
 
 
 def is_upgrade_pix_eligible(assinatura: Assinatura | None) -> bool:
@@ -51,18 +45,55 @@ def is_upgrade_pix_eligible(assinatura: Assinatura | None) -> bool:
     return bool(plano.permite_upgrade_pix)
 
 
-def get_regra_app(assinatura: Assinatura | None, app_slug: str) -> PlanoPermissaoApp | None:
+def get_regra_app(assinatura: Assinatura | None, app_slug: str) -> RegraApp | None:
     if not assinatura or not assinatura.plano_id:
         return None
-    return (
-        PlanoPermissaoApp.objects.select_related("plano", "app_modulo")
-        .filter(
-            plano_id=assinatura.plano_id,
-            app_modulo__slug=app_slug,
-            app_modulo__ativo=True,
-        )
-        .first()
-    )
+    return get_matriz_acesso().regra(assinatura.plano_id, app_slug)
+
+
+class AccessContext:
+    """
+    Assinatura ativa e regras de acesso do usuario, carregadas sob demanda e uma unica
+    vez. Use get_access_context(request) para compartilhar a mesma instancia entre o
+    decorator, as views e os helpers de status durante a requisicao. As regras vem da
+    matriz de permissoes do processo (sem SQL).
+    """
+
+    _NAO_CARREGADA = object()
+
+    def __init__(self, user) -> None:
+        self.user = user
+        self._assinatura = self._NAO_CARREGADA
+        self._regras: Mapping[str, RegraApp] | None = None
+
+    @property
+    def assinatura(self) -> Assinatura | None:
+        if self._assinatura is self._NAO_CARREGADA:
+            self._assinatura = get_assinatura_ativa(self.user)
+        return self._assinatura
+
+    @property
+    def regras(self) -> Mapping[str, RegraApp]:
+        """Regras do plano para os apps ativos, por slug."""
+        if self._regras is None:
+            assinatura = self.assinatura
+            if not assinatura or not assinatura.plano_id:
+                self._regras = {}
+            else:
+                self._regras = get_matriz_acesso().regras_do_plano(assinatura.plano_id)
+        return self._regras
+
+    def regra(self, app_slug: str) -> RegraApp | None:
+        return self.regras.get(app_slug)
+
+
+def get_access_context(request: HttpRequest) -> AccessContext:
+    access = getattr(request, "_access_context", None)
+    # Login/logout no meio da requisicao troca request.user: recomeca o contexto.
+    if access is None or access.user is not request.user:
+        access = AccessContext(request.user)
+        request._access_context = access
+    return access
 
 
 def _get_period_seconds(periodo: str | None) -> int | None:
@@ -112,35 +143,51 @@ def _get_upgrade_plan() -> Plano | None:
     return Plano.objects.filter(nome__iexact=UPGRADE_PLAN_NAME, ativo=True).only("preco").first()
 
 
-def _get_or_rotate_upgrade_offer(user) -> OfertaUpgradeUsuario | None:
+class JanelaOferta(NamedTuple):
+    ciclo: int
+    janela_inicio: timezone.datetime
+    janela_fim: timezone.datetime
+
+
+def calcular_janela_oferta(oferta: OfertaUpgradeUsuario, now: timezone.datetime) -> JanelaOferta:
+    """
+    Janela atual da oferta, sem gravar nada: a partir da janela registrada, cada
+    UPGRADE_PROMO_WINDOW_HOURS completas abrem um ciclo novo.
+    """
+    periodo = timedelta(hours=UPGRADE_PROMO_WINDOW_HOURS)
+    passados = max((now - oferta.janela_inicio) // periodo, 0)
+    janela_inicio = oferta.janela_inicio + passados * periodo
+    return JanelaOferta(
+        ciclo=oferta.ciclo + passados,
+        janela_inicio=janela_inicio,
+        janela_fim=janela_inicio + periodo,
+    )
+
+
+def _get_upgrade_offer_window(user) -> JanelaOferta | None:
+    # Pagina de bloqueio e so leitura: a linha e criada uma vez (ancora) e o ciclo
+    # atual sai da aritmetica, sem lock nem UPDATE a cada render.
     if not getattr(user, "is_authenticated", False):
         return None
 
     now = timezone.now()
-    janela_delta = timedelta(hours=UPGRADE_PROMO_WINDOW_HOURS)
-    with transaction.atomic():
-        oferta = (
-            OfertaUpgradeUsuario.objects
-            .select_for_update()
-            .filter(usuario=user, campanha_slug=UPGRADE_PROMO_CAMPAIGN_SLUG)
-            .first()
+    oferta = (
+        OfertaUpgradeUsuario.objects
+        .filter(usuario=user, campanha_slug=UPGRADE_PROMO_CAMPAIGN_SLUG)
+        .only("ciclo", "janela_inicio")
+        .first()
+    )
+    if oferta is None:
+        oferta, _ = OfertaUpgradeUsuario.objects.get_or_create(
+            usuario=user,
+            campanha_slug=UPGRADE_PROMO_CAMPAIGN_SLUG,
+            defaults={
+                "ciclo": 1,
+                "janela_inicio": now,
+                "janela_fim": now + timedelta(hours=UPGRADE_PROMO_WINDOW_HOURS),
+            },
         )
-        if not oferta:
-            oferta = OfertaUpgradeUsuario.objects.create(
-                usuario=user,
-                campanha_slug=UPGRADE_PROMO_CAMPAIGN_SLUG,
-                ciclo=1,
-                janela_inicio=now,
-                janela_fim=now + janela_delta,
-            )
-            return oferta
-
-        if now >= oferta.janela_fim:
-            oferta.ciclo += 1
-            oferta.janela_inicio = now
-            oferta.janela_fim = now + janela_delta
-            oferta.save(update_fields=["ciclo", "janela_inicio", "janela_fim", "atualizado_em"])
-        return oferta
+    return calcular_janela_oferta(oferta, now)
 
 
 def build_access_blocked_context(
@@ -179,7 +226,7 @@ def build_access_blocked_context(
             upgrade_price_label = _format_brl(plano_upgrade.preco)
             upgrade_price_from_label = _format_brl(plano_upgrade.preco * Decimal("2"))
 
-        oferta = _get_or_rotate_upgrade_offer(user)
+        oferta = _get_upgrade_offer_window(user)
         if oferta:
             promo_ends_at_iso = oferta.janela_fim.isoformat()
             promo_show_new_chance = oferta.ciclo > 1
@@ -226,17 +273,19 @@ def _check_app_use(
     app_slug: str,
     *,
     consume: bool,
+    access: AccessContext | None = None,
 ) -> tuple[bool, str | None, dict[str, Any]]:
     contexto: dict[str, Any] = {"app_slug": app_slug, "consume": consume}
-    assinatura = get_assinatura_ativa(user)
+    access = access or AccessContext(user)
+    assinatura = access.assinatura
     if not assinatura:
         contexto["motivo"] = "assinatura_inativa"
         return False, "Assinatura inativa ou expirada.", contexto
 
     contexto["plano"] = _nome_plano(assinatura)
-    regra = get_regra_app(assinatura, app_slug)
+    regra = access.regra(app_slug)
     if not regra:
-        if AppModulo.objects.filter(slug=app_slug, ativo=True).exists():
+        if get_matriz_acesso().app(app_slug) is not None:
             contexto["motivo"] = "regra_ausente"
             return False, "Regra de acesso nao configurada para seu plano.", contexto
         contexto["motivo"] = "app_ausente"
@@ -270,19 +319,10 @@ def _check_app_use(
 
     janela_inicio, janela_fim = _get_janela_atual(inicio, period_seconds)
 
+    chave = (regra.app_modulo_id, janela_inicio, janela_fim)
+    contadores = get_contador_uso()
     if not consume:
-        uso = (
-            UsoAppJanela.objects
-            .filter(
-                usuario=user,
-                app_modulo=regra.app_modulo,
-                janela_inicio=janela_inicio,
-                janela_fim=janela_fim,
-            )
-            .only("contador")
-            .first()
-        )
-        contador = uso.contador if uso else 0
+        contador = contadores.ler(user.pk, [chave]).get(chave, 0)
         motivo = "limite_atingido_sem_consumo" if contador >= limite else "liberado_sem_consumo"
         contexto.update(
             {
@@ -295,121 +335,61 @@ def _check_app_use(
         )
         return True, None, contexto
 
-    with transaction.atomic():
-        uso, _ = (
-            UsoAppJanela.objects.select_for_update().get_or_create(
-                usuario=user,
-                app_modulo=regra.app_modulo,
-                janela_inicio=janela_inicio,
-                janela_fim=janela_fim,
-                defaults={"contador": 0},
-            )
+    contador = contadores.consumir(user.pk, chave, limite)
+    if contador is None:
+        contexto.update(
+            {
+                "motivo": "limite_atingido",
+                "janela_inicio": janela_inicio.isoformat(),
+                "janela_fim": janela_fim.isoformat(),
+                "contador": contadores.ler(user.pk, [chave]).get(chave, limite),
+            }
         )
-        if uso.contador >= limite:
-            contexto.update(
-                {
-                    "motivo": "limite_atingido",
-                    "janela_inicio": janela_inicio.isoformat(),
-                    "janela_fim": janela_fim.isoformat(),
-                    "contador": uso.contador,
-                }
-            )
-            return False, "Limite de uso atingido para este modulo no periodo atual.", contexto
-
-        uso.contador += 1
-        uso.save(update_fields=["contador", "atualizado_em"])
+        return False, "Limite de uso atingido para este modulo no periodo atual.", contexto
 
     contexto.update(
         {
             "motivo": "liberado_com_limite",
             "janela_inicio": janela_inicio.isoformat(),
             "janela_fim": janela_fim.isoformat(),
-            "contador": uso.contador,
-            "restantes": max(limite - uso.contador, 0),
+            "contador": contador,
+            "restantes": max(limite - contador, 0),
         }
     )
     return True, None, contexto
 
 
-def check_app_use(user, app_slug: str) -> tuple[bool, str | None, dict[str, Any]]:
-    return _check_app_use(user, app_slug, consume=False)
-
-
-def check_and_increment_app_use(user, app_slug: str) -> tuple[bool, str | None, dict[str, Any]]:
-    return _check_app_use(user, app_slug, consume=True)
-
-
-def build_app_access_status(user) -> dict[str, Any]:
-    apps = list(AppModulo.objects.filter(ativo=True).order_by("ordem_menu", "nome"))
-    assinatura = get_assinatura_ativa(user)
-    regras_por_app_id: dict[int, PlanoPermissaoApp] = {}
-
-    if assinatura and assinatura.plano_id:
-        regras_por_app_id = {
-            regra.app_modulo_id: regra
-            for regra in PlanoPermissaoApp.objects.filter(
-                plano_id=assinatura.plano_id,
-                app_modulo__in=apps,
-            ).select_related("app_modulo")
-        }
+def check_app_use(
+    user,
+    app_slug: str,
+    *,
+    access: AccessContext | None = None,
+) -> tuple[bool, str | None, dict[str, Any]]:
+    return _check_app_use(user, app_slug, consume=False, access=access)
 
-    status_apps = []
-    for app in apps:
-        regra = regras_por_app_id.get(app.id)
-        liberado = bool(regra and regra.permitido and assinatura)
-        status_apps.append(
-            {
-                "slug": app.slug,
-                "nome": app.nome,
-                "ordem_menu": app.ordem_menu,
-                "icone_path": app.icone_path,
-                "rota_nome": app.rota_nome,
-                "ativo": app.ativo,
-                "liberado": liberado,
-                "em_construcao": app.em_construcao,
-                "bloqueado_plano": bool(assinatura and regra and not regra.permitido),
-                "regra_ausente": bool(assinatura and not regra),
-            }
-        )
 
-    return {
-        "assinatura_ativa": bool(assinatura),
-        "plano": _nome_plano(assinatura),
-        "apps": status_apps,
-        "por_slug": {item["slug"]: item for item in status_apps},
-    }
+def check_and_increment_app_use(
+    user,
+    app_slug: str,
+    *,
+    access: AccessContext | None = None,
+) -> tuple[bool, str | None, dict[str, Any]]:
+    return _check_app_use(user, app_slug, consume=True, access=access)
 
 
-def build_plan_modal_status(user) -> dict[str, Any]:
-    apps = list(AppModulo.objects.filter(ativo=True).order_by("ordem_menu", "nome"))
-    payload: dict[str, Any] = {
-        "assinatura_ativa": False,
-        "plano_nome": "",
-        "valid_until": None,
-        "apps": [],
-    }
-    if not getattr(user, "is_authenticated", False):
-        return payload
-
-    assinatura = get_assinatura_ativa(user)
-    payload["assinatura_ativa"] = bool(assinatura)
-    payload["plano_nome"] = _nome_plano(assinatura)
-    payload["valid_until"] = assinatura.valid_until if assinatura else None
-
-    regras_por_app_id: dict[int, PlanoPermissaoApp] = {}
-    if assinatura and assinatura.plano_id:
-        regras_por_app_id = {
-            regra.app_modulo_id: regra
-            for regra in PlanoPermissaoApp.objects.filter(
-                plano_id=assinatura.plano_id,
-                app_modulo__in=apps,
-            ).select_related("app_modulo")
-        }
+def _itens_status_apps(user, access: AccessContext, *, com_usos: bool) -> list[dict[str, Any]]:
+    """
+    Uma entrada por app ativo com status, regra, janela atual e (com `com_usos`) o
+    contador da janela. Apps e regras vem da matriz do processo; os contadores de
+    todos os apps saem de uma unica leitura no backend de contadores.
+    """
+    assinatura = access.assinatura
+    regras_por_app_id = {regra.app_modulo_id: regra for regra in access.regras.values()}
 
-    status_apps: list[dict[str, Any]] = []
+    itens: list[dict[str, Any]] = []
     uso_targets: list[tuple[int, timezone.datetime, timezone.datetime]] = []
 
-    for app in apps:
+    for app in get_matriz_acesso().apps:
         regra = regras_por_app_id.get(app.id)
         liberado = bool(assinatura and regra and regra.permitido)
         bloqueado_plano = bool(assinatura and regra and not regra.permitido)
@@ -433,13 +413,17 @@ def build_plan_modal_status(user) -> dict[str, Any]:
 
         limite_qtd = regra.limite_qtd if regra else None
         limite_periodo = regra.limite_periodo if regra else None
-        limite_periodo_label = regra.get_limite_periodo_display() if regra and limite_periodo else ""
+        limite_periodo_label = regra.limite_periodo_label if regra else ""
         show_limite = bool(liberado and limite_qtd is not None)
 
         item: dict[str, Any] = {
             "app_id": app.id,
             "slug": app.slug,
             "nome": app.nome,
+            "ordem_menu": app.ordem_menu,
+            "icone_path": app.icone_path,
+            "rota_nome": app.rota_nome,
+            "ativo": app.ativo,
             "status_label": status_label,
             "badge_class": badge_class,
             "liberado": liberado,
@@ -457,7 +441,7 @@ def build_plan_modal_status(user) -> dict[str, Any]:
             "janela_fim": None,
         }
 
-        if show_limite and assinatura and assinatura.inicio and limite_periodo:
+        if com_usos and show_limite and assinatura and assinatura.inicio and limite_periodo:
             period_seconds = _get_period_seconds(limite_periodo)
             if period_seconds:
                 janela_inicio, janela_fim = _get_janela_atual(assinatura.inicio, period_seconds)
@@ -465,23 +449,12 @@ def build_plan_modal_status(user) -> dict[str, Any]:
                 item["janela_fim"] = janela_fim
                 uso_targets.append((app.id, janela_inicio, janela_fim))
 
-        status_apps.append(item)
+        itens.append(item)
 
     if uso_targets:
-        filtros = Q()
-        for app_id, janela_inicio, janela_fim in uso_targets:
-            filtros |= Q(
-                usuario=user,
-                app_modulo_id=app_id,
-                janela_inicio=janela_inicio,
-                janela_fim=janela_fim,
-            )
-        usos_por_chave = {
-            (uso.app_modulo_id, uso.janela_inicio, uso.janela_fim): uso.contador
-            for uso in UsoAppJanela.objects.filter(filtros)
-        }
+        usos_por_chave = get_contador_uso().ler(user.pk, uso_targets)
 
-        for item in status_apps:
+        for item in itens:
             janela_inicio = item["janela_inicio"]
             janela_fim = item["janela_fim"]
             if not (item["show_limite"] and janela_inicio and janela_fim):
@@ -490,25 +463,116 @@ def build_plan_modal_status(user) -> dict[str, Any]:
             item["usos"] = usos
             item["restantes"] = max(item["limite_qtd"] - usos, 0)
 
-    for item in status_apps:
-        item.pop("app_id", None)
+    return itens
+
+
+_CAMPOS_STATUS_ACESSO = (
+    "slug",
+    "nome",
+    "ordem_menu",
+    "icone_path",
+    "rota_nome",
+    "ativo",
+    "liberado",
+    "em_construcao",
+    "bloqueado_plano",
+    "regra_ausente",
+)
+_CAMPOS_STATUS_MODAL = (
+    "slug",
+    "nome",
+    "status_label",
+    "badge_class",
+    "liberado",
+    "em_construcao",
+    "bloqueado_plano",
+    "regra_ausente",
+    "ilimitado",
+    "show_limite",
+    "limite_qtd",
+    "limite_periodo",
+    "limite_periodo_label",
+    "usos",
+    "restantes",
+    "janela_inicio",
+    "janela_fim",
+)
+
+
+def _payload_status_acesso(access: AccessContext, itens: list[dict[str, Any]]) -> dict[str, Any]:
+    status_apps = [{campo: item[campo] for campo in _CAMPOS_STATUS_ACESSO} for item in itens]
+    return {
+        "assinatura_ativa": bool(access.assinatura),
+        "plano": _nome_plano(access.assinatura),
+        "apps": status_apps,
+        "por_slug": {item["slug"]: item for item in status_apps},
+    }
 
-    payload["apps"] = status_apps
-    return payload
 
+def _payload_plan_modal(access: AccessContext, itens: list[dict[str, Any]]) -> dict[str, Any]:
+    assinatura = access.assinatura
+    return {
+        "assinatura_ativa": bool(assinatura),
+        "plano_nome": _nome_plano(assinatura),
+        "valid_until": assinatura.valid_until if assinatura else None,
+        "apps": [{campo: item[campo] for campo in _CAMPOS_STATUS_MODAL} for item in itens],
+    }
+
+
+def _payload_plan_modal_vazio() -> dict[str, Any]:
+    return {
+        "assinatura_ativa": False,
+        "plano_nome": "",
+        "valid_until": None,
+        "apps": [],
+    }
+
+
+def build_app_access_status(user, *, access: AccessContext | None = None) -> dict[str, Any]:
+    access = access or AccessContext(user)
+    return _payload_status_acesso(access, _itens_status_apps(user, access, com_usos=False))
 
-def build_plan_status_for_app(user, app_slug: str) -> dict[str, Any] | None:
+
+def build_plan_modal_status(user, *, access: AccessContext | None = None) -> dict[str, Any]:
+    if not getattr(user, "is_authenticated", False):
+        return _payload_plan_modal_vazio()
+    access = access or AccessContext(user)
+    return _payload_plan_modal(access, _itens_status_apps(user, access, com_usos=True))
+
+
+def build_menu_snapshot(user, *, access: AccessContext | None = None) -> dict[str, Any]:
+    """
+    Status dos cards e do modal "Meu plano" da home numa unica passada: assinatura,
+    matriz de apps/regras e contadores de uso -- no maximo tres queries (a matriz so
+    consulta o banco quando e remontada).
+    """
+    access = access or AccessContext(user)
+    itens = _itens_status_apps(user, access, com_usos=True)
+    autenticado = getattr(user, "is_authenticated", False)
+    return {
+        "acesso": _payload_status_acesso(access, itens),
+        "plano_modal": _payload_plan_modal(access, itens) if autenticado else _payload_plan_modal_vazio(),
+    }
+
+
+def build_plan_status_for_app(
+    user,
+    app_slug: str,
+    *,
+    access: AccessContext | None = None,
+) -> dict[str, Any] | None:
     if not getattr(user, "is_authenticated", False):
         return None
 
-    assinatura = get_assinatura_ativa(user)
+    access = access or AccessContext(user)
+    assinatura = access.assinatura
     if not assinatura:
         return {"ativo": False, "upgrade_pix_eligible": False}
 
     nome_plano = _nome_plano(assinatura) or "Plano"
     is_free = nome_plano.strip().lower() == "free"
     upgrade_pix_eligible = is_upgrade_pix_eligible(assinatura)
-    regra = get_regra_app(assinatura, app_slug)
+    regra = access.regra(app_slug)
     if not regra:
         return {
             "ativo": True,
@@ -535,7 +599,7 @@ def build_plan_status_for_app(user, app_slug: str) -> dict[str, Any] | None:
             "upgrade_pix_eligible": upgrade_pix_eligible,
             "limite_qtd": regra.limite_qtd,
             "limite_periodo": regra.limite_periodo,
-            "limite_periodo_label": regra.get_limite_periodo_display() if regra.limite_periodo else "",
+            "limite_periodo_label": regra.limite_periodo_label,
             "ilimitado": False,
             "usos": 0,
             "restantes": 0,
@@ -552,7 +616,7 @@ def build_plan_status_for_app(user, app_slug: str) -> dict[str, Any] | None:
     restantes = None
     janela_inicio = None
     janela_fim = None
-    periodo_label = regra.get_limite_periodo_display() if periodo else ""
+    periodo_label = regra.limite_periodo_label
 
     if not ilimitado and periodo:
         period_seconds = _get_period_seconds(periodo)
@@ -560,17 +624,8 @@ def build_plan_status_for_app(user, app_slug: str) -> dict[str, Any] | None:
             inicio = assinatura.inicio
             if inicio:
                 janela_inicio, janela_fim = _get_janela_atual(inicio, period_seconds)
-                uso = (
-                    UsoAppJanela.objects
-                    .filter(
-                        usuario=user,
-                        app_modulo=regra.app_modulo,
-                        janela_inicio=janela_inicio,
-                        janela_fim=janela_fim,
-                    )
-                    .first()
-                )
-                usos = uso.contador if uso else 0
+                chave = (regra.app_modulo_id, janela_inicio, janela_fim)
+                usos = get_contador_uso().ler(user.pk, [chave]).get(chave, 0)
                 restantes = max(limite - usos, 0)
             else:
                 usos = 0
@@ -604,15 +659,16 @@ def require_app_access(app_slug: str, *, consume: bool = True) -> Callable:
             if not getattr(settings, "APP_ACCESS_V2_ENABLED", False):
                 return view_func(request, *args, **kwargs)
 
+            access = get_access_context(request)
             if consume:
-                allowed, reason, contexto = check_and_increment_app_use(request.user, app_slug)
+                allowed, reason, contexto = check_and_increment_app_use(request.user, app_slug, access=access)
             else:
-                allowed, reason, contexto = check_app_use(request.user, app_slug)
+                allowed, reason, contexto = check_app_use(request.user, app_slug, access=access)
             if allowed:
                 log_event(request, "app_access_granted", user=request.user, contexto=contexto)
                 return view_func(request, *args, **kwargs)
 
-            assinatura = get_assinatura_ativa(request.user)
+            assinatura = access.assinatura
             plano_nome = _nome_plano(assinatura)
             show_upgrade_cta = is_upgrade_pix_eligible(assinatura)
             upgrade_url = reverse("payments:upgrade_free") if show_upgrade_cta else ""
@@ -20,6 +20,7 @@ from .models import (
     Plano,
     PlanoPermissaoApp,
     Questao,
+    ResumoAuditoriaDiario,
     SimuladoUso,
     UsoAppJanela,
 )
@@ -226,3 +227,23 @@ class EventoAuditoriaAdmin(admin.ModelAdmin):
     search_fields = ("usuario__email", "usuario__username", "tipo", "device_id")
     list_select_related = ("usuario",)
     date_hierarchy = "timestamp"
+
+
+@admin.register(ResumoAuditoriaDiario)
+class ResumoAuditoriaDiarioAdmin(admin.ModelAdmin):
+    """Relatorio somente leitura; os totais vem do comando resumir_auditoria."""
+
+    list_display = ("dia", "tipo", "app_slug", "plano", "motivo", "total")
+    list_filter = ("tipo", "app_slug", "plano", "motivo")
+    search_fields = ("tipo", "app_slug", "plano", "motivo")
+    date_hierarchy = "dia"
+    list_per_page = 200
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BancoQuestoesConfig(AppConfig):
     name = 'banco_questoes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
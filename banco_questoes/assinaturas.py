@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Assinatura, AssinaturaAtual
+
+
+def buscar_assinatura_vigente(usuario_id) -> Assinatura | None:
+    """Consulta completa: assinatura ATIVO mais recente e ainda dentro da validade."""
+    # Com as vencidas ja varridas pelo expirar_assinaturas, a primeira ATIVO do
+    # indice parcial bq_assin_ativa_user_ini_idx e a resposta. Se o sweeper ainda
+    # nao passou por ela, refaz a consulta com o filtro de validade.
+    now = timezone.now()
+    ativas = (
+        Assinatura.objects.filter(usuario_id=usuario_id, status=Assinatura.Status.ATIVO)
+        .select_related("plano")
+        .order_by("-inicio", "-criado_em")
+    )
+    assinatura = ativas.first()
+    if assinatura and assinatura.valid_until and assinatura.valid_until < now:
+        assinatura = ativas.filter(Q(valid_until__isnull=True) | Q(valid_until__gte=now)).first()
+    return assinatura
+
+
+def atualizar_assinatura_atual(usuario_id) -> Assinatura | None:
+    """Recalcula e grava o ponteiro do usuario (um upsert)."""
+    assinatura = buscar_assinatura_vigente(usuario_id)
+    AssinaturaAtual.objects.bulk_create(
+        [AssinaturaAtual(usuario_id=usuario_id, assinatura=assinatura)],
+        update_conflicts=True,
+        unique_fields=["usuario"],
+        update_fields=["assinatura", "atualizado_em"],
+    )
+    return assinatura
+
+
+def atualizar_assinaturas_atuais(usuario_ids: Iterable) -> int:
+    total = 0
+    for usuario_id in set(usuario_ids):
+        atualizar_assinatura_atual(usuario_id)
+        total += 1
+    return total
+
+
+def _vigente(assinatura: Assinatura, now) -> bool:
+    return assinatura.status == Assinatura.Status.ATIVO and (
+        assinatura.valid_until is None or assinatura.valid_until >= now
+    )
+
+
+def get_assinatura_atual(user) -> Assinatura | None:
+    """
+    Assinatura vigente pelo ponteiro AssinaturaAtual: uma busca por chave primaria
+    (com assinatura e plano no mesmo JOIN). Sem ponteiro (usuario antigo) ele e
+    criado aqui; ponteiro vencido e ainda nao varrido cai na consulta completa.
+    """
+    atual = (
+        AssinaturaAtual.objects
+        .select_related("assinatura__plano")
+        .filter(usuario_id=user.pk)
+        .first()
+    )
+    if atual is None:
+        return atualizar_assinatura_atual(user.pk)
+    assinatura = atual.assinatura
+    if assinatura is not None and not _vigente(assinatura, timezone.now()):
+        return buscar_assinatura_vigente(user.pk)
+    return assinatura
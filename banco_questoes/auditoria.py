@@ -1,13 +1,119 @@
 from __future__ import annotations
 
-from typing import Any
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
 
+from django.conf import settings
 from django.http import HttpRequest
 
 from .models import EventoAuditoria
 
 
 DEVICE_COOKIE_NAME = "device_id"
+AUDIT_BUFFER_ATTR = "_auditoria_buffer"
+
+# Tipos gravados na hora mesmo com o buffer ativo: eventos de autenticacao,
+# seguranca e pagamento nao podem se perder se o worker cair antes do fim da resposta.
+AUDIT_SYNC_EVENT_TYPES_PADRAO = frozenset(
+    {
+        "auth_login",
+        "auth_logout",
+        "auth_register",
+        "auth_register_blocked",
+        "assinatura_renovada",
+        "plano_preco_atualizado",
+        "webhook_billing_paid",
+        "pix_check_pago",
+    }
+)
+
+
+# Politica por tipo (AUDIT_EVENT_POLICIES): "always", "never", "sample:N" (grava 1 em
+# N, com `amostra_1_em` no contexto) ou "first_per_window:SEGUNDOS" (primeiro evento
+# por usuario e app na janela). Tipos sem politica sao sempre gravados.
+AUDIT_EVENT_POLICIES_PADRAO = {
+    "app_access_granted": "first_per_window:300",
+}
+# Chaves (tipo, usuario, app) lembradas por processo para o first_per_window.
+AUDIT_DEDUPE_MAX_CHAVES = 10000
+
+
+class PoliticaEvento(NamedTuple):
+    modo: str
+    valor: int = 0
+
+
+_SEMPRE = PoliticaEvento("always")
+
+
+def _parse_politica(texto: str) -> PoliticaEvento:
+    modo, _, valor = str(texto or "").strip().partition(":")
+    if modo in ("always", "never"):
+        return PoliticaEvento(modo)
+    if modo in ("sample", "first_per_window"):
+        try:
+            numero = int(valor)
+        except ValueError:
+            numero = 0
+        if numero > 1 or (modo == "first_per_window" and numero > 0):
+            return PoliticaEvento(modo, numero)
+    # Politica invalida nao pode derrubar a requisicao nem esconder eventos.
+    return _SEMPRE
+
+
+def politica_evento(tipo: str) -> PoliticaEvento:
+    politicas = getattr(settings, "AUDIT_EVENT_POLICIES", None)
+    if politicas is None:
+        politicas = AUDIT_EVENT_POLICIES_PADRAO
+    texto = politicas.get(tipo)
+    return _SEMPRE if texto is None else _parse_politica(texto)
+
+
+class _JanelaRecente:
+    """LRU em memoria de chave -> instante do ultimo evento gravado."""
+
+    def __init__(self, max_chaves: int) -> None:
+        self.max_chaves = max_chaves
+        self.lock = threading.Lock()
+        self.chaves: OrderedDict[tuple, float] = OrderedDict()
+
+    def primeiro_na_janela(self, chave: tuple, janela: int) -> bool:
+        agora = time.monotonic()
+        with self.lock:
+            ultimo = self.chaves.get(chave)
+            if ultimo is not None and agora - ultimo < janela:
+                self.chaves.move_to_end(chave)
+                return False
+            self.chaves[chave] = agora
+            self.chaves.move_to_end(chave)
+            while len(self.chaves) > self.max_chaves:
+                self.chaves.popitem(last=False)
+            return True
+
+    def limpar(self) -> None:
+        with self.lock:
+            self.chaves.clear()
+
+
+_janela_recente = _JanelaRecente(AUDIT_DEDUPE_MAX_CHAVES)
+
+
+def _deve_gravar(request: HttpRequest, tipo: str, user, contexto: dict[str, Any]) -> bool:
+    politica = politica_evento(tipo)
+    if politica.modo == "always":
+        return True
+    if politica.modo == "never":
+        return False
+    if politica.modo == "sample":
+        if random.randrange(politica.valor):
+            return False
+        contexto["amostra_1_em"] = politica.valor
+        return True
+    usuario = getattr(user, "pk", None) or get_device_id(request) or get_client_ip(request)
+    return _janela_recente.primeiro_na_janela((tipo, usuario, contexto.get("app_slug")), politica.valor)
 
 
 def get_client_ip(request: HttpRequest) -> str:
@@ -18,6 +124,11 @@ def get_device_id(request: HttpRequest) -> str:
     return (request.COOKIES.get(DEVICE_COOKIE_NAME) or "").strip()
 
 
+def _tipos_sincronos() -> frozenset[str]:
+    tipos = getattr(settings, "AUDIT_SYNC_EVENT_TYPES", None)
+    return AUDIT_SYNC_EVENT_TYPES_PADRAO if tipos is None else frozenset(tipos)
+
+
 def log_event(
     request: HttpRequest,
     tipo: str,
@@ -27,10 +138,36 @@ def log_event(
     ip: str | None = None,
     device_id: str | None = None,
 ) -> None:
-    EventoAuditoria.objects.create(
+    """
+    Registra um evento de auditoria. Dentro de uma requisicao com o
+    AuditoriaBufferMiddleware o evento vai para o buffer da requisicao e e gravado
+    num unico bulk_create no fim da resposta; tipos em AUDIT_SYNC_EVENT_TYPES (e
+    chamadas fora de requisicao) sao gravados na hora. Eventos que a politica do
+    tipo (AUDIT_EVENT_POLICIES) descarta nem chegam a ser montados.
+    """
+    contexto = dict(contexto or {})
+    if not _deve_gravar(request, tipo, user, contexto):
+        return
+    evento = EventoAuditoria(
         tipo=tipo,
         usuario=user,
         ip=(ip or get_client_ip(request)) or None,
         device_id=(device_id or get_device_id(request)),
-        contexto_json=contexto or {},
+        contexto_json=contexto,
     )
+    buffer = getattr(request, AUDIT_BUFFER_ATTR, None)
+    if buffer is None or tipo in _tipos_sincronos():
+        evento.save()
+        return
+    buffer.append(evento)
+
+
+def descarregar_eventos(request: HttpRequest) -> int:
+    buffer = getattr(request, AUDIT_BUFFER_ATTR, None)
+    if not buffer:
+        return 0
+    eventos = list(buffer)
+    buffer.clear()
+    EventoAuditoria.objects.bulk_create(eventos)
+    return len(eventos)
+
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone as dt_timezone
+from typing import NamedTuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import EventoAuditoria
+
+
+# Particoes mensais (meses UTC): <tabela>_pYYYYMM, criadas a frente pelo
+# criar_particoes_auditoria.
+PARTICAO_SUFIXO = "_p"
+MESES_A_FRENTE_PADRAO = 3
+
+_LIMITES_RE = re.compile(r"FROM \((?:'([^']+)'|MINVALUE)\) TO \((?:'([^']+)'|MAXVALUE)\)")
+
+
+class ParticaoAuditoria(NamedTuple):
+    nome: str
+    # Limites [de, ate); None quando aberto (MINVALUE/MAXVALUE) ou na particao DEFAULT.
+    de: datetime | None
+    ate: datetime | None
+    padrao: bool = False
+
+
+def _tabela() -> str:
+    return EventoAuditoria._meta.db_table
+
+
+def inicio_mes(momento: datetime) -> datetime:
+    momento = momento.astimezone(dt_timezone.utc)
+    return datetime(momento.year, momento.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _mes_seguinte(mes: datetime) -> datetime:
+    return mes.replace(year=mes.year + mes.month // 12, month=mes.month % 12 + 1)
+
+
+def nome_particao(mes: datetime) -> str:
+    return f"{_tabela()}{PARTICAO_SUFIXO}{mes:%Y%m}"
+
+
+def particionado() -> bool:
+    """True quando a tabela de eventos e particionada (so no PostgreSQL, depois da 0015)."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = current_schema() AND c.relname = %s",
+            [_tabela()],
+        )
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def _limite(texto: str | None) -> datetime | None:
+    if not texto:
+        return None
+    momento = datetime.fromisoformat(texto)
+    return timezone.make_aware(momento, dt_timezone.utc) if timezone.is_naive(momento) else momento
+
+
+def listar_particoes() -> list[ParticaoAuditoria]:
+    if not particionado():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "JOIN pg_namespace n ON n.oid = p.relnamespace "
+            "WHERE n.nspname = current_schema() AND p.relname = %s "
+            "ORDER BY c.relname",
+            [_tabela()],
+        )
+        linhas = cursor.fetchall()
+    particoes = []
+    for nome, limites in linhas:
+        if (limites or "").strip() == "DEFAULT":
+            particoes.append(ParticaoAuditoria(nome=nome, de=None, ate=None, padrao=True))
+            continue
+        match = _LIMITES_RE.search(limites or "")
+        de, ate = (match.group(1), match.group(2)) if match else (None, None)
+        particoes.append(ParticaoAuditoria(nome=nome, de=_limite(de), ate=_limite(ate)))
+    return particoes
+
+
+def _coberto(particoes: list[ParticaoAuditoria], inicio: datetime, fim: datetime) -> bool:
+    # Algum intervalo [de, ate) ja se sobrepoe ao mes (ex.: a particao legado da 0015).
+    for particao in particoes:
+        if particao.padrao:
+            continue
+        if (particao.de is None or particao.de < fim) and (particao.ate is None or particao.ate > inicio):
+            return True
+    return False
+
+
+def _criar_particao(nome: str, inicio: datetime, fim: datetime, padrao: str | None) -> None:
+    qn = connection.ops.quote_name
+    tabela = qn(_tabela())
+    ts = qn("timestamp")
+    with transaction.atomic(), connection.cursor() as cursor:
+        linhas_na_padrao = False
+        if padrao:
+            cursor.execute(f"SELECT 1 FROM {qn(padrao)} WHERE {ts} >= %s AND {ts} < %s LIMIT 1", [inicio, fim])
+            linhas_na_padrao = cursor.fetchone() is not None
+        if not linhas_na_padrao:
+            cursor.execute(
+                f"CREATE TABLE {qn(nome)} PARTITION OF {tabela} FOR VALUES FROM (%s) TO (%s)",
+                [inicio, fim],
+            )
+            return
+        # Eventos do mes ja cairam na DEFAULT (particao criada atrasada): o CREATE ...
+        # PARTITION OF falharia. Cria a tabela solta, move as linhas e anexa; tudo na
+        # mesma transacao.
+        cursor.execute(f"CREATE TABLE {qn(nome)} (LIKE {tabela} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH movidos AS (DELETE FROM {qn(padrao)} WHERE {ts} >= %s AND {ts} < %s RETURNING *) "
+            f"INSERT INTO {qn(nome)} SELECT * FROM movidos",
+            [inicio, fim],
+        )
+        cursor.execute(
+            f"ALTER TABLE {tabela} ATTACH PARTITION {qn(nome)} FOR VALUES FROM (%s) TO (%s)",
+            [inicio, fim],
+        )
+
+
+def criar_particoes(meses_a_frente: int = MESES_A_FRENTE_PADRAO, *, agora: datetime | None = None) -> list[str]:
+    """
+    Garante particoes do mes corrente e dos `meses_a_frente` seguintes (meses ja
+    cobertos, como os da particao legado, sao pulados). Idempotente; devolve os nomes
+    das particoes criadas agora.
+    """
+    if not particionado():
+        return []
+    particoes = listar_particoes()
+    padrao = next((p.nome for p in particoes if p.padrao), None)
+    mes = inicio_mes(agora or timezone.now())
+    criadas = []
+    for _ in range(max(0, meses_a_frente) + 1):
+        fim = _mes_seguinte(mes)
+        if not _coberto(particoes, mes, fim):
+            nome = nome_particao(mes)
+            _criar_particao(nome, mes, fim, padrao)
+            particoes.append(ParticaoAuditoria(nome=nome, de=mes, ate=fim))
+            criadas.append(nome)
+        mes = fim
+    return criadas
+
+
+def remover_particoes_antigas(cutoff: datetime, *, dry_run: bool = False) -> list[str]:
+    """
+    Descarta (DETACH + DROP) as particoes cujo limite superior e <= cutoff, isto e,
+    que so tem eventos anteriores ao corte. Custo constante por particao, sem
+    varrer linhas nem gerar WAL por evento.
+    """
+    qn = connection.ops.quote_name
+    antigas = [p.nome for p in listar_particoes() if p.ate is not None and p.ate <= cutoff]
+    if dry_run:
+        return antigas
+    for nome in antigas:
+        with transaction.atomic(), connection.cursor() as cursor:
+            # FKs de usuario sao DEFERRABLE: checagens pendentes na transacao bloqueariam o DROP.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(f"ALTER TABLE {qn(_tabela())} DETACH PARTITION {qn(nome)}")
+            cursor.execute(f"DROP TABLE {qn(nome)}")
+    return antigas
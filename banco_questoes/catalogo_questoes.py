@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import random
+import re
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Questao
+
+
+CATALOGO_FILENAME = "catalogo_questoes.bin"
+CATALOGO_MAGIC = b"BQCAT1\n"
+# Marcador de geracao: invalidar publica um valor novo; snapshot montado antes dele
+# (cabecalho com outra geracao) nao vale mais, em nenhum worker.
+CATALOGO_GERACAO_FILENAME = "catalogo_questoes.geracao"
+# Sem o marcador em disco (diretorio compartilhado sem escrita), o catalogo expira por tempo.
+CATALOGO_TTL_SEM_MARCADOR = 60
+DIFICULDADES = ("FACIL", "INTERMEDIARIO", "DIFICIL")
+# Estrato das questoes sem dificuldade cadastrada (usado no sorteio estratificado).
+SEM_DIFICULDADE = "-"
+UUID_BYTES = 16
+# Snapshots antigos ficam disponiveis (por versao) para regenerar tentativas em andamento.
+VERSOES_EM_MEMORIA = 4
+
+_VERSAO_RE = re.compile(r"^[0-9a-f]{16}$")
+
+_HEADER_LEN = struct.Struct("<I")
+
+
+def faceta_key(
+    curso_id,
+    modulo_id="",
+    dificuldade: str = "",
+    com_imagem: bool = False,
+    so_placas: bool = False,
+) -> str:
+    """
+    Chave de uma faceta do simulado. Modulo e dificuldade vazios significam
+    "todos"; dificuldades fora da lista conhecida sao tratadas como misturado,
+    igual ao filtro da view. SEM_DIFICULDADE seleciona as questoes sem dificuldade.
+    """
+    dificuldade = (dificuldade or "").strip().upper()
+    if dificuldade not in DIFICULDADES and dificuldade != SEM_DIFICULDADE:
+        dificuldade = ""
+    return f"{curso_id}|{modulo_id or ''}|{dificuldade}|{int(bool(com_imagem))}|{int(bool(so_placas))}"
+
+
+def _recorte_key(curso_id, modulo_id="") -> str:
+    return f"{curso_id}|{modulo_id or ''}"
+
+
+def _painel_vazio() -> dict[str, Any]:
+    return {
+        "com_imagem": 0,
+        "placas": 0,
+        "por_dificuldade": {dificuldade: 0 for dificuldade in DIFICULDADES},
+    }
+
+
+class CatalogoQuestoes:
+    """
+    Snapshot imutavel: para cada faceta, um array compacto de UUIDs (16 bytes cada).
+    Contagem e sorteio sao feitos sem tocar no banco.
+    """
+
+    def __init__(self, header: dict[str, Any], buffer, blob_start: int) -> None:
+        self.versao: str = header.get("versao", "")
+        self.geracao: str = header.get("geracao", "")
+        self.gerado_em: str = header.get("gerado_em", "")
+        self._facetas: dict[str, list[int]] = header.get("facetas", {})
+        self._paineis: dict[str, dict[str, Any]] = header.get("paineis", {})
+        self._buffer = buffer
+        self._blob_start = blob_start
+
+    def contar(self, chave: str) -> int:
+        faceta = self._facetas.get(chave)
+        return faceta[1] if faceta else 0
+
+    def painel(self, curso_id, modulo_id="") -> dict[str, Any]:
+        """Contagens do painel de disponibilidade para o recorte curso/modulo."""
+        painel = self._paineis.get(_recorte_key(curso_id, modulo_id))
+        if painel is None:
+            return _painel_vazio()
+        return {**painel, "por_dificuldade": dict(painel["por_dificuldade"])}
+
+    def modulos(self, curso_id) -> list[str]:
+        """Ids dos modulos do curso que possuem questoes no snapshot."""
+        prefixo = _recorte_key(curso_id)
+        return sorted(chave[len(prefixo):] for chave in self._paineis if chave.startswith(prefixo) and chave != prefixo)
+
+    def _uuid_at(self, offset: int) -> uuid.UUID:
+        start = self._blob_start + offset * UUID_BYTES
+        return uuid.UUID(bytes=bytes(self._buffer[start:start + UUID_BYTES]))
+
+    def ids(self, chave: str) -> list[uuid.UUID]:
+        faceta = self._facetas.get(chave)
+        if not faceta:
+            return []
+        offset, count = faceta
+        return [self._uuid_at(offset + i) for i in range(count)]
+
+    def sortear(self, chave: str, k: int, rng: random.Random | None = None) -> list[uuid.UUID]:
+        faceta = self._facetas.get(chave)
+        if not faceta or k <= 0:
+            return []
+        offset, count = faceta
+        rng = rng or random
+        indices = rng.sample(range(count), k=min(k, count))
+        return [self._uuid_at(offset + i) for i in indices]
+
+
+def _catalogo_path() -> Path:
+    return Path(settings.SHARED_CACHE_ROOT) / CATALOGO_FILENAME
+
+
+def _catalogo_versao_path(versao: str) -> Path:
+    stem, ext = os.path.splitext(CATALOGO_FILENAME)
+    return Path(settings.SHARED_CACHE_ROOT) / f"{stem}.{versao}{ext}"
+
+
+def construir_catalogo_bytes(geracao: str = "") -> bytes:
+    """Monta o snapshot com uma unica query sobre Questao."""
+    facetas: dict[str, list[bytes]] = {}
+    paineis: dict[str, dict[str, Any]] = {}
+    rows = (
+        Questao.objects
+        .order_by("curso_id", "modulo_id", "numero_no_modulo", "id")
+        .values_list("id", "curso_id", "modulo_id", "dificuldade", "imagem_arquivo", "codigo_placa")
+    )
+    for qid, curso_id, modulo_id, dificuldade, imagem_arquivo, codigo_placa in rows.iterator():
+        modulos = ("", modulo_id)
+        difs = ("", dificuldade if dificuldade in DIFICULDADES else SEM_DIFICULDADE)
+        imagens = (False, True) if imagem_arquivo else (False,)
+        placas = (False, True) if codigo_placa else (False,)
+        for m in modulos:
+            painel = paineis.setdefault(_recorte_key(curso_id, m), _painel_vazio())
+            painel["com_imagem"] += int(bool(imagem_arquivo))
+            painel["placas"] += int(bool(codigo_placa))
+            if dificuldade in DIFICULDADES:
+                painel["por_dificuldade"][dificuldade] += 1
+            for d in difs:
+                for com_imagem in imagens:
+                    for so_placas in placas:
+                        chave = faceta_key(curso_id, m, d, com_imagem, so_placas)
+                        facetas.setdefault(chave, []).append(qid.bytes)
+
+    digest = hashlib.sha1()
+    index: dict[str, list[int]] = {}
+    blob = bytearray()
+    offset = 0
+    for chave in sorted(facetas):
+        ids = facetas[chave]
+        index[chave] = [offset, len(ids)]
+        offset += len(ids)
+        chunk = b"".join(ids)
+        blob.extend(chunk)
+        digest.update(chave.encode("utf-8"))
+        digest.update(chunk)
+
+    header = json.dumps(
+        {
+            "versao": digest.hexdigest()[:16],
+            "geracao": geracao,
+            "gerado_em": timezone.now().isoformat(),
+            "facetas": index,
+            "paineis": paineis,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return CATALOGO_MAGIC + _HEADER_LEN.pack(len(header)) + header + bytes(blob)
+
+
+def _parse_catalogo(buffer) -> CatalogoQuestoes:
+    magic_len = len(CATALOGO_MAGIC)
+    if bytes(buffer[:magic_len]) != CATALOGO_MAGIC:
+        raise ValueError("Arquivo de catalogo invalido.")
+    (header_len,) = _HEADER_LEN.unpack(bytes(buffer[magic_len:magic_len + _HEADER_LEN.size]))
+    header_start = magic_len + _HEADER_LEN.size
+    header = json.loads(bytes(buffer[header_start:header_start + header_len]).decode("utf-8"))
+    return CatalogoQuestoes(header, buffer, header_start + header_len)
+
+
+def _gravar_atomico(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except OSError:
+            pass
+        raise
+
+
+class _EstadoCatalogo:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.assinatura: tuple | None = None
+        # Assinatura do marcador de geracao quando o catalogo vigente foi validado.
+        self.assinatura_geracao: tuple | None = None
+        self.catalogo: CatalogoQuestoes | None = None
+        self.montado_em = 0.0
+        # Quando o diretorio compartilhado nao e gravavel, o catalogo fica so em memoria.
+        self.somente_memoria = False
+        # Snapshots recentes por versao (inclui o vigente).
+        self.versoes: dict[str, CatalogoQuestoes] = {}
+
+    def lembrar_versao(self, catalogo: CatalogoQuestoes) -> None:
+        self.versoes.pop(catalogo.versao, None)
+        self.versoes[catalogo.versao] = catalogo
+        while len(self.versoes) > VERSOES_EM_MEMORIA:
+            self.versoes.pop(next(iter(self.versoes)))
+
+
+_estado = _EstadoCatalogo()
+
+
+def _assinatura_arquivo(path: Path) -> tuple | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _geracao_path() -> Path:
+    return Path(settings.SHARED_CACHE_ROOT) / CATALOGO_GERACAO_FILENAME
+
+
+def _ler_geracao(path: Path) -> tuple[tuple | None, str]:
+    # Assinatura e conteudo do mesmo arquivo aberto (um os.replace no meio nao mistura os dois).
+    try:
+        with path.open("rb") as fh:
+            st = os.fstat(fh.fileno())
+            geracao = fh.read().decode("ascii", "replace").strip()
+    except OSError:
+        return None, ""
+    return (st.st_ino, st.st_mtime_ns, st.st_size), geracao
+
+
+def _publicar_geracao(path: Path) -> None:
+    # Conteudo novo + os.replace: muda inode e mtime, que e o que os workers comparam.
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(uuid.uuid4().hex, encoding="ascii")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _geracao_atual() -> tuple[tuple | None, str]:
+    path = _geracao_path()
+    assinatura, geracao = _ler_geracao(path)
+    if assinatura is None:
+        _publicar_geracao(path)
+        assinatura, geracao = _ler_geracao(path)
+    return assinatura, geracao
+
+
+def _carregar_arquivo(path: Path) -> CatalogoQuestoes:
+    with path.open("rb") as fh:
+        buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    return _parse_catalogo(buffer)
+
+
+def _arquivar_versao(path: Path, versao: str) -> None:
+    # Hard link para o mesmo inode: publicar um snapshot novo (os.replace) nao afeta a copia.
+    destino = _catalogo_versao_path(versao)
+    if destino.exists():
+        return
+    try:
+        os.link(path, destino)
+    except FileExistsError:
+        pass
+    except OSError:
+        _gravar_atomico(destino, path.read_bytes())
+
+
+def reconstruir_catalogo() -> CatalogoQuestoes:
+    """
+    Reconstroi o snapshot e publica no diretorio compartilhado. A geracao e lida
+    antes da query: se uma invalidacao chegar durante a montagem, o snapshot nao e
+    publicado (e, publicado por pouco, a leitura o descarta pela geracao).
+    """
+    assinatura_geracao, geracao = _geracao_atual()
+    data = construir_catalogo_bytes(geracao)
+    path = _catalogo_path()
+    with _estado.lock:
+        if geracao and _ler_geracao(_geracao_path())[1] != geracao:
+            # Dados possivelmente anteriores ao commit que invalidou: serve so esta chamada.
+            return _parse_catalogo(data)
+        _estado.assinatura_geracao = assinatura_geracao
+        _estado.montado_em = time.monotonic()
+        try:
+            if not geracao:
+                raise OSError("Marcador de geracao indisponivel.")
+            _gravar_atomico(path, data)
+        except OSError:
+            _estado.somente_memoria = True
+            _estado.assinatura = None
+            _estado.catalogo = _parse_catalogo(data)
+            _estado.lembrar_versao(_estado.catalogo)
+            return _estado.catalogo
+        _estado.somente_memoria = False
+        _estado.assinatura = _assinatura_arquivo(path)
+        _estado.catalogo = _carregar_arquivo(path)
+        _estado.lembrar_versao(_estado.catalogo)
+        try:
+            _arquivar_versao(path, _estado.catalogo.versao)
+        except OSError:
+            pass
+        return _estado.catalogo
+
+
+def get_catalogo() -> CatalogoQuestoes:
+    """
+    Retorna o catalogo vigente. O custo no caminho quente sao dois os.stat (marcador
+    de geracao e snapshot); o arquivo so e relido quando outro processo publica um
+    snapshot ou uma geracao nova.
+    """
+    assinatura_geracao = _assinatura_arquivo(_geracao_path())
+    catalogo = _estado.catalogo
+    if _estado.somente_memoria and catalogo is not None:
+        if assinatura_geracao == _estado.assinatura_geracao and (
+            assinatura_geracao is not None or time.monotonic() - _estado.montado_em < CATALOGO_TTL_SEM_MARCADOR
+        ):
+            return catalogo
+        return reconstruir_catalogo()
+
+    path = _catalogo_path()
+    assinatura = _assinatura_arquivo(path)
+    if (
+        catalogo is not None
+        and assinatura is not None
+        and assinatura == _estado.assinatura
+        and assinatura_geracao == _estado.assinatura_geracao
+    ):
+        return catalogo
+
+    if assinatura is None or assinatura_geracao is None:
+        return reconstruir_catalogo()
+
+    with _estado.lock:
+        assinatura_geracao, geracao = _ler_geracao(_geracao_path())
+        try:
+            catalogo = _carregar_arquivo(path)
+        except (OSError, ValueError):
+            catalogo = None
+        # Snapshot de uma geracao anterior (publicado antes da ultima invalidacao): refaz.
+        if catalogo is not None and geracao and catalogo.geracao == geracao:
+            _estado.assinatura = assinatura
+            _estado.assinatura_geracao = assinatura_geracao
+            _estado.catalogo = catalogo
+            _estado.lembrar_versao(catalogo)
+            return catalogo
+    return reconstruir_catalogo()
+
+
+def get_catalogo_versao(versao: str) -> CatalogoQuestoes | None:
+    """
+    Snapshot de uma versao especifica (ex.: a usada ao sortear uma tentativa).
+    Retorna None se a versao nao existe mais.
+    """
+    if not versao or not _VERSAO_RE.match(versao):
+        return None
+    atual = get_catalogo()
+    if atual.versao == versao:
+        return atual
+    with _estado.lock:
+        catalogo = _estado.versoes.get(versao)
+        if catalogo is not None:
+            return catalogo
+        try:
+            catalogo = _carregar_arquivo(_catalogo_versao_path(versao))
+        except (OSError, ValueError):
+            return None
+        _estado.lembrar_versao(catalogo)
+        return catalogo
+
+
+def remover_versoes_antigas(manter: set[str]) -> int:
+    """Apaga snapshots arquivados que nao sao o vigente nem estao em `manter`."""
+    manter = set(manter) | {get_catalogo().versao}
+    stem, ext = os.path.splitext(CATALOGO_FILENAME)
+    removidos = 0
+    for path in Path(settings.SHARED_CACHE_ROOT).glob(f"{stem}.*{ext}"):
+        versao = path.name[len(stem) + 1:-len(ext)]
+        if not _VERSAO_RE.match(versao) or versao in manter:
+            continue
+        try:
+            path.unlink()
+            removidos += 1
+        except OSError:
+            pass
+    with _estado.lock:
+        for versao in [v for v in _estado.versoes if v not in manter]:
+            del _estado.versoes[versao]
+    return removidos
+
+
+def invalidar_catalogo() -> None:
+    """Publica uma geracao nova: o proximo acesso (em qualquer worker) reconstroi."""
+    with _estado.lock:
+        _estado.assinatura = None
+        _estado.assinatura_geracao = None
+        _estado.catalogo = None
+        _estado.somente_memoria = False
+    _publicar_geracao(_geracao_path())
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import UsoAppJanela
+
+
+logger = logging.getLogger(__name__)
+
+# (app_modulo_id, janela_inicio, janela_fim)
+ChaveJanela = tuple[int, datetime, datetime]
+
+CONTADOR_BACKEND_PADRAO = "banco_questoes.contador_uso.ContadorUsoBanco"
+# Lote maximo por INSERT na descarga do write-behind.
+DESCARGA_LOTE = 500
+
+
+def _upsert_sql(qtd_linhas: int, *, somente_abaixo_do_limite: bool) -> str:
+    qn = connection.ops.quote_name
+    tabela = qn(UsoAppJanela._meta.db_table)
+    colunas_unicas = f"{qn('usuario_id')}, {qn('app_modulo_id')}, {qn('janela_inicio')}, {qn('janela_fim')}"
+    valores = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * qtd_linhas)
+    sql = (
+        f"INSERT INTO {tabela} "
+        f"({colunas_unicas}, {qn('contador')}, {qn('criado_em')}, {qn('atualizado_em')}) "
+        f"VALUES {valores} "
+        f"ON CONFLICT ({colunas_unicas}) "
+        f"DO UPDATE SET {qn('contador')} = {tabela}.{qn('contador')} + EXCLUDED.{qn('contador')}, "
+        f"{qn('atualizado_em')} = EXCLUDED.{qn('atualizado_em')}"
+    )
+    if somente_abaixo_do_limite:
+        sql += f" WHERE {tabela}.{qn('contador')} < %s RETURNING {qn('contador')}"
+    return sql
+
+
+def _upsert_params(usuario_id, chave: ChaveJanela, delta: int, agora) -> list:
+    app_modulo_id, janela_inicio, janela_fim = chave
+    return [
+        usuario_id,
+        app_modulo_id,
+        connection.ops.adapt_datetimefield_value(janela_inicio),
+        connection.ops.adapt_datetimefield_value(janela_fim),
+        delta,
+        agora,
+        agora,
+    ]
+
+
+def ler_contadores_banco(usuario_id, chaves: Iterable[ChaveJanela]) -> dict[ChaveJanela, int]:
+    chaves = list(chaves)
+    if not chaves:
+        return {}
+    filtros = Q()
+    for app_modulo_id, janela_inicio, janela_fim in chaves:
+        filtros |= Q(
+            usuario_id=usuario_id,
+            app_modulo_id=app_modulo_id,
+            janela_inicio=janela_inicio,
+            janela_fim=janela_fim,
+        )
+    return {
+        (uso.app_modulo_id, uso.janela_inicio, uso.janela_fim): uso.contador
+        for uso in UsoAppJanela.objects.filter(filtros).only(
+            "app_modulo_id", "janela_inicio", "janela_fim", "contador"
+        )
+    }
+
+
+class ContadorUsoBackend:
+    """
+    Contadores de uso por (usuario, app, janela). `consumir` soma 1 se o contador
+    estiver abaixo do limite e devolve o valor novo (None quando o limite ja foi
+    atingido); `ler` devolve os contadores atuais (chaves sem uso ficam de fora).
+    """
+
+    def consumir(self, usuario_id, chave: ChaveJanela, limite: int) -> int | None:
+        raise NotImplementedError
+
+    def ler(self, usuario_id, chaves: Iterable[ChaveJanela]) -> dict[ChaveJanela, int]:
+        raise NotImplementedError
+
+    def descarregar(self) -> int:
+        """Grava no banco o que estiver pendente; devolve quantas janelas foram gravadas."""
+        return 0
+
+
+class ContadorUsoBanco(ContadorUsoBackend):
+    """Grava direto em UsoAppJanela, um upsert por consumo."""
+
+    def consumir(self, usuario_id, chave: ChaveJanela, limite: int) -> int | None:
+        # Cria o contador em 1 ou soma 1 enquanto estiver abaixo do limite, num unico
+        # statement: o WHERE do DO UPDATE barra o incremento e nada volta no RETURNING.
+        agora = connection.ops.adapt_datetimefield_value(timezone.now())
+        params = _upsert_params(usuario_id, chave, 1, agora) + [limite]
+        with connection.cursor() as cursor:
+            cursor.execute(_upsert_sql(1, somente_abaixo_do_limite=True), params)
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def ler(self, usuario_id, chaves: Iterable[ChaveJanela]) -> dict[ChaveJanela, int]:
+        return ler_contadores_banco(usuario_id, chaves)
+
+
+class ContadorUsoCache(ContadorUsoBackend):
+    """
+    Contadores no cache do Django (USO_APP_CACHE_ALIAS) com incremento atomico. Com
+    varios workers o alias precisa ser compartilhado (Redis/Memcached): no LocMem cada
+    processo so enxerga os proprios consumos. Os consumos viram deltas pendentes
+    neste processo e sao somados em UsoAppJanela em lote a cada
+    USO_APP_DESCARGA_SEGUNDOS: no proprio consumo e numa thread de fundo (para o
+    worker ocioso), alem da saida do processo. Deltas ainda nao descarregados se
+    perdem se o processo morrer: a cota pode sobrar um pouco, nunca faltar.
+    """
+
+    def __init__(self) -> None:
+        self.alias = getattr(settings, "USO_APP_CACHE_ALIAS", "default")
+        self.intervalo = float(getattr(settings, "USO_APP_DESCARGA_SEGUNDOS", 5))
+        self._lock = threading.Lock()
+        self._pendentes: dict[tuple, int] = {}
+        self._ultima_descarga = time.monotonic()
+        self._thread_pid: int | None = None
+        self._parar = threading.Event()
+        atexit.register(self.descarregar)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _cache_key(usuario_id, chave: ChaveJanela) -> str:
+        app_modulo_id, janela_inicio, janela_fim = chave
+        return f"uso_app:{usuario_id}:{app_modulo_id}:{int(janela_inicio.timestamp())}:{int(janela_fim.timestamp())}"
+
+    @staticmethod
+    def _timeout(chave: ChaveJanela) -> int:
+        # A chave vive ate o fim da janela (com folga); depois disso ninguem mais a consulta.
+        return max(int((chave[2] - timezone.now()).total_seconds()) + 3600, 60)
+
+    def _pendente(self, usuario_id, chave: ChaveJanela) -> int:
+        with self._lock:
+            return self._pendentes.get((usuario_id, chave), 0)
+
+    def _carregar(self, usuario_id, chave: ChaveJanela) -> None:
+        # Chave ausente (primeiro uso na janela ou despejada): parte do banco mais o
+        # que este processo ainda nao descarregou. add() nao sobrescreve outro worker.
+        base = ler_contadores_banco(usuario_id, [chave]).get(chave, 0)
+        self.cache.add(self._cache_key(usuario_id, chave), base + self._pendente(usuario_id, chave), self._timeout(chave))
+
+    def consumir(self, usuario_id, chave: ChaveJanela, limite: int) -> int | None:
+        key = self._cache_key(usuario_id, chave)
+        try:
+            contador = self.cache.incr(key)
+        except ValueError:
+            self._carregar(usuario_id, chave)
+            contador = self.cache.incr(key)
+        if contador > limite:
+            # Desfaz: so quem ja estava no limite passa por aqui, entao o excesso
+            # momentaneo nao barra nenhum consumo que caberia na cota.
+            self.cache.decr(key)
+            return None
+
+        self._garantir_descarga_periodica()
+        with self._lock:
+            self._pendentes[(usuario_id, chave)] = self._pendentes.get((usuario_id, chave), 0) + 1
+            descarregar = time.monotonic() - self._ultima_descarga >= self.intervalo
+        if descarregar:
+            # O consumo ja foi contado no cache: erro na descarga nao pode virar 500.
+            # Os deltas voltam para os pendentes e a proxima tentativa so vem depois
+            # de outro intervalo.
+            try:
+                self.descarregar()
+            except Exception:
+                logger.exception("Falha ao descarregar contadores de uso; nova tentativa no proximo intervalo")
+        return contador
+
+    def _garantir_descarga_periodica(self) -> None:
+        # Uma thread por processo, iniciada no primeiro consumo: depois de um fork
+        # (gunicorn --preload) o filho nao herda a thread do pai.
+        pid = os.getpid()
+        if self._thread_pid == pid or self.intervalo <= 0:
+            return
+        with self._lock:
+            if self._thread_pid == pid:
+                return
+            self._thread_pid = pid
+        threading.Thread(target=self._descarregar_periodicamente, name="contador-uso-descarga", daemon=True).start()
+
+    def _descarregar_periodicamente(self) -> None:
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.descarregar()
+            except Exception:
+                logger.exception("Falha na descarga periodica dos contadores de uso")
+            finally:
+                # Conexao propria desta thread: respeita CONN_MAX_AGE e fecha as quebradas.
+                close_old_connections()
+
+    def parar(self) -> None:
+        """Encerra a thread de descarga periodica (sem descarregar)."""
+        self._parar.set()
+
+    def ler(self, usuario_id, chaves: Iterable[ChaveJanela]) -> dict[ChaveJanela, int]:
+        chaves = list(chaves)
+        if not chaves:
+            return {}
+        keys = {self._cache_key(usuario_id, chave): chave for chave in chaves}
+        em_cache = self.cache.get_many(list(keys))
+        contadores = {keys[key]: valor for key, valor in em_cache.items()}
+        faltando = [chave for chave in chaves if chave not in contadores]
+        if faltando:
+            do_banco = ler_contadores_banco(usuario_id, faltando)
+            for chave in faltando:
+                valor = do_banco.get(chave, 0) + self._pendente(usuario_id, chave)
+                if valor:
+                    contadores[chave] = valor
+        return contadores
+
+    def descarregar(self) -> int:
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+            self._ultima_descarga = time.monotonic()
+        if not pendentes:
+            return 0
+
+        itens = list(pendentes.items())
+        agora = connection.ops.adapt_datetimefield_value(timezone.now())
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for inicio in range(0, len(itens), DESCARGA_LOTE):
+                    lote = itens[inicio:inicio + DESCARGA_LOTE]
+                    params = []
+                    for (usuario_id, chave), delta in lote:
+                        params.extend(_upsert_params(usuario_id, chave, delta, agora))
+                    cursor.execute(_upsert_sql(len(lote), somente_abaixo_do_limite=False), params)
+        except Exception:
+            # Devolve os deltas para a proxima tentativa.
+            with self._lock:
+                for item, delta in itens:
+                    self._pendentes[item] = self._pendentes.get(item, 0) + delta
+            raise
+        return len(itens)
+
+
+_backend: tuple[str, ContadorUsoBackend] | None = None
+_backend_lock = threading.Lock()
+
+
+def get_contador_uso() -> ContadorUsoBackend:
+    """Backend configurado em USO_APP_CONTADOR_BACKEND (caminho pontilhado da classe)."""
+    global _backend
+    caminho = getattr(settings, "USO_APP_CONTADOR_BACKEND", CONTADOR_BACKEND_PADRAO)
+    atual = _backend
+    if atual is not None and atual[0] == caminho:
+        return atual[1]
+    with _backend_lock:
+        if _backend is None or _backend[0] != caminho:
+            _backend = (caminho, import_string(caminho)())
+        return _backend[1]
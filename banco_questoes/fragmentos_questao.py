@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import SafeString, mark_safe
+
+from .imagens_variantes import manifest_token
+
+
+# Incrementar ao alterar qualquer template em simulado/fragmentos/.
+FRAGMENTOS_VERSAO = 2
+FRAGMENTOS_TTL_SECONDS = 24 * 60 * 60
+
+
+class FragmentosQuestao:
+    """Partes estaticas de uma questao ja renderizadas (enunciado, imagem e alternativas)."""
+
+    __slots__ = ("enunciado", "imagem", "alternativas")
+
+    def __init__(self, enunciado: SafeString, imagem: SafeString, alternativas: dict[str, SafeString]) -> None:
+        self.enunciado = enunciado
+        self.imagem = imagem
+        self.alternativas = alternativas
+
+
+def versao_conteudo(questao) -> str:
+    """Hash de tudo que os templates de fragmento usam (enunciado, imagem e textos das alternativas)."""
+    digest = hashlib.sha1()
+    for parte in (questao.enunciado, questao.imagem_arquivo):
+        digest.update(str(parte or "").encode("utf-8"))
+        digest.update(b"\0")
+    for alt in questao.alternativas:
+        digest.update(f"{alt.id}\0{alt.texto}\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def fragmentos_key(questao) -> str:
+    # Chave pelo conteudo, nao por invalidacao: com cache local por processo um
+    # cache.delete so valeria num worker, e um bundle antigo (ate 6h) regravaria o
+    # texto velho na chave de todos. Questao editada => chave nova; a antiga expira.
+    # O token do manifest de variantes tambem entra: regerar as imagens renova o HTML.
+    return f"simulado:fragmentos:v{FRAGMENTOS_VERSAO}:{manifest_token()}:{questao.id}:{versao_conteudo(questao)}"
+
+
+def _renderizar(questao) -> FragmentosQuestao:
+    return FragmentosQuestao(
+        enunciado=mark_safe(render_to_string("simulado/fragmentos/enunciado.html", {"questao": questao}).strip()),
+        imagem=mark_safe(render_to_string("simulado/fragmentos/imagem.html", {"questao": questao}).strip()),
+        alternativas={
+            str(alt.id): mark_safe(
+                render_to_string("simulado/fragmentos/alternativa.html", {"alternativa": alt}).strip()
+            )
+            for alt in questao.alternativas
+        },
+    )
+
+
+def get_fragmentos_questao(questao) -> FragmentosQuestao:
+    """
+    Busca os fragmentos da questao no cache (chave: id + hash do conteudo + versao
+    dos templates e do manifest de imagens). Contadores, ordem embaralhada e feedback
+    continuam por requisicao.
+    """
+    key = fragmentos_key(questao)
+    fragmentos = cache.get(key)
+    if isinstance(fragmentos, FragmentosQuestao):
+        return fragmentos
+    fragmentos = _renderizar(questao)
+    cache.set(key, fragmentos, FRAGMENTOS_TTL_SECONDS)
+    return fragmentos
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+from .simulado_config import get_simulado_config
+
+
+MANIFEST_PATH = "variantes/manifest.json"
+MANIFEST_VERSAO = 1
+EXTENSOES_ORIGEM = {".png", ".jpg", ".jpeg"}
+# Ordem de preferencia no <picture>: o navegador usa o primeiro <source> que suporta.
+FORMATOS = ("avif", "webp")
+
+# Larguras usadas quando o config_simulado.json nao define `imagens`.
+LARGURAS_PLACAS_PADRAO = {"mobile": 150, "tablet": 180, "desktop": 300}
+
+# Pastas de static/ com imagens de origem (nao recursivo). Larguras em px, ja com 2x
+# para telas de alta densidade; `sizes` descreve a largura exibida pelo CSS.
+GRUPOS_IMAGENS = {
+    "menu_app/icons": {"larguras": (68, 136, 204), "sizes": "68px"},
+    "menu_app": {"larguras": (480, 960, 1440), "sizes": "100vw"},
+    "logo_representantes": {"larguras": (220, 440), "sizes": "220px"},
+}
+
+
+def grupo_placas() -> dict:
+    """Larguras e `sizes` das placas seguem os breakpoints de `imagens` no config do simulado."""
+    imagens_cfg = get_simulado_config().get("imagens") or {}
+    larguras = {}
+    for variante, padrao in LARGURAS_PLACAS_PADRAO.items():
+        try:
+            larguras[variante] = int((imagens_cfg.get(variante) or {}).get("max_width") or padrao)
+        except (TypeError, ValueError):
+            larguras[variante] = padrao
+    # Mesmos cortes de largura de tela do JS de questao.html (640 / 1024).
+    sizes = (
+        f"(max-width: 639px) {larguras['mobile']}px, "
+        f"(max-width: 1023px) {larguras['tablet']}px, "
+        f"{larguras['desktop']}px"
+    )
+    return {
+        "larguras": tuple(sorted({w * d for w in larguras.values() for d in (1, 2)})),
+        "sizes": sizes,
+    }
+
+
+def grupos_imagens() -> dict[str, dict]:
+    return {"placas": grupo_placas(), **GRUPOS_IMAGENS}
+
+
+def caminho_variante(rel: str, largura: int, formato: str) -> str:
+    """Caminho (relativo a static/) da variante: variantes/placas/A-1A-150.webp."""
+    origem = Path(rel)
+    return (Path("variantes") / origem.parent / f"{origem.stem}-{largura}.{formato}").as_posix()
+
+
+def caminho_manifest() -> Path | None:
+    encontrado = finders.find(MANIFEST_PATH)
+    if encontrado:
+        return Path(encontrado)
+    if settings.STATIC_ROOT:
+        candidato = Path(settings.STATIC_ROOT) / MANIFEST_PATH
+        if candidato.exists():
+            return candidato
+    return None
+
+
+# Sem manifest encontrado, a busca nos finders so e refeita depois deste intervalo.
+MANIFEST_REBUSCA_SEGUNDOS = 60
+
+# (caminho, monotonic da busca): os finders percorrem todas as pastas de static, entao
+# o caminho e resolvido uma vez por processo e depois so recebe os.stat.
+_caminho_resolvido: tuple[Path | None, float] | None = None
+# (caminho, mtime, dados): relido so quando o arquivo muda (novo gerar_variantes_imagens).
+_manifest_cache: tuple[Path | None, float, dict] = (None, 0.0, {})
+
+
+def _caminho_manifest_resolvido() -> Path | None:
+    global _caminho_resolvido
+    atual = _caminho_resolvido
+    if atual is not None and (atual[0] is not None or time.monotonic() - atual[1] < MANIFEST_REBUSCA_SEGUNDOS):
+        return atual[0]
+    caminho = caminho_manifest()
+    _caminho_resolvido = (caminho, time.monotonic())
+    return caminho
+
+
+def get_manifest() -> dict:
+    global _manifest_cache, _caminho_resolvido
+    caminho = _caminho_manifest_resolvido()
+    if caminho is None:
+        return {}
+    try:
+        mtime = os.stat(caminho).st_mtime
+    except OSError:
+        # Arquivo sumiu (collectstatic novo, outra pasta): resolve de novo na proxima.
+        _caminho_resolvido = None
+        return {}
+    cache_caminho, cache_mtime, dados = _manifest_cache
+    if cache_caminho == caminho and cache_mtime == mtime:
+        return dados
+    try:
+        with open(caminho, encoding="utf-8") as fp:
+            dados = json.load(fp)
+    except (OSError, ValueError):
+        dados = {}
+    if not isinstance(dados, dict) or dados.get("versao") != MANIFEST_VERSAO:
+        dados = {}
+    _manifest_cache = (caminho, mtime, dados)
+    return dados
+
+
+def get_variantes(rel: str) -> dict | None:
+    """Entrada do manifest para a imagem (`placas/A-1A.png`), ou None se nao ha variantes."""
+    return (get_manifest().get("imagens") or {}).get(rel)
+
+
+def manifest_token() -> str:
+    """Identifica o manifest atual (entra nas chaves de cache de HTML que usa as variantes)."""
+    return str(get_manifest().get("gerado_em") or "")
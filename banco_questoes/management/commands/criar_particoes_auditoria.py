@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from banco_questoes.auditoria_particoes import MESES_A_FRENTE_PADRAO, criar_particoes, particionado
+
+
+class Command(BaseCommand):
+    help = (
+        "Cria as particoes mensais de EventoAuditoria do mes corrente e dos proximos meses. "
+        "Rodar periodicamente (cron, ao menos mensal); so tem efeito no PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses",
+            type=int,
+            default=MESES_A_FRENTE_PADRAO,
+            help=f"Meses a frente do corrente (default: {MESES_A_FRENTE_PADRAO}).",
+        )
+
+    def handle(self, *args, **options):
+        if not particionado():
+            self.stdout.write("Tabela de eventos nao particionada (so PostgreSQL): nada a fazer.")
+            return
+        criadas = criar_particoes(options["meses"])
+        if criadas:
+            self.stdout.write(self.style.SUCCESS(f"Particoes criadas: {', '.join(criadas)}."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Particoes ja existentes."))
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from banco_questoes.assinaturas import atualizar_assinaturas_atuais
+from banco_questoes.models import Assinatura
+
+
+class Command(BaseCommand):
+    help = (
+        "Marca como EXPIRADO as assinaturas ATIVO com valid_until vencido, em lotes. "
+        "Rodar periodicamente (cron): mantem o indice parcial de assinaturas ativas enxuto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="So conta, sem alterar.")
+
+    def handle(self, *args, **options):
+        agora = timezone.now()
+        batch_size = max(1, options["batch_size"])
+        vencidas = Assinatura.objects.filter(status=Assinatura.Status.ATIVO, valid_until__lt=agora)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{vencidas.count()} assinaturas vencidas seriam expiradas (antes de {agora}).")
+            return
+
+        total = 0
+        while True:
+            lote = list(vencidas.order_by("pk").values_list("pk", "usuario_id")[:batch_size])
+            if not lote:
+                break
+            with transaction.atomic():
+                # update() nao passa pelo auto_now nem pelos signals: atualizado_em vai
+                # explicito e o ponteiro AssinaturaAtual e recalculado aqui.
+                total += (
+                    Assinatura.objects
+                    .filter(pk__in=[pk for pk, _ in lote], status=Assinatura.Status.ATIVO)
+                    .update(status=Assinatura.Status.EXPIRADO, atualizado_em=agora)
+                )
+                atualizar_assinaturas_atuais(usuario_id for _, usuario_id in lote)
+            if len(lote) < batch_size:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"{total} assinaturas expiradas (vencidas antes de {agora})."))
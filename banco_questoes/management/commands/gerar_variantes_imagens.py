@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from banco_questoes.imagens_variantes import (
+    EXTENSOES_ORIGEM,
+    FORMATOS,
+    MANIFEST_PATH,
+    MANIFEST_VERSAO,
+    caminho_variante,
+    grupos_imagens,
+)
+
+
+def _tem_transparencia(img) -> bool:
+    return img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+
+
+def _processar_imagem(
+    origem_dir: str,
+    rel: str,
+    larguras: tuple[int, ...],
+    formatos: tuple[str, ...],
+    qualidade: int,
+    forcar: bool,
+) -> tuple[str, dict, int]:
+    """
+    Roda no pool de processos: gera as variantes de uma imagem (sem ampliar alem do
+    original) e devolve a entrada do manifest. Variantes mais novas que a origem
+    sao mantidas, a nao ser com --forcar.
+    """
+    from PIL import Image
+
+    fonte = Path(origem_dir) / rel
+    fonte_mtime = fonte.stat().st_mtime
+    gerados = 0
+    with Image.open(fonte) as img:
+        largura, altura = img.size
+        entrada = {"largura": largura, "altura": altura, "formatos": {}}
+        base = None
+        for formato in formatos:
+            variantes = []
+            for alvo in sorted({min(w, largura) for w in larguras}):
+                destino_rel = caminho_variante(rel, alvo, formato)
+                destino = Path(origem_dir) / destino_rel
+                if forcar or not destino.exists() or destino.stat().st_mtime < fonte_mtime:
+                    if base is None:
+                        base = img.convert("RGBA" if _tem_transparencia(img) else "RGB")
+                    if alvo == largura:
+                        redimensionada = base
+                    else:
+                        redimensionada = base.resize(
+                            (alvo, max(1, round(altura * alvo / largura))),
+                            Image.Resampling.LANCZOS,
+                        )
+                    destino.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = destino.with_name(destino.name + ".tmp")
+                    opcoes = {"quality": qualidade}
+                    if formato == "webp":
+                        opcoes["method"] = 6
+                    redimensionada.save(tmp, format=formato.upper(), **opcoes)
+                    os.replace(tmp, destino)
+                    gerados += 1
+                variantes.append([alvo, destino_rel])
+            entrada["formatos"][formato] = variantes
+    return rel, entrada, gerados
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera variantes WebP (e opcionalmente AVIF) redimensionadas para os breakpoints "
+        "das imagens estaticas (placas, icones do menu, logos) e escreve o manifest usado "
+        "pela tag {% imagem_responsiva %}."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--origem", default=str(Path(settings.BASE_DIR) / "static"))
+        parser.add_argument("--avif", action="store_true", help="Gera tambem variantes AVIF.")
+        parser.add_argument("--qualidade", type=int, default=80)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--grupos", default="", help="Lista separada por virgula (ex.: placas,menu_app/icons).")
+        parser.add_argument("--forcar", action="store_true", help="Regera variantes ja atualizadas.")
+
+    def handle(self, *args, **options):
+        try:
+            from PIL import features
+        except ImportError as exc:
+            raise CommandError("Pillow nao esta instalado (pip install pillow).") from exc
+
+        formatos = ("avif", "webp") if options["avif"] else ("webp",)
+        for formato in formatos:
+            if not features.check(formato):
+                raise CommandError(f"Pillow sem suporte a {formato.upper()} neste ambiente.")
+        formatos = tuple(f for f in FORMATOS if f in formatos)
+
+        origem = Path(options["origem"])
+        if not origem.is_dir():
+            raise CommandError(f"Pasta de origem nao encontrada: {origem}")
+
+        grupos = grupos_imagens()
+        filtro = {g.strip() for g in (options["grupos"] or "").split(",") if g.strip()}
+        if filtro - set(grupos):
+            raise CommandError(f"Grupos desconhecidos: {', '.join(sorted(filtro - set(grupos)))}")
+
+        manifest_file = origem / MANIFEST_PATH
+        try:
+            anterior = json.loads(manifest_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            anterior = {}
+        imagens = dict(anterior.get("imagens") or {}) if anterior.get("versao") == MANIFEST_VERSAO else {}
+
+        tarefas = []
+        for nome, grupo in grupos.items():
+            if filtro and nome not in filtro:
+                continue
+            pasta = origem / nome
+            if not pasta.is_dir():
+                self.stdout.write(self.style.WARNING(f"Pasta ausente, ignorada: {pasta}"))
+                continue
+            for arquivo in sorted(pasta.iterdir()):
+                if arquivo.is_file() and arquivo.suffix.lower() in EXTENSOES_ORIGEM:
+                    rel = arquivo.relative_to(origem).as_posix()
+                    tarefas.append((rel, grupo))
+
+        gerados = 0
+        falhas = 0
+        with ProcessPoolExecutor(max_workers=max(1, options["workers"])) as pool:
+            futuros = {
+                pool.submit(
+                    _processar_imagem,
+                    str(origem),
+                    rel,
+                    grupo["larguras"],
+                    formatos,
+                    options["qualidade"],
+                    options["forcar"],
+                ): (rel, grupo)
+                for rel, grupo in tarefas
+            }
+            for futuro in as_completed(futuros):
+                rel, grupo = futuros[futuro]
+                try:
+                    _, entrada, qtd = futuro.result()
+                except Exception as exc:  # imagem corrompida nao derruba o lote
+                    falhas += 1
+                    self.stderr.write(f"Falha em {rel}: {exc}")
+                    continue
+                entrada["sizes"] = grupo["sizes"]
+                imagens[rel] = entrada
+                gerados += qtd
+
+        # Entradas de imagens que sairam da pasta de origem deixam de valer.
+        imagens = {rel: entrada for rel, entrada in imagens.items() if (origem / rel).exists()}
+        if gerados or imagens != anterior.get("imagens"):
+            manifest = {
+                "versao": MANIFEST_VERSAO,
+                "gerado_em": timezone.now().isoformat(),
+                "imagens": dict(sorted(imagens.items())),
+            }
+            manifest_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = manifest_file.with_name(manifest_file.name + ".tmp")
+            tmp.write_text(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, manifest_file)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(tarefas)} imagens verificadas, {gerados} variantes geradas, {falhas} falhas. "
+                f"Manifest: {manifest_file}"
+            )
+        )
@@ -9,6 +9,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.db.models import Count
 
+from banco_questoes.catalogo_questoes import reconstruir_catalogo
 from banco_questoes.models import (
     Curso,
     CursoModulo,
@@ -232,6 +233,10 @@ class Command(BaseCommand):
                 stats.created += int(created)
                 stats.updated += int(not created)
 
+        if not dry_run:
+            # Publica o catalogo do simulado ja com as questoes novas para todos os workers.
+            reconstruir_catalogo()
+
         # Relatório
         self.stdout.write(self.style.SUCCESS("IMPORTAÇÃO FINALIZADA"))
         self.stdout.write(f"Páginas: {stats.pages_processed}")
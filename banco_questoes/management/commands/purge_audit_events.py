@@ -1,15 +1,40 @@
 from __future__ import annotations
 
-from datetime import timedelta
+import gzip
+import json
+import os
+import time
+from datetime import datetime, time as dt_time, timedelta
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
 from django.utils import timezone
 
+from banco_questoes.auditoria_particoes import particionado, remover_particoes_antigas
 from banco_questoes.models import EventoAuditoria
 
 
+ARQUIVO_PREFIXO = "eventos_auditoria_"
+ARQUIVO_SUFIXO = ".jsonl.gz"
+CAMPOS_ARQUIVO = ("id", "tipo", "usuario_id", "timestamp", "ip", "device_id", "contexto_json")
+
+
+def _inicio_do_dia(dia) -> datetime:
+    return timezone.make_aware(datetime.combine(dia, dt_time.min))
+
+
+def caminho_arquivo(pasta: Path, dia) -> Path:
+    return pasta / f"{ARQUIVO_PREFIXO}{dia.isoformat()}{ARQUIVO_SUFIXO}"
+
+
 class Command(BaseCommand):
-    help = "Remove eventos de auditoria mais antigos que 6 meses."
+    help = (
+        "Remove eventos de auditoria mais antigos que 6 meses. Com --archive-dir, antes grava "
+        "os eventos em JSONL gzip (um arquivo por dia) e apaga em lotes; pode ser interrompido "
+        "e rodado de novo. Com a tabela particionada (PostgreSQL), antes descarta as particoes "
+        "mensais inteiras que ja passaram do corte; o resto (ex.: a particao legado) sai em lotes."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,11 +43,102 @@ class Command(BaseCommand):
             default=180,
             help="Quantidade de dias para manter (default: 180).",
         )
+        parser.add_argument(
+            "--archive-dir",
+            default="",
+            help="Pasta para arquivar os eventos antes de remover (um .jsonl.gz por dia).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Eventos por DELETE (default: 1000).")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Linhas por fetch do cursor (default: 2000).")
+        parser.add_argument("--pausa", type=float, default=0.1, help="Segundos entre lotes de DELETE (default: 0.1).")
 
     def handle(self, *args, **options):
         dias = options["dias"]
         cutoff = timezone.now() - timedelta(days=dias)
-        qs = EventoAuditoria.objects.filter(timestamp__lt=cutoff)
-        total = qs.count()
-        qs.delete()
+        self.batch_size = max(1, options["batch_size"])
+        self.pausa = max(0.0, options["pausa"])
+
+        if options["archive_dir"]:
+            pasta = Path(options["archive_dir"])
+            try:
+                pasta.mkdir(parents=True, exist_ok=True)
+            except OSError as exc:
+                raise CommandError(f"Nao foi possivel usar a pasta de arquivo {pasta}: {exc}") from exc
+            # So dias inteiros: um arquivo parcial seria tomado como completo na proxima rodada.
+            cutoff = _inicio_do_dia(timezone.localtime(cutoff).date())
+            arquivos, arquivados = self._arquivar(pasta, cutoff, max(1, options["chunk_size"]))
+            self.stdout.write(f"{arquivados} eventos arquivados em {arquivos} arquivos ({pasta}).")
+
+        if particionado():
+            # Particoes inteiramente antes do corte saem de uma vez; as que cruzam o
+            # corte (o mes do corte e a legado, com todo o historico anterior a 0015)
+            # ficam para o DELETE em lotes abaixo, que o pruning limita a elas.
+            removidas = remover_particoes_antigas(cutoff)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{len(removidas)} particoes removidas (antes de {cutoff})"
+                    + (f": {', '.join(removidas)}." if removidas else ".")
+                )
+            )
+
+        total = self._remover_em_lotes(cutoff)
         self.stdout.write(self.style.SUCCESS(f"{total} eventos removidos (antes de {cutoff})."))
+
+    def _arquivar(self, pasta: Path, cutoff: datetime, chunk_size: int) -> tuple[int, int]:
+        """
+        Um arquivo por dia local, escrito num .tmp e publicado com os.replace: arquivo
+        final existente significa dia ja arquivado (a retomada so apaga). Cada dia e
+        lido com cursor no servidor, sem carregar a tabela em memoria.
+        """
+        antigos = EventoAuditoria.objects.filter(timestamp__lt=cutoff)
+        primeiro = antigos.aggregate(primeiro=Min("timestamp"))["primeiro"]
+        if primeiro is None:
+            return 0, 0
+
+        arquivos = arquivados = 0
+        dia = timezone.localtime(primeiro).date()
+        while True:
+            inicio = _inicio_do_dia(dia)
+            if inicio >= cutoff:
+                break
+            fim = min(_inicio_do_dia(dia + timedelta(days=1)), cutoff)
+            destino = caminho_arquivo(pasta, dia)
+            if not destino.exists():
+                qtd = self._arquivar_dia(destino, antigos.filter(timestamp__gte=inicio, timestamp__lt=fim), chunk_size)
+                if qtd:
+                    arquivos += 1
+                    arquivados += qtd
+            dia += timedelta(days=1)
+        return arquivos, arquivados
+
+    def _arquivar_dia(self, destino: Path, qs, chunk_size: int) -> int:
+        tmp = destino.with_name(destino.name + ".tmp")
+        qtd = 0
+        with gzip.open(tmp, "wt", encoding="utf-8") as fp:
+            for evento in qs.order_by("pk").values(*CAMPOS_ARQUIVO).iterator(chunk_size=chunk_size):
+                evento["timestamp"] = evento["timestamp"].isoformat()
+                fp.write(json.dumps(evento, ensure_ascii=False, separators=(",", ":")))
+                fp.write("\n")
+                qtd += 1
+        if qtd:
+            os.replace(tmp, destino)
+        else:
+            tmp.unlink()
+        return qtd
+
+    def _remover_em_lotes(self, cutoff: datetime) -> int:
+        # Paginacao por chave (pk > ultimo): cada lote e curto e nao rele o que ja saiu.
+        antigos = EventoAuditoria.objects.filter(timestamp__lt=cutoff).order_by("pk")
+        total = 0
+        ultimo = 0
+        while True:
+            ids = list(antigos.filter(pk__gt=ultimo).values_list("pk", flat=True)[: self.batch_size])
+            if not ids:
+                break
+            total += EventoAuditoria.objects.filter(pk__in=ids).delete()[0]
+            ultimo = ids[-1]
+            if len(ids) < self.batch_size:
+                break
+            if self.pausa:
+                time.sleep(self.pausa)
+        return total
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from banco_questoes.catalogo_questoes import remover_versoes_antigas
+from banco_questoes.models import SimuladoTentativa
+
+
+class Command(BaseCommand):
+    help = "Remove tentativas de simulado expiradas e snapshots do catalogo que nenhuma tentativa usa."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now()
+        total, _ = SimuladoTentativa.objects.filter(expira_em__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"{total} tentativas removidas (expiradas antes de {cutoff})."))
+
+        em_uso = set(
+            SimuladoTentativa.objects
+            .exclude(semente__isnull=True)
+            .values_list("catalogo_versao", flat=True)
+            .distinct()
+        )
+        removidos = remover_versoes_antigas(em_uso)
+        self.stdout.write(self.style.SUCCESS(f"{removidos} snapshots antigos do catalogo removidos."))
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from banco_questoes.resumo_auditoria import LOTE_PADRAO, atualizar_resumo
+
+
+class Command(BaseCommand):
+    help = (
+        "Soma os eventos de auditoria novos (id acima da ultima marca) na tabela de resumo "
+        "diario por tipo, app, plano e motivo. Rodar periodicamente (cron), antes do purge_audit_events."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=LOTE_PADRAO, help=f"Eventos por transacao (default: {LOTE_PADRAO}).")
+
+    def handle(self, *args, **options):
+        total = atualizar_resumo(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(f"{total} eventos somados ao resumo diario."))
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from django.conf import settings
+
+from .models import AppModulo, Plano
+
+
+MATRIZ_VERSAO_FILENAME = "matriz_acesso.versao"
+# Sem o marcador em disco (diretorio compartilhado sem escrita), a matriz expira por tempo.
+MATRIZ_TTL_SEM_MARCADOR = 60
+
+
+class AppInfo(NamedTuple):
+    id: int
+    slug: str
+    nome: str
+    ordem_menu: int
+    icone_path: str
+    rota_nome: str
+    ativo: bool
+    em_construcao: bool
+
+
+class RegraApp(NamedTuple):
+    plano_id: int
+    app_modulo_id: int
+    app_slug: str
+    permitido: bool
+    limite_qtd: int | None
+    limite_periodo: str | None
+    limite_periodo_label: str
+
+
+_SEM_REGRAS: Mapping[str, RegraApp] = MappingProxyType({})
+
+
+class MatrizAcesso:
+    """Apps ativos e regras (plano_id, app_slug) -> RegraApp; imutavel depois de montada."""
+
+    __slots__ = ("apps", "_apps_por_slug", "_regras_por_plano")
+
+    def __init__(self, apps: list[AppInfo], regras: list[RegraApp]) -> None:
+        self.apps: tuple[AppInfo, ...] = tuple(apps)
+        self._apps_por_slug = MappingProxyType({app.slug: app for app in self.apps})
+        por_plano: dict[int, dict[str, RegraApp]] = {}
+        for regra in regras:
+            por_plano.setdefault(regra.plano_id, {})[regra.app_slug] = regra
+        self._regras_por_plano = MappingProxyType(
+            {plano_id: MappingProxyType(itens) for plano_id, itens in por_plano.items()}
+        )
+
+    def app(self, app_slug: str) -> AppInfo | None:
+        return self._apps_por_slug.get(app_slug)
+
+    def regras_do_plano(self, plano_id) -> Mapping[str, RegraApp]:
+        return self._regras_por_plano.get(plano_id, _SEM_REGRAS)
+
+    def regra(self, plano_id, app_slug: str) -> RegraApp | None:
+        return self.regras_do_plano(plano_id).get(app_slug)
+
+
+def construir_matriz() -> MatrizAcesso:
+    """
+    Uma query: apps ativos com LEFT JOIN nas regras (uma linha por app e regra; apps
+    sem regra vem uma vez, com as colunas da regra nulas).
+    """
+    periodos = dict(Plano.Periodo.choices)
+    apps: dict[int, AppInfo] = {}
+    regras = []
+    linhas = (
+        AppModulo.objects.filter(ativo=True)
+        .order_by("ordem_menu", "nome", "id")
+        .values_list(
+            "id",
+            "slug",
+            "nome",
+            "ordem_menu",
+            "icone_path",
+            "rota_nome",
+            "ativo",
+            "em_construcao",
+            "permissoes_planos__plano_id",
+            "permissoes_planos__permitido",
+            "permissoes_planos__limite_qtd",
+            "permissoes_planos__limite_periodo",
+        )
+    )
+    for *campos_app, plano_id, permitido, limite_qtd, limite_periodo in linhas:
+        app = apps.get(campos_app[0])
+        if app is None:
+            app = apps[campos_app[0]] = AppInfo(*campos_app)
+        if plano_id is None:
+            continue
+        regras.append(
+            RegraApp(
+                plano_id=plano_id,
+                app_modulo_id=app.id,
+                app_slug=app.slug,
+                permitido=permitido,
+                limite_qtd=limite_qtd,
+                limite_periodo=limite_periodo,
+                limite_periodo_label=str(periodos.get(limite_periodo, limite_periodo)) if limite_periodo else "",
+            )
+        )
+    return MatrizAcesso(list(apps.values()), regras)
+
+
+class _EstadoMatriz:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.assinatura: tuple | None = None
+        self.matriz: MatrizAcesso | None = None
+        self.montada_em = 0.0
+
+
+_estado = _EstadoMatriz()
+
+
+def _marcador_path() -> Path:
+    return Path(settings.SHARED_CACHE_ROOT) / MATRIZ_VERSAO_FILENAME
+
+
+def _assinatura_marcador(path: Path) -> tuple | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _publicar_versao(path: Path) -> tuple | None:
+    # Conteudo novo + os.replace: muda inode e mtime, que e o que os workers comparam.
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(uuid.uuid4().hex, encoding="ascii")
+        os.replace(tmp, path)
+    except OSError:
+        return None
+    return _assinatura_marcador(path)
+
+
+def get_matriz_acesso() -> MatrizAcesso:
+    """
+    Matriz de permissoes do processo. O caminho quente e um os.stat no marcador de
+    versao; a matriz so e remontada (uma query) quando outro processo publica
+    uma versao nova.
+    """
+    path = _marcador_path()
+    assinatura = _assinatura_marcador(path) or _publicar_versao(path)
+    matriz = _estado.matriz
+    if matriz is not None and assinatura == _estado.assinatura:
+        if assinatura is not None or time.monotonic() - _estado.montada_em < MATRIZ_TTL_SEM_MARCADOR:
+            return matriz
+
+    with _estado.lock:
+        matriz = construir_matriz()
+        _estado.matriz = matriz
+        _estado.assinatura = assinatura
+        _estado.montada_em = time.monotonic()
+    return matriz
+
+
+def descartar_matriz_local() -> None:
+    with _estado.lock:
+        _estado.matriz = None
+        _estado.assinatura = None
+
+
+def invalidar_matriz_acesso() -> None:
+    """Publica uma versao nova: todos os workers remontam a matriz na proxima consulta."""
+    descartar_matriz_local()
+    _publicar_versao(_marcador_path())
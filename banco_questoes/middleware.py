@@ -1,12 +1,45 @@
 from __future__ import annotations
 
+import logging
 import uuid
 
 from django.conf import settings
 
+from .auditoria import AUDIT_BUFFER_ATTR, descarregar_eventos
 from .meta_capi import send_meta_event
 
 
+logger = logging.getLogger(__name__)
+
+
+class AuditoriaBufferMiddleware:
+    """
+    Acumula os log_event da requisicao e grava todos num unico bulk_create no fim.
+    Falha ao gravar a auditoria so e logada: nunca troca a resposta (nem a excecao
+    da view) por um erro.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        setattr(request, AUDIT_BUFFER_ATTR, [])
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self._descarregar(request)
+            raise
+        self._descarregar(request)
+        return response
+
+    @staticmethod
+    def _descarregar(request) -> None:
+        try:
+            descarregar_eventos(request)
+        except Exception:
+            logger.exception("Falha ao gravar eventos de auditoria da requisicao %s", request.path)
+
+
 class MetaPageViewCapiMiddleware:
     PAGEVIEW_NAMESPACES = {
         "menu",
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-17 10:30
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banco_questoes', '0009_plano_permite_upgrade_pix'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimuladoTentativa',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('modo', models.CharField(default='PROVA', max_length=20)),
+                ('filtros', models.JSONField(blank=True, default=dict)),
+                ('question_ids', models.JSONField(default=list)),
+                ('respostas', models.TextField(blank=True, default='')),
+                ('acertos', models.PositiveSmallIntegerField(default=0)),
+                ('iniciado_em', models.DateTimeField(auto_now_add=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+                ('expira_em', models.DateTimeField()),
+                ('curso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simulado_tentativas', to='banco_questoes.curso')),
+                ('modulo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='simulado_tentativas', to='banco_questoes.cursomodulo')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simulado_tentativas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expira_em'], name='banco_quest_expira__54a06f_idx'), models.Index(fields=['usuario', 'iniciado_em'], name='banco_quest_usuario_90c6e4_idx')],
+            },
+        ),
+    ]
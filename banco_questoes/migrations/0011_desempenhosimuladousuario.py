@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-17 11:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('banco_questoes', '0010_simuladotentativa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DesempenhoSimuladoUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='desempenho_simulado', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('questoes', models.JSONField(blank=True, default=dict)),
+                ('modulos', models.JSONField(blank=True, default=dict)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
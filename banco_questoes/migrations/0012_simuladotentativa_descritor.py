@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banco_questoes', '0011_desempenhosimuladousuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simuladotentativa',
+            name='catalogo_versao',
+            field=models.CharField(blank=True, default='', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='simuladotentativa',
+            name='faceta',
+            field=models.CharField(blank=True, default='', max_length=160),
+        ),
+        migrations.AddField(
+            model_name='simuladotentativa',
+            name='qtd',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='simuladotentativa',
+            name='semente',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='simuladotentativa',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
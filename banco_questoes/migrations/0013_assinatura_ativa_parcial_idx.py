@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 11:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banco_questoes', '0012_simuladotentativa_descritor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assinatura',
+            index=models.Index(condition=models.Q(('status', 'ATIVO')), fields=['usuario', '-inicio', '-criado_em'], name='bq_assin_ativa_user_ini_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-17 12:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def preencher_assinatura_atual(apps, schema_editor):
+    Assinatura = apps.get_model("banco_questoes", "Assinatura")
+    AssinaturaAtual = apps.get_model("banco_questoes", "AssinaturaAtual")
+    now = timezone.now()
+    vigentes = (
+        Assinatura.objects.filter(status="ATIVO")
+        .filter(Q(valid_until__isnull=True) | Q(valid_until__gte=now))
+        .order_by("usuario_id", "-inicio", "-criado_em")
+        .values_list("usuario_id", "id")
+    )
+    ponteiros = {}
+    for usuario_id, assinatura_id in vigentes.iterator():
+        ponteiros.setdefault(usuario_id, assinatura_id)
+    AssinaturaAtual.objects.bulk_create(
+        [AssinaturaAtual(usuario_id=usuario_id, assinatura_id=assinatura_id) for usuario_id, assinatura_id in ponteiros.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banco_questoes', '0013_assinatura_ativa_parcial_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssinaturaAtual',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='assinatura_atual', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('assinatura', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='banco_questoes.assinatura')),
+            ],
+        ),
+        migrations.RunPython(preencher_assinatura_atual, migrations.RunPython.noop),
+    ]
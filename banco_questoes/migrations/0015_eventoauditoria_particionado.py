@@ -0,0 +1,163 @@
+# Generated by Django 6.0 on 2026-10-17 12:30
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations
+from django.utils import timezone
+
+
+MESES_INICIAIS = 3
+
+
+def _inicio_mes(momento: datetime) -> datetime:
+    # Particoes em meses UTC (a conexao do Django roda em UTC).
+    momento = momento.astimezone(dt_timezone.utc)
+    return datetime(momento.year, momento.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _mes_seguinte(mes: datetime) -> datetime:
+    return mes.replace(year=mes.year + mes.month // 12, month=mes.month % 12 + 1)
+
+
+def particionar_tabela(connection, tabela: str, tabela_usuario: str, *, agora=None, meses=MESES_INICIAIS) -> None:
+    """
+    Recria `tabela` particionada por mes em `timestamp`. A tabela atual vira a particao
+    `<tabela>_legado`, sem copiar linhas, de MINVALUE ate o fim do mes do evento mais
+    novo (no minimo o fim do mes corrente); as particoes mensais comecam depois disso.
+    """
+    qn = connection.ops.quote_name
+    legado = f"{tabela}_legado"
+    sequencia = f"{tabela}_part_id_seq"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(tabela)} RENAME TO {qn(legado)}")
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = %s AND indexname NOT LIKE %s",
+            [legado, "%_pkey"],
+        )
+        indices = cursor.fetchall()
+        for nome, _ in indices:
+            cursor.execute(f"ALTER INDEX {qn(nome)} RENAME TO {qn((nome[:58] + '_leg'))}")
+
+        # A PK passa a ser (id, timestamp), herdada do pai no ATTACH; a PK so em id
+        # da tabela antiga impediria o ATTACH.
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+            [qn(legado)],
+        )
+        for (pkey,) in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {qn(legado)} DROP CONSTRAINT {qn(pkey)}")
+
+        # O id passa a vir de uma sequencia do pai; a coluna da particao nao pode
+        # manter identity/default proprios.
+        cursor.execute(f"ALTER TABLE {qn(legado)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {qn(legado)} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1, MAX({qn('timestamp')}) FROM {qn(legado)}")
+        proximo_id, mais_novo = cursor.fetchone()
+
+        # O ATTACH valida todas as linhas contra o limite: ele tem que cobrir o evento
+        # mais novo, inclusive os do mes corrente.
+        limite_legado = _mes_seguinte(_inicio_mes(agora or timezone.now()))
+        if mais_novo is not None:
+            limite_legado = max(limite_legado, _mes_seguinte(_inicio_mes(mais_novo)))
+
+        cursor.execute(f"CREATE TABLE {qn(tabela)} (LIKE {qn(legado)}) PARTITION BY RANGE ({qn('timestamp')})")
+        cursor.execute(f"CREATE SEQUENCE {qn(sequencia)} OWNED BY {qn(tabela)}.id START WITH {int(proximo_id)}")
+        cursor.execute(f"ALTER TABLE {qn(tabela)} ALTER COLUMN id SET DEFAULT nextval('{sequencia}')")
+        cursor.execute(f"ALTER TABLE {qn(tabela)} ADD PRIMARY KEY (id, {qn('timestamp')})")
+        cursor.execute(
+            f"ALTER TABLE {qn(tabela)} ADD CONSTRAINT {qn(tabela[:48] + '_usuario_id_fk')} "
+            f"FOREIGN KEY (usuario_id) REFERENCES {qn(tabela_usuario)} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+
+        cursor.execute(
+            f"ALTER TABLE {qn(tabela)} ATTACH PARTITION {qn(legado)} FOR VALUES FROM (MINVALUE) TO (%s)",
+            [limite_legado],
+        )
+        mes = limite_legado
+        for _ in range(meses):
+            fim = _mes_seguinte(mes)
+            cursor.execute(
+                f"CREATE TABLE {qn(f'{tabela}_p{mes:%Y%m}')} PARTITION OF {qn(tabela)} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [mes, fim],
+            )
+            mes = fim
+        # Rede de seguranca: sem particao para o mes, o INSERT cairia com erro. O
+        # criar_particoes_auditoria move para a particao nova o que cair aqui.
+        cursor.execute(f"CREATE TABLE {qn(tabela + '_default')} PARTITION OF {qn(tabela)} DEFAULT")
+
+        # Indices no pai (criados em todas as particoes; na legado reaproveita os existentes).
+        for _, definicao in indices:
+            definicao = re.sub(r" ON (\S+\.)?\S+ ", f" ON {qn(tabela)} ", definicao, count=1)
+            cursor.execute(definicao)
+
+
+def desparticionar_tabela(connection, tabela: str, tabela_usuario: str) -> None:
+    """
+    Reverso de particionar_tabela: copia os eventos de todas as particoes para uma
+    tabela simples (id identity como na 0001) e a poe no lugar da particionada.
+    """
+    qn = connection.ops.quote_name
+    simples = f"{tabela}_simples"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = %s AND indexname NOT LIKE %s",
+            [tabela, "%_pkey"],
+        )
+        # Indice do pai particionado sai como "ON ONLY <tabela>".
+        indices = [definicao.replace(" ON ONLY ", " ON ", 1) for (definicao,) in cursor.fetchall()]
+
+        cursor.execute(f"CREATE TABLE {qn(simples)} (LIKE {qn(tabela)})")
+        cursor.execute(f"ALTER TABLE {qn(simples)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+        cursor.execute(f"INSERT INTO {qn(simples)} SELECT * FROM {qn(tabela)}")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {qn(simples)}")
+        (proximo_id,) = cursor.fetchone()
+        cursor.execute(f"ALTER TABLE {qn(simples)} ALTER COLUMN id RESTART WITH {int(proximo_id)}")
+
+        # Leva junto as particoes, a sequencia do pai e os indices.
+        cursor.execute(f"DROP TABLE {qn(tabela)}")
+        cursor.execute(f"ALTER TABLE {qn(simples)} RENAME TO {qn(tabela)}")
+        cursor.execute(f"ALTER TABLE {qn(tabela)} ADD CONSTRAINT {qn(tabela[:58] + '_pkey')} PRIMARY KEY (id)")
+        cursor.execute(
+            f"ALTER TABLE {qn(tabela)} ADD CONSTRAINT {qn(tabela[:48] + '_usuario_id_fk')} "
+            f"FOREIGN KEY (usuario_id) REFERENCES {qn(tabela_usuario)} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+        for definicao in indices:
+            cursor.execute(definicao)
+
+
+def _tabelas(apps) -> tuple[str, str]:
+    evento_model = apps.get_model("banco_questoes", "EventoAuditoria")
+    tabela_usuario = evento_model._meta.get_field("usuario").related_model._meta.db_table
+    return evento_model._meta.db_table, tabela_usuario
+
+
+def particionar_eventos(apps, schema_editor):
+    # So no PostgreSQL; nos outros bancos a tabela continua simples.
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    particionar_tabela(connection, *_tabelas(apps))
+
+
+def desparticionar_eventos(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    desparticionar_tabela(connection, *_tabelas(apps))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banco_questoes', '0014_assinaturaatual'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_eventos, desparticionar_eventos),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-17 13:10
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+
+def preencher_cadastros_recentes(apps, schema_editor):
+    # Cadastros ainda dentro do cooldown (2h) passam a valer na tabela nova.
+    EventoAuditoria = apps.get_model("banco_questoes", "EventoAuditoria")
+    CadastroRecente = apps.get_model("banco_questoes", "CadastroRecente")
+    eventos = (
+        EventoAuditoria.objects
+        .filter(tipo="auth_register", timestamp__gte=timezone.now() - timedelta(hours=2))
+        .order_by("timestamp")
+        .values_list("ip", "device_id", "timestamp")
+    )
+    ultimos = {}
+    for ip, device_id, timestamp in eventos.iterator():
+        for tipo, valor in (("ip", ip), ("device", device_id)):
+            if valor:
+                chave = salted_hmac("banco_questoes.throttle_cadastro", f"{tipo}:{valor}", algorithm="sha256").hexdigest()
+                ultimos[chave] = timestamp
+    CadastroRecente.objects.bulk_create(
+        [CadastroRecente(chave=chave, ultimo_cadastro_em=timestamp) for chave, timestamp in ultimos.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banco_questoes', '0015_eventoauditoria_particionado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CadastroRecente',
+            fields=[
+                ('chave', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('ultimo_cadastro_em', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.RunPython(preencher_cadastros_recentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banco_questoes', '0016_cadastrorecente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoAuditoriaProgresso',
+            fields=[
+                ('chave', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('ultimo_evento_id', models.BigIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumoAuditoriaDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('tipo', models.CharField(max_length=60)),
+                ('app_slug', models.CharField(blank=True, default='', max_length=120)),
+                ('plano', models.CharField(blank=True, default='', max_length=120)),
+                ('motivo', models.CharField(blank=True, default='', max_length=60)),
+                ('total', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-dia', 'tipo', 'app_slug', 'plano', 'motivo'],
+                'constraints': [models.UniqueConstraint(fields=('dia', 'tipo', 'app_slug', 'plano', 'motivo'), name='uniq_resumo_auditoria_dia_dimensoes')],
+            },
+        ),
+    ]
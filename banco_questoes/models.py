@@ -335,12 +335,41 @@ class Assinatura(models.Model):
         ordering = ["-criado_em"]
         indexes = [
             models.Index(fields=["usuario", "status"]),
+            # Consulta da assinatura ativa (get_assinatura_ativa): expiradas saem do
+            # indice quando o expirar_assinaturas muda o status.
+            models.Index(
+                fields=["usuario", "-inicio", "-criado_em"],
+                condition=models.Q(status="ATIVO"),
+                name="bq_assin_ativa_user_ini_idx",
+            ),
         ]
 
     def __str__(self) -> str:
         return f"{self.usuario} :: {self.nome_plano_snapshot or self.plano_id}"
 
 
+class AssinaturaAtual(models.Model):
+    """Ponteiro para a assinatura vigente do usuario (mantido por banco_questoes.assinaturas)."""
+
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="assinatura_atual",
+    )
+    assinatura = models.ForeignKey(
+        Assinatura,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+    )
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.usuario} -> {self.assinatura_id or '-'}"
+
+
 class SimuladoUso(models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -366,6 +395,75 @@ class SimuladoUso(models.Model):
         return f"{self.usuario} :: {self.janela_inicio.date()}-{self.janela_fim.date()}"
 
 
+class SimuladoTentativa(models.Model):
+    """
+    Estado de um simulado em andamento. A sessao guarda apenas o id; cada resposta
+    e um UPDATE que acrescenta um caractere em `respostas` (ordem da alternativa).
+
+    As questoes sao descritas por (catalogo_versao, faceta, semente, qtd) e
+    regeneradas do catalogo compartilhado; `question_ids` so e gravado quando o
+    sorteio nao e reproduzivel (ex.: modo ADAPTATIVO).
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="simulado_tentativas",
+    )
+    curso = models.ForeignKey(Curso, on_delete=models.CASCADE, related_name="simulado_tentativas")
+    modulo = models.ForeignKey(
+        CursoModulo,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="simulado_tentativas",
+    )
+    modo = models.CharField(max_length=20, default="PROVA")
+    filtros = models.JSONField(default=dict, blank=True)
+    catalogo_versao = models.CharField(max_length=16, blank=True, default="")
+    faceta = models.CharField(max_length=160, blank=True, default="")
+    semente = models.BigIntegerField(null=True, blank=True)
+    qtd = models.PositiveSmallIntegerField(default=0)
+    question_ids = models.JSONField(default=list, blank=True)
+    respostas = models.TextField(blank=True, default="")
+    acertos = models.PositiveSmallIntegerField(default=0)
+    iniciado_em = models.DateTimeField(auto_now_add=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+    expira_em = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expira_em"]),
+            models.Index(fields=["usuario", "iniciado_em"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.usuario} :: {self.modo} {len(self.respostas)}/{self.qtd}"
+
+
+class DesempenhoSimuladoUsuario(models.Model):
+    """
+    Historico agregado do usuario no simulado, atualizado uma vez por tentativa
+    finalizada. Alimenta o sorteio do modo ADAPTATIVO sem consultas por questao.
+    """
+
+    usuario = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="desempenho_simulado",
+    )
+    # {questao_id: [respostas, erros, ultimo_dia]} (ultimo_dia = dias desde 1970-01-01 UTC)
+    questoes = models.JSONField(default=dict, blank=True)
+    # {modulo_id: respostas}
+    modulos = models.JSONField(default=dict, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.usuario} :: {len(self.questoes)} questoes"
+
+
 class UsoAppJanela(models.Model):
     usuario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -498,3 +596,47 @@ class EventoAuditoria(models.Model):
 
     def __str__(self) -> str:
         return f"{self.tipo} @ {self.timestamp.isoformat()}"
+
+
+class ResumoAuditoriaDiario(models.Model):
+    """Contagem diaria de eventos por (tipo, app, plano, motivo), mantida pelo resumir_auditoria."""
+
+    dia = models.DateField()
+    tipo = models.CharField(max_length=60)
+    app_slug = models.CharField(max_length=120, blank=True, default="")
+    plano = models.CharField(max_length=120, blank=True, default="")
+    motivo = models.CharField(max_length=60, blank=True, default="")
+    total = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-dia", "tipo", "app_slug", "plano", "motivo"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dia", "tipo", "app_slug", "plano", "motivo"],
+                name="uniq_resumo_auditoria_dia_dimensoes",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.dia} {self.tipo} = {self.total}"
+
+
+class ResumoAuditoriaProgresso(models.Model):
+    """Ultimo EventoAuditoria.id ja somado em ResumoAuditoriaDiario (high-water mark)."""
+
+    chave = models.CharField(max_length=40, primary_key=True)
+    ultimo_evento_id = models.BigIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.chave}: {self.ultimo_evento_id}"
+
+
+class CadastroRecente(models.Model):
+    """Ultimo cadastro por IP/dispositivo (chave com hash), para o cooldown de registro."""
+
+    chave = models.CharField(max_length=64, primary_key=True)
+    ultimo_cadastro_em = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.chave[:12]} @ {self.ultimo_cadastro_em.isoformat()}"
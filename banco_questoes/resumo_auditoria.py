@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import EventoAuditoria, ResumoAuditoriaDiario, ResumoAuditoriaProgresso
+
+
+PROGRESSO_CHAVE = "diario"
+LOTE_PADRAO = 5000
+# Eventos mais novos que isto ficam para a proxima rodada: um id menor ainda nao
+# commitado (buffer de auditoria, transacao longa) nao pode ficar para tras da marca.
+ATRASO_SEGUNDOS = 60
+
+
+def _texto(valor, limite: int) -> str:
+    return str(valor or "")[:limite]
+
+
+def dimensoes_evento(contexto) -> tuple[str, str, str]:
+    """(app_slug, plano, motivo) a partir do contexto_json; campos ausentes ficam vazios."""
+    contexto = contexto if isinstance(contexto, dict) else {}
+    return (
+        _texto(contexto.get("app_slug"), 120),
+        _texto(contexto.get("plano") or contexto.get("plano_nome"), 120),
+        # Eventos de falha (ex.: meta_capi_event_failed) so tem `reason`.
+        _texto(contexto.get("motivo") or contexto.get("reason"), 60),
+    )
+
+
+def _peso(contexto) -> int:
+    # Evento amostrado (politica "sample:N" do log_event) representa N ocorrencias.
+    try:
+        return max(1, int(contexto.get("amostra_1_em") or 1)) if isinstance(contexto, dict) else 1
+    except (TypeError, ValueError):
+        return 1
+
+
+def _upsert_sql(qtd_linhas: int) -> str:
+    qn = connection.ops.quote_name
+    tabela = qn(ResumoAuditoriaDiario._meta.db_table)
+    colunas_unicas = ", ".join(qn(c) for c in ("dia", "tipo", "app_slug", "plano", "motivo"))
+    valores = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * qtd_linhas)
+    return (
+        f"INSERT INTO {tabela} ({colunas_unicas}, {qn('total')}) "
+        f"VALUES {valores} "
+        f"ON CONFLICT ({colunas_unicas}) "
+        f"DO UPDATE SET {qn('total')} = {tabela}.{qn('total')} + EXCLUDED.{qn('total')}"
+    )
+
+
+def _somar(contagens: Counter) -> None:
+    itens = list(contagens.items())
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(itens), 500):
+            lote = itens[inicio:inicio + 500]
+            params = []
+            for (dia, tipo, app_slug, plano, motivo), total in lote:
+                params.extend([connection.ops.adapt_datefield_value(dia), tipo, app_slug, plano, motivo, total])
+            cursor.execute(_upsert_sql(len(lote)), params)
+
+
+def atualizar_resumo(*, lote: int = LOTE_PADRAO, agora=None) -> int:
+    """
+    Soma em ResumoAuditoriaDiario os eventos com id acima da marca de progresso, em
+    lotes (cada lote e a marca avancam na mesma transacao). Devolve quantos eventos
+    foram lidos.
+    """
+    lote = max(1, lote)
+    corte = (agora or timezone.now()) - timedelta(seconds=ATRASO_SEGUNDOS)
+    ResumoAuditoriaProgresso.objects.get_or_create(chave=PROGRESSO_CHAVE)
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            progresso = ResumoAuditoriaProgresso.objects.select_for_update().get(chave=PROGRESSO_CHAVE)
+            novos = EventoAuditoria.objects.filter(pk__gt=progresso.ultimo_evento_id)
+            # Para no primeiro evento recente demais: nada acima dele entra nesta rodada.
+            limite_id = novos.filter(timestamp__gte=corte).aggregate(limite=Min("pk"))["limite"]
+            if limite_id is not None:
+                novos = novos.filter(pk__lt=limite_id)
+            eventos = list(novos.order_by("pk").values_list("pk", "tipo", "timestamp", "contexto_json")[:lote])
+            if not eventos:
+                break
+
+            contagens: Counter = Counter()
+            for _, tipo, timestamp, contexto in eventos:
+                dia = timezone.localtime(timestamp).date()
+                contagens[(dia, tipo, *dimensoes_evento(contexto))] += _peso(contexto)
+            _somar(contagens)
+
+            progresso.ultimo_evento_id = eventos[-1][0]
+            progresso.save(update_fields=["ultimo_evento_id", "atualizado_em"])
+        total += len(eventos)
+        if len(eventos) < lote:
+            break
+    return total
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .assinaturas import atualizar_assinatura_atual
+from .catalogo_questoes import invalidar_catalogo
+from .matriz_acesso import invalidar_matriz_acesso
+from .models import AppModulo, Assinatura, Plano, PlanoPermissaoApp, Questao
+
+
+@receiver(post_save, sender=Questao)
+@receiver(post_delete, sender=Questao)
+def _questao_alterada(sender, instance, **kwargs):
+    # So invalida depois do commit: um worker que reconstruir o catalogo no meio
+    # de um import ainda veria os dados antigos.
+    transaction.on_commit(invalidar_catalogo)
+
+
+@receiver(post_save, sender=Plano)
+@receiver(post_delete, sender=Plano)
+@receiver(post_save, sender=PlanoPermissaoApp)
+@receiver(post_delete, sender=PlanoPermissaoApp)
+@receiver(post_save, sender=AppModulo)
+@receiver(post_delete, sender=AppModulo)
+def _permissoes_alteradas(sender, instance, **kwargs):
+    # So depois do commit, inclusive neste processo: descartar antes faria a proxima
+    # leitura remontar (e guardar) a matriz com dados ainda nao commitados, que
+    # ficariam valendo mesmo se a transacao sofresse rollback.
+    transaction.on_commit(invalidar_matriz_acesso)
+
+
+@receiver(post_save, sender=Assinatura)
+@receiver(post_delete, sender=Assinatura)
+def _assinatura_alterada(sender, instance, origin=None, **kwargs):
+    # Exclusao em cascata do proprio usuario: o ponteiro sai junto; recalcular aqui
+    # regravaria um AssinaturaAtual para um usuario que deixa de existir.
+    if _excluindo_usuario(origin):
+        return
+    # Dentro da mesma transacao de quem gravou (cadastro, upgrade, admin): o ponteiro
+    # nunca fica visivel apontando para uma assinatura que ainda nao foi commitada.
+    atualizar_assinatura_atual(instance.usuario_id)
+
+
+def _excluindo_usuario(origin) -> bool:
+    modelo_usuario = get_user_model()
+    if isinstance(origin, QuerySet):
+        return origin.model is modelo_usuario
+    return isinstance(origin, modelo_usuario)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import heapq
+import math
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from .catalogo_questoes import CatalogoQuestoes, faceta_key
+from .models import DesempenhoSimuladoUsuario
+from .simulado_bundle import ExamBundle
+
+
+# Questao vista ha N dias recupera ~63% do peso em N = MEIA_VIDA_RECENCIA_DIAS.
+MEIA_VIDA_RECENCIA_DIAS = 7.0
+
+
+def _dia(agora=None) -> int:
+    agora = agora or timezone.now()
+    return int(agora.timestamp() // 86400)
+
+
+def registrar_desempenho(usuario_id, bundle: ExamBundle, answers: dict[str, dict]) -> None:
+    """Soma as respostas de uma tentativa finalizada ao historico do usuario."""
+    if not answers:
+        return
+    hoje = _dia()
+    with transaction.atomic():
+        desempenho, _ = (
+            DesempenhoSimuladoUsuario.objects
+            .select_for_update()
+            .get_or_create(usuario_id=usuario_id)
+        )
+        for qid, info in answers.items():
+            respostas, erros, _ = desempenho.questoes.get(qid) or (0, 0, None)
+            desempenho.questoes[qid] = [respostas + 1, erros + int(not info.get("is_correct")), hoje]
+            questao = bundle.questao(qid)
+            if questao is not None:
+                modulo_id = str(questao.modulo_id)
+                desempenho.modulos[modulo_id] = desempenho.modulos.get(modulo_id, 0) + 1
+        desempenho.save(update_fields=["questoes", "modulos", "atualizado_em"])
+
+
+def _peso(estatistica, hoje: int, peso_modulo: float) -> float:
+    respostas, erros, ultimo_dia = estatistica or (0, 0, None)
+    # Taxa de erro suavizada: questao nunca vista vale 0.5.
+    taxa_erro = (erros + 1) / (respostas + 2)
+    if ultimo_dia is None:
+        recencia = 1.0
+    else:
+        dias = max(hoje - ultimo_dia, 0) + 1
+        recencia = 1.0 - math.exp(-dias / MEIA_VIDA_RECENCIA_DIAS)
+    return taxa_erro * recencia * peso_modulo
+
+
+def sortear_adaptativo(
+    catalogo: CatalogoQuestoes,
+    usuario,
+    *,
+    curso_id,
+    modulo_id="",
+    dificuldade: str = "",
+    com_imagem: bool = False,
+    so_placas: bool = False,
+    k: int,
+    rng: random.Random | None = None,
+) -> list:
+    """
+    Sorteio ponderado sem reposicao sobre a faceta do catalogo. O peso de cada
+    questao combina taxa de erro do usuario, tempo desde a ultima vez que ela foi
+    vista e cobertura do modulo. Usa chaves de Efraimidis-Spirakis
+    (log(u) / peso, mantendo as k maiores): uma passada, memoria O(k), uma query.
+    """
+    if k <= 0:
+        return []
+    rng = rng or random
+    estatisticas = (
+        DesempenhoSimuladoUsuario.objects
+        .filter(usuario=usuario)
+        .values_list("questoes", "modulos")
+        .first()
+    )
+    stats_questoes, stats_modulos = estatisticas or ({}, {})
+    hoje = _dia()
+
+    modulos = [str(modulo_id)] if modulo_id else catalogo.modulos(curso_id)
+    media_modulo = sum(stats_modulos.get(m, 0) for m in modulos) / max(len(modulos), 1)
+
+    def candidatos():
+        for m in modulos:
+            # Modulos pouco praticados em relacao a media ganham peso.
+            peso_modulo = (media_modulo + 1) / (stats_modulos.get(m, 0) + 1)
+            for qid in catalogo.ids(faceta_key(curso_id, m, dificuldade, com_imagem, so_placas)):
+                peso = _peso(stats_questoes.get(str(qid)), hoje, peso_modulo)
+                # 1 - random() fica em (0, 1]: evita log(0).
+                yield math.log(1.0 - rng.random()) / peso, qid
+
+    return [qid for _, qid in heapq.nlargest(k, candidatos(), key=lambda item: item[0])]
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from django.core.cache import cache
+
+from .models import Alternativa, Questao
+
+
+BUNDLE_CACHE_PREFIX = "simulado:bundle:"
+BUNDLE_TTL_SECONDS = 6 * 60 * 60
+
+
+class CursoBundle:
+    __slots__ = ("id", "nome")
+
+    def __init__(self, id, nome: str) -> None:
+        self.id = id
+        self.nome = nome
+
+
+class ModuloBundle:
+    __slots__ = ("id", "nome", "ordem")
+
+    def __init__(self, id, nome: str, ordem: int) -> None:
+        self.id = id
+        self.nome = nome
+        self.ordem = ordem
+
+
+class AlternativaBundle:
+    __slots__ = ("id", "texto", "is_correta", "ordem")
+
+    def __init__(self, id, texto: str, is_correta: bool, ordem: int) -> None:
+        self.id = id
+        self.texto = texto
+        self.is_correta = is_correta
+        self.ordem = ordem
+
+
+class QuestaoBundle:
+    __slots__ = (
+        "id",
+        "curso",
+        "modulo",
+        "modulo_id",
+        "numero_no_modulo",
+        "dificuldade",
+        "enunciado",
+        "comentario",
+        "codigo_placa",
+        "imagem_arquivo",
+        "import_hash",
+        "alternativas",
+    )
+
+    def __init__(self, questao: Questao, curso: CursoBundle, modulo: ModuloBundle) -> None:
+        self.id = questao.id
+        self.curso = curso
+        self.modulo = modulo
+        self.modulo_id = questao.modulo_id
+        self.numero_no_modulo = questao.numero_no_modulo
+        self.dificuldade = questao.dificuldade
+        self.enunciado = questao.enunciado
+        self.comentario = questao.comentario
+        self.codigo_placa = questao.codigo_placa
+        self.imagem_arquivo = questao.imagem_arquivo
+        self.import_hash = questao.import_hash
+        self.alternativas: tuple[AlternativaBundle, ...] = ()
+
+    @property
+    def tem_imagem(self) -> bool:
+        return bool(self.imagem_arquivo)
+
+    @property
+    def correta(self) -> AlternativaBundle | None:
+        return next((alt for alt in self.alternativas if alt.is_correta), None)
+
+    def alternativa(self, alt_id) -> AlternativaBundle | None:
+        alt_id = str(alt_id or "")
+        return next((alt for alt in self.alternativas if str(alt.id) == alt_id), None)
+
+
+class ExamBundle:
+    """Questoes e alternativas de uma tentativa, prontas para render e correcao."""
+
+    __slots__ = ("attempt_id", "question_ids", "questoes")
+
+    def __init__(self, attempt_id: str, question_ids: list[str], questoes: dict[str, QuestaoBundle]) -> None:
+        self.attempt_id = attempt_id
+        self.question_ids = question_ids
+        self.questoes = questoes
+
+    def questao(self, qid) -> QuestaoBundle | None:
+        return self.questoes.get(str(qid))
+
+    def em_ordem(self) -> list[QuestaoBundle]:
+        return [self.questoes[qid] for qid in self.question_ids if qid in self.questoes]
+
+    @property
+    def curso(self) -> CursoBundle | None:
+        for questao in self.questoes.values():
+            return questao.curso
+        return None
+
+
+def _cache_key(attempt_id: str) -> str:
+    return f"{BUNDLE_CACHE_PREFIX}{attempt_id}"
+
+
+def carregar_bundle(attempt_id: str, question_ids: Iterable) -> ExamBundle:
+    """Carrega as questoes e alternativas da tentativa em duas queries e guarda no cache."""
+    qids = [str(qid) for qid in question_ids]
+    cursos: dict = {}
+    modulos: dict = {}
+    questoes: dict[str, QuestaoBundle] = {}
+    for questao in Questao.objects.filter(id__in=qids).select_related("curso", "modulo"):
+        curso = cursos.get(questao.curso_id)
+        if curso is None:
+            curso = cursos[questao.curso_id] = CursoBundle(questao.curso_id, questao.curso.nome)
+        modulo = modulos.get(questao.modulo_id)
+        if modulo is None:
+            modulo = modulos[questao.modulo_id] = ModuloBundle(
+                questao.modulo_id,
+                questao.modulo.nome,
+                questao.modulo.ordem,
+            )
+        questoes[str(questao.id)] = QuestaoBundle(questao, curso, modulo)
+
+    alternativas: dict[str, list[AlternativaBundle]] = {}
+    for alt in Alternativa.objects.filter(questao_id__in=qids).order_by("questao_id", "ordem"):
+        alternativas.setdefault(str(alt.questao_id), []).append(
+            AlternativaBundle(alt.id, alt.texto, alt.is_correta, alt.ordem)
+        )
+    for qid, questao in questoes.items():
+        questao.alternativas = tuple(alternativas.get(qid, ()))
+
+    bundle = ExamBundle(attempt_id, qids, questoes)
+    if attempt_id:
+        cache.set(_cache_key(attempt_id), bundle, BUNDLE_TTL_SECONDS)
+    return bundle
+
+
+def get_bundle(attempt_id: str, question_ids: Iterable) -> ExamBundle:
+    """
+    Busca o bundle da tentativa no cache. Em caso de falta (outro worker com cache
+    local, expiracao, reinicio) recarrega do banco com as mesmas duas queries.
+    """
+    if attempt_id:
+        bundle = cache.get(_cache_key(attempt_id))
+        if isinstance(bundle, ExamBundle):
+            return bundle
+    return carregar_bundle(attempt_id, question_ids)
+
+
+def descartar_bundle(attempt_id: str) -> None:
+    if attempt_id:
+        cache.delete(_cache_key(attempt_id))
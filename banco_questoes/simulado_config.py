@@ -40,6 +40,11 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "qtd_max": 50,
         "modes": ["PROVA", "ESTUDO"],
     },
+    # Prova DETRAN: pesos por CursoModulo.ordem; vazio = proporcional ao tamanho do modulo
+    "detran": {
+        "qtd": 30,
+        "modulos": {},
+    },
 }
 
 CONFIG_FILENAME = "config_simulado.json"
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import random
+
+from .catalogo_questoes import DIFICULDADES, SEM_DIFICULDADE, CatalogoQuestoes, faceta_key
+from .models import CursoModulo
+
+
+DETRAN_QTD_PADRAO = 30
+ESTRATOS_DIFICULDADE = (*DIFICULDADES, SEM_DIFICULDADE)
+
+
+def estratos_do_curso(catalogo: CatalogoQuestoes, curso_id) -> dict[tuple[str, str], int]:
+    """{(modulo_id, dificuldade): questoes disponiveis}, lido das facetas do catalogo."""
+    estratos = {}
+    for modulo_id in catalogo.modulos(curso_id):
+        for dificuldade in ESTRATOS_DIFICULDADE:
+            disponiveis = catalogo.contar(faceta_key(curso_id, modulo_id, dificuldade))
+            if disponiveis:
+                estratos[(modulo_id, dificuldade)] = disponiveis
+    return estratos
+
+
+def _pesos_por_modulo(curso_id, modulos: set[str], pesos_cfg: dict) -> dict[str, float]:
+    """Pesos da config sao por `CursoModulo.ordem` (ex.: {"1": 7, "3": 12})."""
+    if not pesos_cfg:
+        return {}
+    ordens = dict(
+        CursoModulo.objects
+        .filter(curso_id=curso_id, id__in=modulos)
+        .values_list("id", "ordem")
+    )
+    pesos = {}
+    for modulo_id, ordem in ordens.items():
+        try:
+            peso = float(pesos_cfg.get(str(ordem), 0) or 0)
+        except (TypeError, ValueError):
+            peso = 0.0
+        if peso > 0:
+            pesos[str(modulo_id)] = peso
+    return pesos
+
+
+def alocar_proporcional(pesos: dict, capacidades: dict, total: int) -> dict:
+    """
+    Distribui `total` entre os estratos proporcionalmente aos pesos (maiores restos),
+    sem passar da capacidade de cada estrato; o que sobra de um estrato cheio e
+    redistribuido entre os demais.
+    """
+    alocacao = {chave: 0 for chave in pesos}
+    ativos = {chave for chave, peso in pesos.items() if peso > 0 and capacidades.get(chave, 0) > 0}
+    restante = min(total, sum(capacidades[chave] for chave in ativos))
+    while restante > 0 and ativos:
+        soma = sum(pesos[chave] for chave in ativos)
+        cotas = {chave: restante * pesos[chave] / soma for chave in ativos}
+        rodada = {chave: min(int(cotas[chave]), capacidades[chave] - alocacao[chave]) for chave in ativos}
+        sobra = restante - sum(rodada.values())
+        for chave in sorted(ativos, key=lambda c: (int(cotas[c]) - cotas[c], c)):
+            if sobra <= 0:
+                break
+            if alocacao[chave] + rodada[chave] < capacidades[chave]:
+                rodada[chave] += 1
+                sobra -= 1
+        distribuido = sum(rodada.values())
+        if not distribuido:
+            break
+        for chave, qtd in rodada.items():
+            alocacao[chave] += qtd
+        restante -= distribuido
+        ativos = {chave for chave in ativos if alocacao[chave] < capacidades[chave]}
+    return alocacao
+
+
+def planejar_prova_detran(catalogo: CatalogoQuestoes, curso_id, detran_cfg: dict | None = None) -> list[list]:
+    """
+    Quantas questoes sortear de cada estrato modulo x dificuldade. O peso de cada
+    modulo vem de `detran.modulos` no config_simulado.json (ou, sem config, do
+    tamanho do modulo); dentro do modulo, as dificuldades seguem a disponibilidade.
+    Retorna [[modulo_id, dificuldade, qtd], ...] (formato guardado na tentativa).
+    """
+    detran_cfg = detran_cfg or {}
+    try:
+        qtd = int(detran_cfg.get("qtd", DETRAN_QTD_PADRAO) or DETRAN_QTD_PADRAO)
+    except (TypeError, ValueError):
+        qtd = DETRAN_QTD_PADRAO
+
+    estratos = estratos_do_curso(catalogo, curso_id)
+    if not estratos:
+        return []
+
+    por_modulo: dict[str, int] = {}
+    for (modulo_id, _), disponiveis in estratos.items():
+        por_modulo[modulo_id] = por_modulo.get(modulo_id, 0) + disponiveis
+
+    pesos_modulo = _pesos_por_modulo(curso_id, set(por_modulo), detran_cfg.get("modulos") or {})
+    if not pesos_modulo:
+        pesos_modulo = {modulo_id: float(total) for modulo_id, total in por_modulo.items()}
+
+    pesos = {
+        chave: pesos_modulo.get(chave[0], 0.0) * disponiveis / por_modulo[chave[0]]
+        for chave, disponiveis in estratos.items()
+    }
+    alocacao = alocar_proporcional(pesos, estratos, qtd)
+    return [[modulo_id, dificuldade, n] for (modulo_id, dificuldade), n in sorted(alocacao.items()) if n]
+
+
+def sortear_estratificado(catalogo: CatalogoQuestoes, curso_id, plano: list[list], semente: int) -> list:
+    """Sorteio reproduzivel: mesma semente e mesmo plano => mesma prova, na mesma ordem."""
+    rng = random.Random(semente)
+    escolhidas = []
+    for modulo_id, dificuldade, qtd in plano:
+        escolhidas.extend(catalogo.sortear(faceta_key(curso_id, modulo_id, dificuldade), qtd, rng))
+    rng.shuffle(escolhidas)
+    return escolhidas
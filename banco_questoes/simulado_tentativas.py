@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import random
+from datetime import timedelta
+
+from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from .catalogo_questoes import CatalogoQuestoes, get_catalogo_versao
+from .models import SimuladoTentativa
+from .simulado_adaptativo import registrar_desempenho
+from .simulado_bundle import AlternativaBundle, ExamBundle, get_bundle
+from .simulado_detran import sortear_estratificado
+
+
+TENTATIVA_TTL = timedelta(hours=24)
+
+# Cada resposta ocupa um caractere: a ordem da alternativa escolhida (1..35).
+ALFABETO_RESPOSTAS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def nova_semente() -> int:
+    return random.SystemRandom().getrandbits(62)
+
+
+def sortear_reproduzivel(catalogo: CatalogoQuestoes, faceta: str, qtd: int, semente: int) -> list:
+    """Mesmo catalogo + faceta + semente + qtd => mesmas questoes, na mesma ordem."""
+    return catalogo.sortear(faceta, qtd, random.Random(semente))
+
+
+def regenerar_question_ids(tentativa: SimuladoTentativa) -> list[str] | None:
+    catalogo = get_catalogo_versao(tentativa.catalogo_versao)
+    if catalogo is None:
+        return None
+    if tentativa.modo == "DETRAN":
+        plano = (tentativa.filtros or {}).get("estratos") or []
+        ids = sortear_estratificado(catalogo, tentativa.curso_id, plano, tentativa.semente)
+    else:
+        ids = sortear_reproduzivel(catalogo, tentativa.faceta, tentativa.qtd, tentativa.semente)
+    return [str(qid) for qid in ids]
+
+
+def criar_tentativa(
+    *,
+    usuario,
+    curso_id,
+    modulo_id,
+    modo: str,
+    filtros: dict,
+    question_ids: list,
+    catalogo_versao: str = "",
+    faceta: str = "",
+    semente: int | None = None,
+) -> SimuladoTentativa:
+    """
+    Com `semente`, grava so o descritor (as questoes saem de sortear_reproduzivel);
+    sem ela, grava a lista de questoes.
+    """
+    ids = [str(qid) for qid in question_ids]
+    tentativa = SimuladoTentativa.objects.create(
+        usuario=usuario,
+        curso_id=curso_id,
+        modulo_id=modulo_id or None,
+        modo=modo,
+        filtros=filtros,
+        catalogo_versao=catalogo_versao,
+        faceta=faceta,
+        semente=semente,
+        qtd=len(ids),
+        question_ids=[] if semente is not None else ids,
+        expira_em=timezone.now() + TENTATIVA_TTL,
+    )
+    tentativa.question_ids = ids
+    return tentativa
+
+
+def get_tentativa(usuario, tentativa_id) -> SimuladoTentativa | None:
+    """
+    Carrega a tentativa do usuario. Para tentativas descritas por semente, a lista de
+    questoes e regenerada em memoria; se o snapshot do catalogo nao existe mais, a
+    tentativa nao pode ser retomada.
+    """
+    if not tentativa_id:
+        return None
+    try:
+        tentativa = (
+            SimuladoTentativa.objects
+            .filter(id=tentativa_id, usuario=usuario, expira_em__gt=timezone.now())
+            .first()
+        )
+    except (TypeError, ValueError):
+        return None
+    if tentativa is None or tentativa.question_ids or tentativa.semente is None:
+        return tentativa
+    ids = regenerar_question_ids(tentativa)
+    if not ids or len(ids) != tentativa.qtd:
+        return None
+    tentativa.question_ids = ids
+    return tentativa
+
+
+def codificar_resposta(ordem: int) -> str:
+    return ALFABETO_RESPOSTAS[ordem]
+
+
+def decodificar_respostas(tentativa: SimuladoTentativa, bundle: ExamBundle) -> dict[str, dict]:
+    """Reconstroi {question_id: {"alt_id", "is_correct"}} a partir da string de respostas."""
+    answers: dict[str, dict] = {}
+    for qid, token in zip(tentativa.question_ids, tentativa.respostas):
+        questao = bundle.questao(qid)
+        ordem = ALFABETO_RESPOSTAS.find(token)
+        alt = next((a for a in questao.alternativas if a.ordem == ordem), None) if questao else None
+        answers[qid] = {
+            "alt_id": str(alt.id) if alt else "",
+            "is_correct": bool(alt and alt.is_correta),
+        }
+    return answers
+
+
+def registrar_resposta(tentativa: SimuladoTentativa, alternativa: AlternativaBundle) -> bool:
+    return registrar_respostas(tentativa, [alternativa])
+
+
+def registrar_respostas(tentativa: SimuladoTentativa, alternativas: list[AlternativaBundle]) -> bool:
+    """
+    Acrescenta as respostas das proximas questoes (em ordem) com um unico UPDATE.
+    O filtro pelo valor atual de `respostas` evita gravar duas vezes a mesma
+    questao (duplo clique, reenvio de lote); o de `finalizado_em`, responder uma
+    tentativa ja finalizada (ex.: pelo resultado) e contar o desempenho de novo.
+    """
+    atual = tentativa.respostas
+    total = len(tentativa.question_ids)
+    if tentativa.finalizado_em or not alternativas or len(atual) + len(alternativas) > total:
+        return False
+
+    tokens = "".join(codificar_resposta(alt.ordem) for alt in alternativas)
+    acertos = sum(1 for alt in alternativas if alt.is_correta)
+    campos = {
+        "respostas": Concat(F("respostas"), Value(tokens), output_field=models.TextField()),
+        "acertos": F("acertos") + acertos,
+    }
+    finalizado_em = timezone.now() if len(atual) + len(tokens) >= total else None
+    if finalizado_em:
+        campos["finalizado_em"] = finalizado_em
+
+    updated = (
+        SimuladoTentativa.objects
+        .filter(pk=tentativa.pk, respostas=atual, finalizado_em__isnull=True)
+        .update(**campos)
+    )
+    if not updated:
+        return False
+
+    tentativa.respostas = atual + tokens
+    tentativa.acertos += acertos
+    if finalizado_em:
+        tentativa.finalizado_em = finalizado_em
+        _registrar_desempenho(tentativa)
+    return True
+
+
+def finalizar_tentativa(tentativa: SimuladoTentativa) -> None:
+    if tentativa.finalizado_em:
+        return
+    agora = timezone.now()
+    updated = SimuladoTentativa.objects.filter(pk=tentativa.pk, finalizado_em__isnull=True).update(finalizado_em=agora)
+    tentativa.finalizado_em = agora
+    if updated:
+        _registrar_desempenho(tentativa)
+
+
+def _registrar_desempenho(tentativa: SimuladoTentativa) -> None:
+    # Chamado so na transicao para finalizada (UPDATE condicional), uma vez por tentativa.
+    bundle = get_bundle(str(tentativa.id), tentativa.question_ids)
+    registrar_desempenho(tentativa.usuario_id, bundle, decodificar_respostas(tentativa, bundle))
@@ -0,0 +1,63 @@
+// Service worker do simulado offline (escopo: /simulado/).
+// - imagens de placas e estaticos do simulado: cache primeiro (nao mudam entre provas);
+// - tela offline e pacote da tentativa: rede primeiro, cache quando sem conexao.
+const CACHE_NOME = "{{ cache_nome|escapejs }}";
+const PLACAS_PREFIXO = "{{ placas_prefixo|escapejs }}";
+const ESTATICOS_PREFIXO = "{{ estaticos_prefixo|escapejs }}";
+const OFFLINE_PREFIXO = "{{ offline_prefixo|escapejs }}";
+const PACOTE_SUFIXO = "/pacote/";
+
+self.addEventListener("install", () => self.skipWaiting());
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((nomes) => Promise.all(
+        nomes
+          .filter((nome) => nome.startsWith("simulado-offline-") && nome !== CACHE_NOME)
+          .map((nome) => caches.delete(nome))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+// A tela offline manda a lista de imagens do pacote assim que ele chega.
+self.addEventListener("message", (event) => {
+  const dados = event.data || {};
+  if (dados.tipo !== "precache" || !Array.isArray(dados.urls)) return;
+  event.waitUntil(
+    caches.open(CACHE_NOME).then((cache) => Promise.all(
+      dados.urls.map((url) => cache.match(url).then((hit) => hit || cache.add(url).catch(() => null)))
+    ))
+  );
+});
+
+function guardar(request, response) {
+  if (response && response.ok) {
+    const copia = response.clone();
+    caches.open(CACHE_NOME).then((cache) => cache.put(request, copia));
+  }
+  return response;
+}
+
+self.addEventListener("fetch", (event) => {
+  const request = event.request;
+  if (request.method !== "GET") return;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname.startsWith(PLACAS_PREFIXO) || url.pathname.startsWith(ESTATICOS_PREFIXO)) {
+    event.respondWith(
+      caches.match(request).then((hit) => hit || fetch(request).then((resp) => guardar(request, resp)))
+    );
+    return;
+  }
+
+  if (url.pathname.startsWith(OFFLINE_PREFIXO) || url.pathname.endsWith(PACOTE_SUFIXO)) {
+    event.respondWith(
+      fetch(request)
+        .then((resp) => guardar(request, resp))
+        .catch(() => caches.match(request))
+    );
+  }
+});
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from django import template
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from banco_questoes.imagens_variantes import FORMATOS, get_variantes
+
+
+register = template.Library()
+
+
+def _caminho_estatico(caminho: str, estatico: bool) -> str | None:
+    """
+    Caminho relativo ao static (`placas/A-1A.png`) para buscar variantes; None para
+    outras URLs. Com `estatico=False` (URL livre, ex.: logo de parceiro) so uma URL
+    que ja comeca pelo prefixo do static (`/static/...`) conta como estatica.
+    """
+    prefixo = static("")
+    if caminho.startswith(prefixo):
+        return caminho[len(prefixo):]
+    if not estatico or "://" in caminho or caminho.startswith("/"):
+        return None
+    return caminho
+
+
+@register.simple_tag
+def imagem_responsiva(caminho, sizes="", estatico=True, **atributos):
+    """
+    <picture> com <source> AVIF/WebP (srcset do manifest de gerar_variantes_imagens)
+    e <img> com o arquivo original como fallback. Sem variantes, so o <img>.
+    Uso: {% imagem_responsiva "placas/A-1A.png" alt="..." class="..." %}
+    URL vinda de cadastro vai como esta: {% imagem_responsiva url estatico=False %}
+    """
+    caminho = str(caminho or "").strip()
+    rel = _caminho_estatico(caminho, estatico)
+    src = static(rel) if estatico and rel else caminho
+    atributos.setdefault("loading", "lazy")
+    atributos.setdefault("decoding", "async")
+    img = format_html("<img src=\"{}\"{}>", src, flatatt(atributos))
+
+    entrada = get_variantes(rel) if rel else None
+    if not entrada:
+        return img
+
+    sizes = sizes or entrada.get("sizes") or ""
+    fontes = []
+    for formato in FORMATOS:
+        variantes = (entrada.get("formatos") or {}).get(formato)
+        if not variantes:
+            continue
+        srcset = ", ".join(f"{static(path)} {largura}w" for largura, path in variantes)
+        fontes.append((f"image/{formato}", srcset, sizes))
+    if not fontes:
+        return img
+
+    return format_html(
+        "<picture>{}{}</picture>",
+        format_html_join("", "<source type=\"{}\" srcset=\"{}\" sizes=\"{}\">", fontes),
+        img,
+    )
@@ -1,10 +1,102 @@
-from datetime import timedelta
+import gzip
+import importlib
+import json
+import os
+import random
+import threading
+import time
+import unittest
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
-from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from banco_questoes.models import Assinatura, ConviteCadastroPlano, Plano
+from banco_questoes import imagens_variantes
+from banco_questoes.access_control import (
+    UPGRADE_PROMO_CAMPAIGN_SLUG,
+    AccessContext,
+    _get_upgrade_offer_window,
+    build_access_blocked_context,
+    build_plan_status_for_app,
+    check_and_increment_app_use,
+    check_app_use,
+    get_assinatura_ativa,
+)
+from banco_questoes.auditoria import _janela_recente, log_event
+from banco_questoes.auditoria_particoes import (
+    criar_particoes,
+    inicio_mes,
+    listar_particoes,
+    nome_particao,
+    remover_particoes_antigas,
+)
+from banco_questoes.catalogo_questoes import (
+    CATALOGO_FILENAME,
+    CATALOGO_GERACAO_FILENAME,
+    construir_catalogo_bytes,
+    faceta_key,
+    get_catalogo,
+    get_catalogo_versao,
+    invalidar_catalogo,
+)
+from banco_questoes.contador_uso import ContadorUsoCache
+from banco_questoes.fragmentos_questao import fragmentos_key, get_fragmentos_questao
+from banco_questoes.imagens_variantes import MANIFEST_PATH, MANIFEST_VERSAO, get_manifest
+from banco_questoes.middleware import AuditoriaBufferMiddleware
+from banco_questoes.management.commands.purge_audit_events import Command as PurgeAuditEventsCommand
+from banco_questoes.matriz_acesso import (
+    MATRIZ_VERSAO_FILENAME,
+    _publicar_versao,
+    get_matriz_acesso,
+)
+from banco_questoes.models import (
+    Alternativa,
+    AppModulo,
+    Assinatura,
+    AssinaturaAtual,
+    CadastroRecente,
+    ConviteCadastroPlano,
+    Curso,
+    CursoModulo,
+    DesempenhoSimuladoUsuario,
+    Documento,
+    EventoAuditoria,
+    OfertaUpgradeUsuario,
+    Plano,
+    PlanoPermissaoApp,
+    Questao,
+    ResumoAuditoriaDiario,
+    ResumoAuditoriaProgresso,
+    SimuladoTentativa,
+    UsoAppJanela,
+)
+from banco_questoes.resumo_auditoria import atualizar_resumo
+from banco_questoes.simulado_adaptativo import sortear_adaptativo
+from banco_questoes.simulado_bundle import BUNDLE_CACHE_PREFIX, carregar_bundle, get_bundle
+from banco_questoes.simulado_detran import alocar_proporcional, planejar_prova_detran
+from banco_questoes.simulado_tentativas import (
+    finalizar_tentativa,
+    get_tentativa,
+    regenerar_question_ids,
+    registrar_resposta,
+    registrar_respostas,
+)
+from banco_questoes.throttle_cadastro import chave_cadastro, registrar_cadastro, tempo_restante_cadastro
 
 
 @override_settings(REGISTER_COOLDOWN_ENABLED=False)
@@ -107,3 +199,1628 @@ class CadastroPlanoTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Representante Viviane")
         self.assertContains(response, "https://exemplo.com/logo-viviane.png")
+
+
+class CatalogoQuestoesBaseTestCase(TestCase):
+    def setUp(self):
+        self._cache_dir = TemporaryDirectory()
+        self.addCleanup(self._cache_dir.cleanup)
+        settings_override = override_settings(SHARED_CACHE_ROOT=self._cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        invalidar_catalogo()
+        self.addCleanup(invalidar_catalogo)
+
+        self.curso = Curso.objects.create(nome="Curso Catalogo", slug="curso-catalogo")
+        self.modulo_a = CursoModulo.objects.create(curso=self.curso, ordem=1, nome="Modulo A")
+        self.modulo_b = CursoModulo.objects.create(curso=self.curso, ordem=2, nome="Modulo B")
+        self.documento = Documento.objects.create(titulo="Documento Catalogo")
+
+    def criar_questao(self, modulo, numero, *, dificuldade="FACIL", codigo_placa=""):
+        return Questao.objects.create(
+            curso=self.curso,
+            modulo=modulo,
+            documento=self.documento,
+            numero_no_modulo=numero,
+            dificuldade=dificuldade,
+            enunciado=f"Enunciado {modulo.ordem}.{numero}",
+            codigo_placa=codigo_placa,
+            imagem_arquivo=f"{codigo_placa}.png" if codigo_placa else "",
+        )
+
+
+class CatalogoQuestoesTests(CatalogoQuestoesBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.q1 = self.criar_questao(self.modulo_a, 1, dificuldade="FACIL", codigo_placa="R-1")
+        self.q2 = self.criar_questao(self.modulo_a, 2, dificuldade="DIFICIL")
+        self.q3 = self.criar_questao(self.modulo_b, 1, dificuldade=None)
+
+    def test_contagem_por_faceta(self):
+        catalogo = get_catalogo()
+
+        self.assertEqual(catalogo.contar(faceta_key(self.curso.id)), 3)
+        self.assertEqual(catalogo.contar(faceta_key(self.curso.id, self.modulo_a.id)), 2)
+        self.assertEqual(catalogo.contar(faceta_key(self.curso.id, "", "DIFICIL")), 1)
+        self.assertEqual(catalogo.contar(faceta_key(self.curso.id, "", "", True, True)), 1)
+        self.assertEqual(catalogo.contar(faceta_key(self.curso.id, self.modulo_b.id, "", True)), 0)
+        self.assertEqual(
+            set(catalogo.ids(faceta_key(self.curso.id, "", "", False, True))),
+            {self.q1.id},
+        )
+
+    def test_sorteio_nao_consulta_banco_com_catalogo_publicado(self):
+        get_catalogo()
+
+        with self.assertNumQueries(0):
+            chosen = get_catalogo().sortear(faceta_key(self.curso.id), 2)
+
+        self.assertEqual(len(chosen), 2)
+        self.assertTrue(set(chosen) <= {self.q1.id, self.q2.id, self.q3.id})
+
+    def test_salvar_questao_invalida_catalogo(self):
+        self.assertEqual(get_catalogo().contar(faceta_key(self.curso.id)), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_questao(self.modulo_b, 2)
+
+        self.assertEqual(get_catalogo().contar(faceta_key(self.curso.id)), 4)
+
+    def outro_processo_invalida(self):
+        # Como o invalidar_catalogo de outro worker: so o marcador muda.
+        marcador = Path(self._cache_dir.name) / CATALOGO_GERACAO_FILENAME
+        tmp = marcador.with_name(marcador.name + ".tmp")
+        tmp.write_text(uuid.uuid4().hex, encoding="ascii")
+        os.replace(tmp, marcador)
+
+    def test_invalidacao_durante_a_reconstrucao_nao_e_perdida(self):
+        def construir_e_invalidar(geracao=""):
+            data = construir_catalogo_bytes(geracao)
+            # Commit do admin entre a leitura do banco e a publicacao do snapshot.
+            self.criar_questao(self.modulo_b, 2)
+            self.outro_processo_invalida()
+            return data
+
+        with patch("banco_questoes.catalogo_questoes.construir_catalogo_bytes", side_effect=construir_e_invalidar):
+            self.assertEqual(get_catalogo().contar(faceta_key(self.curso.id)), 3)
+
+        self.assertEqual(get_catalogo().contar(faceta_key(self.curso.id)), 4)
+
+    def test_snapshot_de_geracao_anterior_e_descartado_na_leitura(self):
+        get_catalogo()
+        arquivo = Path(self._cache_dir.name) / CATALOGO_FILENAME
+        antigo = arquivo.read_bytes()
+        self.criar_questao(self.modulo_b, 2)
+        invalidar_catalogo()
+        # Publicado por um worker atrasado depois da invalidacao.
+        arquivo.write_bytes(antigo)
+
+        self.assertEqual(get_catalogo().contar(faceta_key(self.curso.id)), 4)
+
+    def test_somente_memoria_ve_invalidacao_de_outro_processo(self):
+        with patch("banco_questoes.catalogo_questoes._gravar_atomico", side_effect=OSError("somente leitura")):
+            self.assertEqual(get_catalogo().contar(faceta_key(self.curso.id)), 3)
+            self.criar_questao(self.modulo_b, 2)
+            with self.assertNumQueries(0):
+                get_catalogo()
+
+            self.outro_processo_invalida()
+
+            self.assertEqual(get_catalogo().contar(faceta_key(self.curso.id)), 4)
+
+
+class SimuladoApiStatsTests(CatalogoQuestoesBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.criar_questao(self.modulo_a, 1, dificuldade="FACIL", codigo_placa="R-1")
+        self.criar_questao(self.modulo_a, 2, dificuldade="DIFICIL")
+        self.criar_questao(self.modulo_b, 1, dificuldade="FACIL")
+        self.user = get_user_model().objects.create_user(
+            username="stats@example.com",
+            password="SenhaForte123!",
+        )
+        self.client.force_login(self.user)
+
+    def test_stats_servidas_pelo_catalogo(self):
+        url = reverse("simulado:api_stats")
+        params = {"curso_id": str(self.curso.id), "dificuldade": "FACIL"}
+        self.client.get(url, params)
+
+        with self.assertNumQueries(2):  # sessao + usuario
+            response = self.client.get(url, params)
+
+        payload = response.json()
+        self.assertTrue(payload["ok"])
+        self.assertEqual(payload["total_disponivel"], 2)
+        self.assertEqual(payload["painel"]["com_imagem"], 1)
+        self.assertEqual(payload["painel"]["placas"], 1)
+        self.assertEqual(
+            payload["painel"]["por_dificuldade"],
+            {"FACIL": 2, "INTERMEDIARIO": 0, "DIFICIL": 1},
+        )
+
+    def test_stats_por_modulo(self):
+        response = self.client.get(
+            reverse("simulado:api_stats"),
+            {"curso_id": str(self.curso.id), "modulo_id": str(self.modulo_b.id)},
+        )
+
+        payload = response.json()
+        self.assertEqual(payload["total_disponivel"], 1)
+        self.assertEqual(payload["painel"]["com_imagem"], 0)
+
+
+class SimuladoTentativaBaseTestCase(CatalogoQuestoesBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.questoes = [self.criar_questao(self.modulo_a, numero) for numero in range(1, 4)]
+        for questao in self.questoes:
+            Alternativa.objects.create(questao=questao, texto="Certa", is_correta=True, ordem=1)
+            Alternativa.objects.create(questao=questao, texto="Errada", is_correta=False, ordem=2)
+
+        self.user = get_user_model().objects.create_user(
+            username="bundle@example.com",
+            password="SenhaForte123!",
+        )
+        plano = Plano.objects.create(nome="Plano Bundle")
+        Assinatura.objects.create(
+            usuario=self.user,
+            plano=plano,
+            nome_plano_snapshot=plano.nome,
+            status=Assinatura.Status.ATIVO,
+            inicio=timezone.now(),
+            valid_until=None,
+        )
+        app = AppModulo.objects.create(
+            slug="simulado-digital",
+            nome="Simulado Digital",
+            ordem_menu=1,
+            rota_nome="simulado:inicio",
+            ativo=True,
+        )
+        PlanoPermissaoApp.objects.create(plano=plano, app_modulo=app, permitido=True)
+        self.client.force_login(self.user)
+
+    def iniciar(self, modo="PROVA"):
+        response = self.client.post(
+            reverse("simulado:iniciar"),
+            {"curso_id": str(self.curso.id), "qtd": "3", "modo": modo},
+        )
+        self.assertEqual(response.status_code, 302)
+        return get_tentativa(self.user, self.client.session["simulado_tentativa_id"])
+
+class SimuladoBundleTests(SimuladoTentativaBaseTestCase):
+    def test_questoes_e_respostas_servidas_do_bundle(self):
+        tentativa = self.iniciar()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("simulado:questao"))
+            self.assertEqual(response.status_code, 200)
+
+            correta = response.context["questao"].correta
+            response = self.client.post(reverse("simulado:responder"), {"alternativa_id": str(correta.id)})
+            self.assertEqual(response.status_code, 302)
+
+        tabelas = " ".join(query["sql"] for query in ctx.captured_queries)
+        self.assertNotIn(Questao._meta.db_table, tabelas)
+        self.assertNotIn(Alternativa._meta.db_table, tabelas)
+
+        tentativa.refresh_from_db(fields=["respostas", "acertos", "finalizado_em"])
+        self.assertEqual(tentativa.respostas, "1")
+        self.assertEqual(tentativa.acertos, 1)
+
+    def test_alternativa_de_outra_questao_e_rejeitada(self):
+        tentativa = self.iniciar()
+        outra = Alternativa.objects.exclude(questao_id=tentativa.question_ids[0]).first()
+
+        response = self.client.post(reverse("simulado:responder"), {"alternativa_id": str(outra.id)})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_bundle_recarregado_quando_cache_expira(self):
+        tentativa = self.iniciar(modo="ESTUDO")
+        cache.delete(f"{BUNDLE_CACHE_PREFIX}{tentativa.id}")
+        questao = Questao.objects.get(id=tentativa.question_ids[0])
+        errada = questao.alternativas.get(is_correta=False)
+
+        response = self.client.post(reverse("simulado:responder"), {"alternativa_id": str(errada.id)})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["feedback"]["correta"].texto, "Certa")
+        self.assertEqual(response.context["feedback"]["selecionada"].texto, "Errada")
+
+    def test_resposta_nao_regrava_sessao(self):
+        tentativa = self.iniciar()
+        questao = Questao.objects.get(id=tentativa.question_ids[0])
+        errada = questao.alternativas.get(is_correta=False)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(reverse("simulado:responder"), {"alternativa_id": str(errada.id)})
+
+        escritas = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(escritas), 1)
+        self.assertIn(SimuladoTentativa._meta.db_table, escritas[0])
+
+    def test_resposta_repetida_nao_avanca_duas_vezes(self):
+        tentativa = self.iniciar()
+        atrasada = get_tentativa(self.user, tentativa.id)  # duplo clique: mesma leitura
+        correta = get_bundle(str(tentativa.id), tentativa.question_ids).questao(tentativa.question_ids[0]).correta
+
+        self.assertTrue(registrar_resposta(tentativa, correta))
+        self.assertFalse(registrar_resposta(atrasada, correta))
+
+        tentativa.refresh_from_db(fields=["respostas", "acertos", "finalizado_em"])
+        self.assertEqual(tentativa.respostas, str(correta.ordem))
+        self.assertEqual(tentativa.acertos, 1)
+
+    def test_resultado_reconstroi_respostas_da_tentativa(self):
+        tentativa = self.iniciar()
+        for qid in tentativa.question_ids:
+            errada = Alternativa.objects.get(questao_id=qid, is_correta=False)
+            self.client.post(reverse("simulado:responder"), {"alternativa_id": str(errada.id)})
+
+        response = self.client.get(reverse("simulado:resultado"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["acertos"], 0)
+        self.assertEqual(response.context["erros"], 3)
+        self.assertTrue(all(item["selecionada"].texto == "Errada" for item in response.context["revisao"]))
+        tentativa.refresh_from_db(fields=["respostas", "acertos", "finalizado_em"])
+        self.assertIsNotNone(tentativa.finalizado_em)
+
+    def test_purge_remove_tentativas_expiradas(self):
+        tentativa = self.iniciar()
+        SimuladoTentativa.objects.filter(id=tentativa.id).update(expira_em=timezone.now() - timedelta(minutes=1))
+
+        call_command("purge_simulado_tentativas", stdout=StringIO())
+
+        self.assertFalse(SimuladoTentativa.objects.filter(id=tentativa.id).exists())
+        response = self.client.get(reverse("simulado:questao"))
+        self.assertRedirects(response, reverse("simulado:inicio"), fetch_redirect_response=False)
+
+
+class SimuladoDescritorTests(SimuladoTentativaBaseTestCase):
+    def test_tentativa_guarda_so_o_descritor(self):
+        tentativa = self.iniciar()
+        gravada = SimuladoTentativa.objects.get(id=tentativa.id)
+
+        self.assertEqual(gravada.question_ids, [])
+        self.assertEqual(gravada.qtd, 3)
+        self.assertEqual(gravada.catalogo_versao, get_catalogo().versao)
+        self.assertEqual(gravada.faceta, faceta_key(self.curso.id))
+        self.assertEqual(regenerar_question_ids(gravada), tentativa.question_ids)
+
+    def test_regenera_com_snapshot_antigo_apos_reimport(self):
+        tentativa = self.iniciar()
+        versao = tentativa.catalogo_versao
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_questao(self.modulo_b, 1)
+        self.assertNotEqual(get_catalogo().versao, versao)
+
+        retomada = get_tentativa(self.user, tentativa.id)
+        self.assertEqual(retomada.question_ids, tentativa.question_ids)
+
+    def test_purge_remove_snapshots_sem_tentativa(self):
+        tentativa = self.iniciar()
+        versao_antiga = tentativa.catalogo_versao
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_questao(self.modulo_b, 1)
+        get_catalogo()
+
+        call_command("purge_simulado_tentativas", stdout=StringIO())
+        self.assertIsNotNone(get_catalogo_versao(versao_antiga))
+
+        SimuladoTentativa.objects.filter(id=tentativa.id).update(expira_em=timezone.now() - timedelta(minutes=1))
+        call_command("purge_simulado_tentativas", stdout=StringIO())
+        self.assertIsNone(get_catalogo_versao(versao_antiga))
+
+
+class SimuladoApiTentativaTests(SimuladoTentativaBaseTestCase):
+    def responder(self, tentativa, payload):
+        return self.client.post(
+            reverse("simulado:api_tentativa_responder", args=[tentativa.id]),
+            data=json.dumps(payload),
+            content_type="application/json",
+        )
+
+    def test_payload_da_prova_sem_gabarito(self):
+        tentativa = self.iniciar()
+
+        response = self.client.get(reverse("simulado:api_tentativa", args=[tentativa.id]))
+
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()["tentativa"]
+        self.assertEqual([q["id"] for q in dados["questoes"]], tentativa.question_ids)
+        self.assertEqual(len(dados["questoes"][0]["alternativas"]), 2)
+        self.assertNotIn("is_correta", response.content.decode())
+
+    def test_tentativa_de_outro_usuario_nao_e_exposta(self):
+        tentativa = self.iniciar()
+        outro = get_user_model().objects.create_user(username="outro@example.com", password="SenhaForte123!")
+        Assinatura.objects.create(
+            usuario=outro,
+            nome_plano_snapshot="Plano Bundle",
+            status=Assinatura.Status.ATIVO,
+            inicio=timezone.now(),
+        )
+        self.client.force_login(outro)
+
+        response = self.client.get(reverse("simulado:api_tentativa", args=[tentativa.id]))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_lote_de_respostas_em_um_unico_update(self):
+        tentativa = self.iniciar()
+        lote = [
+            {
+                "questao_id": qid,
+                "alternativa_id": str(Alternativa.objects.get(questao_id=qid, is_correta=(pos == 0)).id),
+            }
+            for pos, qid in enumerate(tentativa.question_ids[:2])
+        ]
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.responder(tentativa, {"respostas": lote})
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(len([q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]), 1)
+        tentativa.refresh_from_db(fields=["respostas", "acertos", "finalizado_em"])
+        self.assertEqual(tentativa.respostas, "12")
+        self.assertEqual(tentativa.acertos, 1)
+
+        # reenvio do mesmo lote (ex.: retry do cliente) nao altera nada
+        self.assertEqual(self.responder(tentativa, {"respostas": lote}).status_code, 204)
+        tentativa.refresh_from_db(fields=["respostas", "acertos", "finalizado_em"])
+        self.assertEqual(tentativa.respostas, "12")
+
+    def test_resposta_fora_de_ordem_retorna_conflito(self):
+        tentativa = self.iniciar()
+        qid = tentativa.question_ids[1]
+        alt = Alternativa.objects.filter(questao_id=qid).first()
+
+        response = self.responder(tentativa, {"questao_id": qid, "alternativa_id": str(alt.id)})
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["respondidas"], 0)
+
+    def test_modo_estudo_devolve_feedback(self):
+        tentativa = self.iniciar(modo="ESTUDO")
+        qid = tentativa.question_ids[0]
+        errada = Alternativa.objects.get(questao_id=qid, is_correta=False)
+        correta = Alternativa.objects.get(questao_id=qid, is_correta=True)
+
+        response = self.responder(tentativa, {"questao_id": qid, "alternativa_id": str(errada.id)})
+
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados["respondidas"], 1)
+        self.assertEqual(dados["feedback"][0]["correta_id"], str(correta.id))
+        self.assertFalse(dados["feedback"][0]["is_correct"])
+
+    def test_tentativa_finalizada_pelo_resultado_nao_aceita_respostas(self):
+        tentativa = self.iniciar()
+        lote = [
+            {"questao_id": qid, "alternativa_id": str(Alternativa.objects.get(questao_id=qid, is_correta=True).id)}
+            for qid in tentativa.question_ids
+        ]
+        self.assertEqual(self.responder(tentativa, {"respostas": lote[:1]}).status_code, 204)
+        self.client.get(reverse("simulado:resultado"))
+
+        # reenvio do que ja foi gravado continua idempotente
+        self.assertEqual(self.responder(tentativa, {"respostas": lote[:1]}).status_code, 204)
+        response = self.responder(tentativa, {"respostas": lote})
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()["finalizada"])
+        self.assertEqual(response.json()["resultado_url"], reverse("simulado:resultado"))
+
+        response = self.client.post(reverse("simulado:responder"), {"alternativa_id": lote[1]["alternativa_id"]})
+        self.assertRedirects(response, reverse("simulado:resultado"), fetch_redirect_response=False)
+        self.assertRedirects(
+            self.client.get(reverse("simulado:questao")),
+            reverse("simulado:resultado"),
+            fetch_redirect_response=False,
+        )
+
+        tentativa.refresh_from_db(fields=["respostas", "acertos"])
+        self.assertEqual((tentativa.respostas, tentativa.acertos), ("1", 1))
+
+
+class SimuladoAdaptativoTests(SimuladoTentativaBaseTestCase):
+    def test_tentativa_finalizada_atualiza_desempenho(self):
+        tentativa = self.iniciar()
+        for pos, qid in enumerate(tentativa.question_ids):
+            alt = Alternativa.objects.get(questao_id=qid, is_correta=(pos != 0))
+            self.client.post(reverse("simulado:responder"), {"alternativa_id": str(alt.id)})
+
+        desempenho = DesempenhoSimuladoUsuario.objects.get(usuario=self.user)
+        self.assertEqual(desempenho.questoes[tentativa.question_ids[0]][:2], [1, 1])
+        self.assertEqual(desempenho.questoes[tentativa.question_ids[1]][:2], [1, 0])
+        self.assertEqual(desempenho.modulos, {str(self.modulo_a.id): 3})
+
+        # Reabrir o resultado nao conta a tentativa de novo
+        self.client.get(reverse("simulado:resultado"))
+        desempenho.refresh_from_db()
+        self.assertEqual(desempenho.modulos, {str(self.modulo_a.id): 3})
+
+    def test_respostas_depois_de_finalizada_nao_contam_de_novo(self):
+        tentativa = self.iniciar()
+        bundle = get_bundle(str(tentativa.id), tentativa.question_ids)
+        certas = [bundle.questao(qid).correta for qid in tentativa.question_ids]
+        self.assertTrue(registrar_respostas(tentativa, certas[:1]))
+        finalizar_tentativa(tentativa)
+
+        tentativa = get_tentativa(self.user, tentativa.id)
+        self.assertFalse(registrar_respostas(tentativa, certas[1:]))
+
+        tentativa.refresh_from_db(fields=["respostas", "acertos"])
+        self.assertEqual((tentativa.respostas, tentativa.acertos), ("1", 1))
+        desempenho = DesempenhoSimuladoUsuario.objects.get(usuario=self.user)
+        self.assertEqual(desempenho.questoes[tentativa.question_ids[0]][:2], [1, 0])
+        self.assertEqual(desempenho.modulos, {str(self.modulo_a.id): 1})
+
+    def test_sorteio_prioriza_questoes_erradas(self):
+        ontem = int(timezone.now().timestamp() // 86400) - 1
+        fraca, *fortes = self.questoes
+        DesempenhoSimuladoUsuario.objects.create(
+            usuario=self.user,
+            questoes={
+                str(fraca.id): [5, 5, ontem - 30],
+                **{str(q.id): [5, 0, ontem] for q in fortes},
+            },
+        )
+        catalogo = get_catalogo()
+        rng = random.Random(42)
+
+        escolhas = Counter(
+            sortear_adaptativo(catalogo, self.user, curso_id=self.curso.id, k=1, rng=rng)[0]
+            for _ in range(200)
+        )
+
+        self.assertGreater(escolhas[fraca.id], 150)
+
+    def test_sorteio_sem_reposicao_respeita_faceta(self):
+        extra = self.criar_questao(self.modulo_b, 1)
+        invalidar_catalogo()
+        catalogo = get_catalogo()
+
+        with self.assertNumQueries(1):  # so o historico do usuario
+            escolhidas = sortear_adaptativo(
+                catalogo,
+                self.user,
+                curso_id=self.curso.id,
+                modulo_id=self.modulo_a.id,
+                k=10,
+            )
+
+        self.assertEqual(sorted(escolhidas), sorted(q.id for q in self.questoes))
+        self.assertNotIn(extra.id, escolhidas)
+
+    def test_iniciar_modo_adaptativo(self):
+        tentativa = self.iniciar(modo="ADAPTATIVO")
+
+        self.assertEqual(tentativa.modo, "ADAPTATIVO")
+        # sorteio dependente do historico: lista gravada explicitamente
+        self.assertIsNone(tentativa.semente)
+        self.assertEqual(SimuladoTentativa.objects.get(id=tentativa.id).question_ids, tentativa.question_ids)
+        self.assertEqual(sorted(tentativa.question_ids), sorted(str(q.id) for q in self.questoes))
+
+
+class FragmentosQuestaoTests(SimuladoTentativaBaseTestCase):
+    def test_questao_renderizada_a_partir_do_fragmento(self):
+        tentativa = self.iniciar()
+        questao = Questao.objects.get(id=tentativa.question_ids[0])
+
+        response = self.client.get(reverse("simulado:questao"))
+
+        self.assertContains(response, f'<span class="simulado-enunciado-texto">{questao.enunciado}</span>', html=True)
+        bundle = get_bundle(str(tentativa.id), tentativa.question_ids)
+        self.assertIsNotNone(cache.get(fragmentos_key(bundle.questao(questao.id))))
+
+    def test_fragmento_reaproveitado_entre_requisicoes(self):
+        tentativa = self.iniciar()
+        questao = get_bundle(str(tentativa.id), tentativa.question_ids).questao(tentativa.question_ids[0])
+        primeiro = get_fragmentos_questao(questao)
+
+        with patch("banco_questoes.fragmentos_questao.render_to_string") as render:
+            segundo = get_fragmentos_questao(questao)
+
+        render.assert_not_called()
+        self.assertEqual(primeiro.enunciado, segundo.enunciado)
+
+    def test_questao_editada_ganha_fragmento_novo(self):
+        tentativa = self.iniciar()
+        antiga = get_bundle(str(tentativa.id), tentativa.question_ids).questao(tentativa.question_ids[0])
+        get_fragmentos_questao(antiga)
+
+        Questao.objects.filter(id=antiga.id).update(enunciado="Enunciado corrigido")
+        Alternativa.objects.filter(questao_id=antiga.id, is_correta=True).update(texto="Certa corrigida")
+        nova = carregar_bundle("", tentativa.question_ids).questao(antiga.id)
+
+        self.assertNotEqual(fragmentos_key(nova), fragmentos_key(antiga))
+        fragmentos = get_fragmentos_questao(nova)
+        self.assertIn("Enunciado corrigido", fragmentos.enunciado)
+        self.assertIn("Certa corrigida", fragmentos.alternativas[str(nova.correta.id)])
+
+        # Um bundle antigo (outra tentativa em andamento) nao regrava o texto velho
+        # na chave do conteudo novo.
+        self.assertNotIn("Enunciado corrigido", get_fragmentos_questao(antiga).enunciado)
+        self.assertIn("Enunciado corrigido", cache.get(fragmentos_key(nova)).enunciado)
+
+
+class SimuladoDetranTests(SimuladoTentativaBaseTestCase):
+    def test_alocacao_proporcional_aos_pesos(self):
+        pesos = {"1": 7, "2": 5, "3": 12, "4": 6}
+        capacidades = {chave: 100 for chave in pesos}
+
+        self.assertEqual(alocar_proporcional(pesos, capacidades, 30), pesos)
+
+    def test_alocacao_redistribui_estrato_sem_questoes_suficientes(self):
+        pesos = {"1": 7, "2": 5, "3": 12, "4": 6}
+        capacidades = {"1": 2, "2": 100, "3": 100, "4": 100}
+
+        alocacao = alocar_proporcional(pesos, capacidades, 30)
+
+        self.assertEqual(alocacao["1"], 2)
+        self.assertEqual(sum(alocacao.values()), 30)
+
+    def test_plano_segue_pesos_por_modulo_e_dificuldade(self):
+        for numero in range(1, 4):
+            self.criar_questao(self.modulo_b, numero, dificuldade="FACIL")
+        for numero in range(4, 7):
+            self.criar_questao(self.modulo_b, numero, dificuldade="DIFICIL")
+        invalidar_catalogo()
+
+        plano = planejar_prova_detran(get_catalogo(), self.curso.id, {"qtd": 6, "modulos": {"1": 1, "2": 2}})
+
+        self.assertEqual(
+            sorted(plano),
+            sorted([
+                [str(self.modulo_a.id), "FACIL", 2],
+                [str(self.modulo_b.id), "DIFICIL", 2],
+                [str(self.modulo_b.id), "FACIL", 2],
+            ]),
+        )
+
+    def test_iniciar_modo_detran(self):
+        tentativa = self.iniciar(modo="DETRAN")
+        gravada = SimuladoTentativa.objects.get(id=tentativa.id)
+
+        self.assertEqual(gravada.modo, "DETRAN")
+        self.assertEqual(gravada.question_ids, [])
+        self.assertEqual(gravada.filtros["estratos"], [[str(self.modulo_a.id), "FACIL", 3]])
+        self.assertEqual(regenerar_question_ids(gravada), tentativa.question_ids)
+
+        response = self.client.get(reverse("simulado:questao"))
+        self.assertNotContains(response, "simulado-contagem")
+
+
+class SimuladoPacoteOfflineTests(SimuladoTentativaBaseTestCase):
+    def iniciar_offline(self, modo="PROVA"):
+        response = self.client.post(
+            reverse("simulado:iniciar"),
+            {"curso_id": str(self.curso.id), "qtd": "3", "modo": modo, "offline": "1"},
+        )
+        tentativa_id = self.client.session["simulado_tentativa_id"]
+        self.assertRedirects(response, reverse("simulado:offline", args=[tentativa_id]), fetch_redirect_response=False)
+        return get_tentativa(self.user, tentativa_id)
+
+    def baixar_pacote(self, tentativa):
+        response = self.client.get(
+            reverse("simulado:api_tentativa_pacote", args=[tentativa.id]),
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        return json.loads(gzip.decompress(response.content))
+
+    def test_pacote_comprimido_com_prova_e_imagens(self):
+        Questao.objects.filter(id=self.questoes[0].id).update(imagem_arquivo="R-1.png")
+        tentativa = self.iniciar_offline()
+
+        pacote = self.baixar_pacote(tentativa)
+
+        self.assertEqual([q["id"] for q in pacote["tentativa"]["questoes"]], tentativa.question_ids)
+        self.assertEqual(pacote["imagens"], ["/static/placas/R-1.png"])
+        self.assertNotIn("correta_id", pacote["tentativa"]["questoes"][0])
+
+    def test_pacote_do_modo_estudo_leva_gabarito(self):
+        tentativa = self.iniciar_offline(modo="ESTUDO")
+
+        questao = self.baixar_pacote(tentativa)["tentativa"]["questoes"][0]
+
+        correta = Alternativa.objects.get(questao_id=questao["id"], is_correta=True)
+        self.assertEqual(questao["correta_id"], str(correta.id))
+
+    def test_uso_contabilizado_uma_vez_na_criacao_do_pacote(self):
+        with patch(
+            "banco_questoes.views_simulado.check_and_increment_app_use",
+            return_value=(True, None, {}),
+        ) as check:
+            tentativa = self.iniciar_offline()
+            self.baixar_pacote(tentativa)
+            self.client.get(reverse("simulado:offline", args=[tentativa.id]))
+
+        check.assert_called_once()
+
+    def test_respostas_sincronizadas_em_lote(self):
+        tentativa = self.iniciar_offline()
+        pacote = self.baixar_pacote(tentativa)
+        respostas = [
+            {"questao_id": q["id"], "alternativa_id": q["alternativas"][0]["id"]}
+            for q in pacote["tentativa"]["questoes"]
+        ]
+
+        url = pacote["tentativa"]["responder_url"]
+        for _ in range(2):  # reenvio apos queda de conexao e idempotente
+            response = self.client.post(url, json.dumps({"respostas": respostas}), content_type="application/json")
+            self.assertEqual(response.status_code, 204)
+
+        gravada = SimuladoTentativa.objects.get(id=tentativa.id)
+        self.assertEqual(len(gravada.respostas), 3)
+        self.assertIsNotNone(gravada.finalizado_em)
+
+    def test_tentativa_finalizada_nao_e_baixada_de_novo(self):
+        tentativa = self.iniciar_offline()
+        self.client.get(reverse("simulado:resultado"))
+
+        response = self.client.get(reverse("simulado:api_tentativa_pacote", args=[tentativa.id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.json()["finalizada"])
+        self.assertRedirects(
+            self.client.get(reverse("simulado:offline", args=[tentativa.id])),
+            reverse("simulado:resultado"),
+            fetch_redirect_response=False,
+        )
+
+    def test_service_worker_no_escopo_do_simulado(self):
+        response = self.client.get(reverse("simulado:service_worker"))
+
+        self.assertEqual(response["Content-Type"], "application/javascript")
+        self.assertTrue(reverse("simulado:service_worker").startswith(reverse("simulado:inicio")))
+        self.assertContains(response, "/static/placas/")
+
+
+try:
+    import PIL  # noqa: F401
+except ImportError:
+    PIL = None
+
+
+class ImagensResponsivasTests(TestCase):
+    def setUp(self):
+        self._dir = TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.origem = Path(self._dir.name)
+
+    def usar_manifest(self, imagens):
+        manifest = self.origem / MANIFEST_PATH
+        manifest.parent.mkdir(parents=True, exist_ok=True)
+        manifest.write_text(
+            json.dumps({"versao": MANIFEST_VERSAO, "gerado_em": "2026-01-01T00:00:00", "imagens": imagens}),
+            encoding="utf-8",
+        )
+        for patcher in (
+            patch("banco_questoes.imagens_variantes.caminho_manifest", return_value=manifest),
+            patch("banco_questoes.imagens_variantes._caminho_resolvido", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def render(self, trecho, **contexto):
+        return Template("{% load imagens_responsivas %}" + trecho).render(Context(contexto))
+
+    def test_sem_variantes_emite_so_img(self):
+        self.usar_manifest({})
+
+        html = self.render('{% imagem_responsiva "placas/R-1.png" alt="Placa" %}')
+
+        self.assertHTMLEqual(html, '<img src="/static/placas/R-1.png" alt="Placa" loading="lazy" decoding="async">')
+
+    def test_srcset_e_sizes_do_manifest(self):
+        self.usar_manifest({
+            "placas/R-1.png": {
+                "largura": 800,
+                "altura": 800,
+                "sizes": "(max-width: 639px) 150px, 300px",
+                "formatos": {"webp": [[150, "variantes/placas/R-1-150.webp"], [300, "variantes/placas/R-1-300.webp"]]},
+            },
+        })
+
+        html = self.render('{% imagem_responsiva caminho alt="Placa" class="questao-imagem-questao" %}', caminho="/static/placas/R-1.png")
+
+        self.assertInHTML(
+            '<source type="image/webp" '
+            'srcset="/static/variantes/placas/R-1-150.webp 150w, /static/variantes/placas/R-1-300.webp 300w" '
+            'sizes="(max-width: 639px) 150px, 300px">',
+            html,
+        )
+        self.assertIn('src="/static/placas/R-1.png"', html)
+
+    def test_caminho_do_manifest_resolvido_uma_vez(self):
+        self.usar_manifest({})
+
+        for _ in range(3):
+            get_manifest()
+
+        self.assertEqual(imagens_variantes.caminho_manifest.call_count, 1)
+
+    def test_url_externa_mantida(self):
+        self.usar_manifest({})
+
+        html = self.render("{% imagem_responsiva url alt='Logo' %}", url="https://cdn.example.com/logo.png")
+
+        self.assertIn('src="https://cdn.example.com/logo.png"', html)
+
+    def test_url_livre_relativa_nao_vira_estatica(self):
+        self.usar_manifest({"logos/parceiro.png": {"formatos": {"webp": [[150, "variantes/logos/parceiro-150.webp"]]}}})
+
+        html = self.render("{% imagem_responsiva url estatico=False alt='Logo' %}", url="logos/parceiro.png")
+
+        self.assertHTMLEqual(html, '<img src="logos/parceiro.png" alt="Logo" loading="lazy" decoding="async">')
+
+    def test_url_livre_do_static_usa_variantes(self):
+        self.usar_manifest({"logos/parceiro.png": {"formatos": {"webp": [[150, "variantes/logos/parceiro-150.webp"]]}}})
+
+        html = self.render("{% imagem_responsiva url estatico=False alt='Logo' %}", url="/static/logos/parceiro.png")
+
+        self.assertIn('srcset="/static/variantes/logos/parceiro-150.webp 150w"', html)
+        self.assertIn('src="/static/logos/parceiro.png"', html)
+
+    @unittest.skipIf(PIL is None, "Pillow nao instalado")
+    def test_comando_gera_variantes_e_manifest(self):
+        from PIL import Image
+
+        (self.origem / "placas").mkdir()
+        Image.new("RGB", (400, 200), "red").save(self.origem / "placas" / "R-1.png")
+
+        call_command("gerar_variantes_imagens", origem=str(self.origem), grupos="placas", workers=1, stdout=StringIO())
+
+        manifest = json.loads((self.origem / MANIFEST_PATH).read_text(encoding="utf-8"))
+        variantes = manifest["imagens"]["placas/R-1.png"]["formatos"]["webp"]
+        self.assertEqual([largura for largura, _ in variantes], [150, 180, 300, 360, 400])
+        for _, caminho in variantes:
+            self.assertTrue((self.origem / caminho).exists())
+
+
+class AccessContextTests(SimuladoTentativaBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        for regra in PlanoPermissaoApp.objects.all():
+            regra.limite_qtd = 5
+            regra.limite_periodo = "DIARIO"
+            regra.save()
+
+    def consultas_por_tabela(self, ctx):
+        tabelas = ("assinaturaatual", "planopermissaoapp", "usoappjanela")
+        return {
+            tabela: sum(
+                1 for q in ctx.captured_queries
+                if q["sql"].startswith("SELECT") and f'FROM "banco_questoes_{tabela}"' in q["sql"]
+            )
+            for tabela in tabelas
+        }
+
+    def test_assinatura_e_regras_carregadas_uma_vez(self):
+        get_matriz_acesso()
+        access = AccessContext(self.user)
+
+        with self.assertNumQueries(1):
+            for _ in range(2):
+                self.assertIsNotNone(access.assinatura)
+                self.assertTrue(access.regra("simulado-digital").permitido)
+                self.assertIsNone(access.regra("outro-app"))
+                access.assinatura.plano.nome
+
+    def test_checagem_e_status_do_plano_compartilham_contexto(self):
+        get_matriz_acesso()
+        access = AccessContext(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            check_app_use(self.user, "simulado-digital", access=access)
+            status = build_plan_status_for_app(self.user, "simulado-digital", access=access)
+
+        self.assertEqual(status["limite_qtd"], 5)
+        self.assertEqual(
+            self.consultas_por_tabela(ctx),
+            {"assinaturaatual": 1, "planopermissaoapp": 0, "usoappjanela": 2},
+        )
+
+    def test_iniciar_resolve_assinatura_e_regra_uma_vez(self):
+        get_matriz_acesso()
+        with CaptureQueriesContext(connection) as ctx:
+            self.iniciar()
+
+        consultas = self.consultas_por_tabela(ctx)
+        self.assertEqual(consultas["assinaturaatual"], 1)
+        self.assertEqual(consultas["planopermissaoapp"], 0)
+
+    def test_config_monta_status_do_plano_com_uma_consulta_por_tabela(self):
+        get_matriz_acesso()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("simulado:config"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.consultas_por_tabela(ctx),
+            {"assinaturaatual": 1, "planopermissaoapp": 0, "usoappjanela": 1},
+        )
+
+    def test_questao_consulta_assinatura_uma_vez(self):
+        self.iniciar()
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("simulado:questao"))
+
+        self.assertEqual(self.consultas_por_tabela(ctx)["assinaturaatual"], 1)
+
+
+class MatrizAcessoTests(SimuladoTentativaBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plano = Plano.objects.get(nome="Plano Bundle")
+
+    def test_consultas_usam_matriz_do_processo(self):
+        get_matriz_acesso()
+
+        with self.assertNumQueries(0):
+            matriz = get_matriz_acesso()
+            self.assertEqual([app.slug for app in matriz.apps], ["simulado-digital"])
+            self.assertTrue(matriz.regra(self.plano.id, "simulado-digital").permitido)
+            self.assertIsNone(matriz.regra(self.plano.id, "outro-app"))
+
+    def test_salvar_regra_publica_versao_nova(self):
+        get_matriz_acesso()
+        marcador = Path(self._cache_dir.name) / MATRIZ_VERSAO_FILENAME
+        versao_anterior = marcador.read_text(encoding="ascii")
+
+        regra = PlanoPermissaoApp.objects.get(plano=self.plano)
+        regra.permitido = False
+        with self.captureOnCommitCallbacks(execute=True):
+            regra.save()
+
+        self.assertNotEqual(marcador.read_text(encoding="ascii"), versao_anterior)
+        self.assertFalse(get_matriz_acesso().regra(self.plano.id, "simulado-digital").permitido)
+
+    def test_alteracao_desfeita_nao_troca_a_matriz(self):
+        matriz = get_matriz_acesso()
+        regra = PlanoPermissaoApp.objects.get(plano=self.plano)
+        regra.permitido = False
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                regra.save()
+                # Ainda dentro da transacao: a matriz do processo nao e remontada.
+                self.assertIs(get_matriz_acesso(), matriz)
+                transaction.set_rollback(True)
+
+        self.assertEqual(callbacks, [])
+        self.assertIs(get_matriz_acesso(), matriz)
+        self.assertTrue(matriz.regra(self.plano.id, "simulado-digital").permitido)
+
+    def test_versao_publicada_por_outro_processo_remonta_matriz(self):
+        matriz = get_matriz_acesso()
+        # Simula outro worker: o banco muda sem passar pelos signals deste processo.
+        PlanoPermissaoApp.objects.filter(plano=self.plano).update(limite_qtd=7)
+        self.assertIs(get_matriz_acesso(), matriz)
+
+        _publicar_versao(Path(self._cache_dir.name) / MATRIZ_VERSAO_FILENAME)
+
+        self.assertEqual(get_matriz_acesso().regra(self.plano.id, "simulado-digital").limite_qtd, 7)
+
+    def test_matriz_e_somente_leitura(self):
+        regras = get_matriz_acesso().regras_do_plano(self.plano.id)
+        with self.assertRaises(TypeError):
+            regras["simulado-digital"] = None
+
+
+class UsoAppContadorTests(SimuladoTentativaBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        regra = PlanoPermissaoApp.objects.get(app_modulo__slug="simulado-digital")
+        regra.limite_qtd = 2
+        regra.limite_periodo = "DIARIO"
+        regra.save()
+
+    def test_consumo_para_no_limite(self):
+        resultados = [check_and_increment_app_use(self.user, "simulado-digital") for _ in range(3)]
+
+        self.assertEqual([allowed for allowed, _, _ in resultados], [True, True, False])
+        self.assertEqual([ctx["contador"] for _, _, ctx in resultados], [1, 2, 2])
+        self.assertEqual(resultados[1][2]["restantes"], 0)
+        self.assertEqual(resultados[2][2]["motivo"], "limite_atingido")
+        self.assertEqual(UsoAppJanela.objects.get(usuario=self.user).contador, 2)
+
+    def test_consumo_e_um_unico_statement(self):
+        get_matriz_acesso()
+        access = AccessContext(self.user)
+        access.assinatura
+
+        with CaptureQueriesContext(connection) as ctx:
+            allowed, _, _ = check_and_increment_app_use(self.user, "simulado-digital", access=access)
+
+        self.assertTrue(allowed)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn("ON CONFLICT", ctx.captured_queries[0]["sql"])
+
+
+class ContadorUsoCacheTests(SimuladoTentativaBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        regra = PlanoPermissaoApp.objects.get(app_modulo__slug="simulado-digital")
+        regra.limite_qtd = 3
+        regra.limite_periodo = "DIARIO"
+        regra.save()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.contadores = ContadorUsoCache()
+        self.addCleanup(self.contadores._pendentes.clear)
+        self.addCleanup(self.contadores.parar)
+        patcher = patch("banco_questoes.access_control.get_contador_uso", return_value=self.contadores)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def consumir(self):
+        return check_and_increment_app_use(self.user, "simulado-digital")
+
+    def test_consumo_fica_no_cache_ate_a_descarga(self):
+        resultados = [self.consumir() for _ in range(4)]
+
+        self.assertEqual([allowed for allowed, _, _ in resultados], [True, True, True, False])
+        self.assertEqual(resultados[3][2]["contador"], 3)
+        self.assertFalse(UsoAppJanela.objects.exists())
+        status = build_plan_status_for_app(self.user, "simulado-digital")
+        self.assertEqual((status["usos"], status["restantes"]), (3, 0))
+
+        self.assertEqual(self.contadores.descarregar(), 1)
+        self.assertEqual(UsoAppJanela.objects.get(usuario=self.user).contador, 3)
+        self.assertEqual(self.contadores.descarregar(), 0)
+
+    def test_descarga_soma_ao_contador_do_banco(self):
+        self.consumir()
+        self.contadores.descarregar()
+        cache.clear()
+
+        allowed, _, contexto = self.consumir()
+        self.contadores.descarregar()
+
+        self.assertTrue(allowed)
+        self.assertEqual(contexto["contador"], 2)
+        self.assertEqual(UsoAppJanela.objects.get(usuario=self.user).contador, 2)
+
+    def test_falha_na_descarga_nao_derruba_o_consumo(self):
+        self.contadores.intervalo = 0
+        with patch("banco_questoes.contador_uso._upsert_sql", return_value="INSERT INTO tabela_inexistente VALUES (%s)"):
+            with self.assertLogs("banco_questoes.contador_uso", level="ERROR"):
+                allowed, _, contexto = self.consumir()
+
+        self.assertTrue(allowed)
+        self.assertEqual(contexto["contador"], 1)
+        self.assertEqual(sum(self.contadores._pendentes.values()), 1)
+        self.assertEqual(self.contadores.descarregar(), 1)
+        self.assertEqual(UsoAppJanela.objects.get(usuario=self.user).contador, 1)
+
+    def test_thread_descarrega_worker_ocioso(self):
+        contadores = ContadorUsoCache()
+        contadores.intervalo = 0.01
+        self.addCleanup(contadores.parar)
+        descarregou = threading.Event()
+
+        with patch.object(contadores, "descarregar", side_effect=descarregou.set):
+            contadores._garantir_descarga_periodica()
+            self.assertTrue(descarregou.wait(2))
+
+    def test_consumo_com_cache_quente_nao_consulta_o_banco(self):
+        get_matriz_acesso()
+        access = AccessContext(self.user)
+        access.assinatura
+        check_and_increment_app_use(self.user, "simulado-digital", access=access)
+
+        with self.assertNumQueries(0):
+            allowed, _, _ = check_and_increment_app_use(self.user, "simulado-digital", access=access)
+
+        self.assertTrue(allowed)
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "concorrencia real exige PostgreSQL")
+class UsoAppContadorConcorrenciaTests(TransactionTestCase):
+    LIMITE = 10
+
+    def setUp(self):
+        self._cache_dir = TemporaryDirectory()
+        self.addCleanup(self._cache_dir.cleanup)
+        settings_override = override_settings(SHARED_CACHE_ROOT=self._cache_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(username="cota@example.com", password="SenhaForte123!")
+        plano = Plano.objects.create(nome="Plano Cota")
+        Assinatura.objects.create(
+            usuario=self.user,
+            plano=plano,
+            nome_plano_snapshot=plano.nome,
+            status=Assinatura.Status.ATIVO,
+            inicio=timezone.now(),
+            valid_until=None,
+        )
+        app = AppModulo.objects.create(slug="simulado-digital", nome="Simulado Digital", ativo=True)
+        PlanoPermissaoApp.objects.create(
+            plano=plano,
+            app_modulo=app,
+            permitido=True,
+            limite_qtd=self.LIMITE,
+            limite_periodo="DIARIO",
+        )
+
+    def consumir(self, _):
+        try:
+            allowed, _, _ = check_and_increment_app_use(self.user, "simulado-digital")
+            return allowed
+        finally:
+            # Cada thread abriu a propria conexao.
+            connection.close()
+
+    def test_muitas_threads_nao_passam_do_limite(self):
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            liberados = sum(pool.map(self.consumir, range(self.LIMITE * 5)))
+
+        self.assertEqual(liberados, self.LIMITE)
+        self.assertEqual(UsoAppJanela.objects.get(usuario=self.user).contador, self.LIMITE)
+
+
+class OfertaUpgradeJanelaTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="oferta@example.com", password="SenhaForte123!")
+
+    def criar_oferta(self, horas_atras):
+        inicio = timezone.now() - timedelta(hours=horas_atras)
+        return OfertaUpgradeUsuario.objects.create(
+            usuario=self.user,
+            campanha_slug=UPGRADE_PROMO_CAMPAIGN_SLUG,
+            ciclo=1,
+            janela_inicio=inicio,
+            janela_fim=inicio + timedelta(hours=24),
+        )
+
+    def test_primeira_visita_cria_ancora_e_as_seguintes_so_leem(self):
+        janela = _get_upgrade_offer_window(self.user)
+        self.assertEqual(janela.ciclo, 1)
+        self.assertEqual(janela.janela_fim - janela.janela_inicio, timedelta(hours=24))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(_get_upgrade_offer_window(self.user), janela)
+
+    def test_ciclo_avanca_pela_ancora_sem_gravar(self):
+        oferta = self.criar_oferta(horas_atras=50)
+
+        janela = _get_upgrade_offer_window(self.user)
+
+        self.assertEqual(janela.ciclo, 3)
+        self.assertEqual(janela.janela_inicio, oferta.janela_inicio + timedelta(hours=48))
+        self.assertEqual(janela.janela_fim, oferta.janela_inicio + timedelta(hours=72))
+        oferta.refresh_from_db()
+        self.assertEqual(oferta.ciclo, 1)
+
+    def test_pagina_de_bloqueio_mostra_nova_chance_no_segundo_ciclo(self):
+        self.criar_oferta(horas_atras=25)
+
+        with CaptureQueriesContext(connection) as ctx:
+            contexto = build_access_blocked_context(
+                user=self.user,
+                app_slug="simulado-digital",
+                reason="Limite",
+                plano_nome="Free",
+                show_upgrade_cta=True,
+                upgrade_url="/upgrade/",
+                motivo_bloqueio="limite_atingido",
+            )
+
+        self.assertTrue(contexto["promo_show_new_chance"])
+        self.assertTrue(all(q["sql"].startswith("SELECT") for q in ctx.captured_queries))
+
+
+class AssinaturaBaseTestCase(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="expira@example.com", password="SenhaForte123!")
+        self.plano = Plano.objects.create(nome="Plano Expira")
+
+    def criar_assinatura(self, *, inicio_dias, validade_dias):
+        agora = timezone.now()
+        return Assinatura.objects.create(
+            usuario=self.user,
+            plano=self.plano,
+            nome_plano_snapshot=self.plano.nome,
+            status=Assinatura.Status.ATIVO,
+            inicio=agora + timedelta(days=inicio_dias),
+            valid_until=agora + timedelta(days=validade_dias) if validade_dias is not None else None,
+        )
+
+
+class ExpirarAssinaturasTests(AssinaturaBaseTestCase):
+    def test_comando_expira_vencidas_em_lotes(self):
+        vencidas = [self.criar_assinatura(inicio_dias=-30 - n, validade_dias=-n - 1) for n in range(3)]
+        vigente = self.criar_assinatura(inicio_dias=-40, validade_dias=10)
+        sem_validade = self.criar_assinatura(inicio_dias=-50, validade_dias=None)
+
+        out = StringIO()
+        call_command("expirar_assinaturas", "--batch-size", "2", stdout=out)
+
+        self.assertIn("3 assinaturas expiradas", out.getvalue())
+        status = dict(Assinatura.objects.values_list("pk", "status"))
+        self.assertEqual({status[a.pk] for a in vencidas}, {Assinatura.Status.EXPIRADO})
+        self.assertEqual(status[vigente.pk], Assinatura.Status.ATIVO)
+        self.assertEqual(status[sem_validade.pk], Assinatura.Status.ATIVO)
+
+    def test_busca_ignora_vencida_ainda_nao_varrida(self):
+        vigente = self.criar_assinatura(inicio_dias=-10, validade_dias=10)
+        self.criar_assinatura(inicio_dias=-1, validade_dias=-1)
+
+        self.assertEqual(get_assinatura_ativa(self.user), vigente)
+
+        call_command("expirar_assinaturas", stdout=StringIO())
+        with self.assertNumQueries(1):
+            self.assertEqual(get_assinatura_ativa(self.user), vigente)
+
+
+class AssinaturaAtualTests(AssinaturaBaseTestCase):
+    def test_ponteiro_segue_a_assinatura_mais_recente(self):
+        antiga = self.criar_assinatura(inicio_dias=-10, validade_dias=None)
+        self.assertEqual(AssinaturaAtual.objects.get(usuario=self.user).assinatura, antiga)
+
+        with transaction.atomic():
+            Assinatura.objects.filter(usuario=self.user, status=Assinatura.Status.ATIVO).update(
+                status=Assinatura.Status.EXPIRADO,
+            )
+            nova = self.criar_assinatura(inicio_dias=0, validade_dias=30)
+
+        with self.assertNumQueries(1):
+            assinatura = get_assinatura_ativa(self.user)
+            self.assertEqual(assinatura.plano.nome, "Plano Expira")
+        self.assertEqual(assinatura, nova)
+
+    def test_sweeper_recalcula_ponteiro(self):
+        vigente = self.criar_assinatura(inicio_dias=-10, validade_dias=10)
+        self.criar_assinatura(inicio_dias=-1, validade_dias=-1)
+
+        call_command("expirar_assinaturas", stdout=StringIO())
+
+        self.assertEqual(AssinaturaAtual.objects.get(usuario=self.user).assinatura, vigente)
+
+    def test_usuario_sem_ponteiro_ganha_um_na_primeira_consulta(self):
+        vigente = self.criar_assinatura(inicio_dias=-1, validade_dias=None)
+        AssinaturaAtual.objects.filter(usuario=self.user).delete()
+
+        self.assertEqual(get_assinatura_ativa(self.user), vigente)
+        self.assertEqual(AssinaturaAtual.objects.get(usuario=self.user).assinatura, vigente)
+
+    def test_excluir_usuario_com_assinatura(self):
+        self.criar_assinatura(inicio_dias=-1, validade_dias=None)
+        usuario_id = self.user.pk
+
+        self.user.delete()
+
+        self.assertFalse(AssinaturaAtual.objects.filter(usuario_id=usuario_id).exists())
+        self.assertFalse(Assinatura.objects.filter(usuario_id=usuario_id).exists())
+
+    def test_excluir_assinatura_recalcula_ponteiro(self):
+        vigente = self.criar_assinatura(inicio_dias=-10, validade_dias=None)
+        nova = self.criar_assinatura(inicio_dias=-1, validade_dias=None)
+
+        nova.delete()
+
+        self.assertEqual(AssinaturaAtual.objects.get(usuario=self.user).assinatura, vigente)
+
+
+class AuditoriaBufferTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+
+    def inserts_auditoria(self, ctx):
+        return [q for q in ctx.captured_queries if q["sql"].startswith('INSERT INTO "banco_questoes_eventoauditoria"')]
+
+    def view(self, request):
+        with CaptureQueriesContext(connection) as ctx:
+            log_event(request, "app_access_blocked", contexto={"n": 1})
+            log_event(request, "meta_capi_event_failed", contexto={"n": 2})
+            log_event(request, "auth_login")
+        self.inserts = self.inserts_auditoria(ctx)
+        return HttpResponse("ok")
+
+    def test_eventos_da_requisicao_saem_num_unico_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            AuditoriaBufferMiddleware(self.view)(self.request)
+
+        # Durante a view so o evento sincrono (auth_login) foi gravado.
+        self.assertEqual(len(self.inserts), 1)
+        self.assertEqual(len(self.inserts_auditoria(ctx)), 2)
+        self.assertEqual(
+            sorted(EventoAuditoria.objects.values_list("tipo", flat=True)),
+            ["app_access_blocked", "auth_login", "meta_capi_event_failed"],
+        )
+        self.assertEqual(set(EventoAuditoria.objects.values_list("ip", flat=True)), {"10.0.0.1"})
+
+    @override_settings(AUDIT_SYNC_EVENT_TYPES=["app_access_blocked"])
+    def test_tipos_sincronos_configuraveis(self):
+        AuditoriaBufferMiddleware(self.view)(self.request)
+
+        self.assertEqual(len(self.inserts), 1)
+        self.assertEqual(EventoAuditoria.objects.count(), 3)
+
+    def test_buffer_e_gravado_mesmo_se_a_view_falha(self):
+        def view_com_erro(request):
+            log_event(request, "app_access_blocked")
+            raise RuntimeError("falhou")
+
+        with self.assertRaises(RuntimeError):
+            AuditoriaBufferMiddleware(view_com_erro)(self.request)
+
+        self.assertTrue(EventoAuditoria.objects.filter(tipo="app_access_blocked").exists())
+
+    def test_falha_na_gravacao_nao_derruba_a_resposta(self):
+        def view(request):
+            log_event(request, "app_access_blocked")
+            return HttpResponse("ok")
+
+        with patch("banco_questoes.middleware.descarregar_eventos", side_effect=RuntimeError("banco fora")):
+            with self.assertLogs("banco_questoes.middleware", level="ERROR"):
+                response = AuditoriaBufferMiddleware(view)(self.request)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_falha_na_gravacao_preserva_a_excecao_da_view(self):
+        def view_com_erro(request):
+            raise ValueError("erro da view")
+
+        with patch("banco_questoes.middleware.descarregar_eventos", side_effect=RuntimeError("banco fora")):
+            with self.assertLogs("banco_questoes.middleware", level="ERROR"):
+                with self.assertRaisesMessage(ValueError, "erro da view"):
+                    AuditoriaBufferMiddleware(view_com_erro)(self.request)
+
+    def test_fora_de_requisicao_grava_na_hora(self):
+        log_event(self.request, "app_access_blocked")
+
+        self.assertEqual(EventoAuditoria.objects.count(), 1)
+
+
+class AuditoriaParticoesTests(TestCase):
+    @unittest.skipIf(connection.vendor == "postgresql", "No PostgreSQL a tabela e particionada.")
+    def test_sem_particionamento_comandos_usam_fallback(self):
+        antigo = EventoAuditoria.objects.create(tipo="auth_login")
+        EventoAuditoria.objects.filter(pk=antigo.pk).update(timestamp=timezone.now() - timedelta(days=200))
+        recente = EventoAuditoria.objects.create(tipo="auth_login")
+
+        out = StringIO()
+        call_command("criar_particoes_auditoria", stdout=out)
+        self.assertIn("nada a fazer", out.getvalue())
+
+        call_command("purge_audit_events", "--dias", "180", stdout=StringIO())
+        self.assertEqual(list(EventoAuditoria.objects.values_list("pk", flat=True)), [recente.pk])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Particionamento so no PostgreSQL.")
+    def test_particoes_mensais_criadas_e_descartadas(self):
+        mes_atual = inicio_mes(timezone.now())
+        proximo_mes = inicio_mes(mes_atual + timedelta(days=32))
+        self.assertEqual(criar_particoes(3), [])
+        self.assertIn(nome_particao(proximo_mes), {p.nome for p in listar_particoes()})
+
+        evento = EventoAuditoria.objects.create(tipo="auth_login")
+
+        # A particao legado vai ate o fim do mes corrente: um corte no inicio do mes
+        # ainda nao a alcanca.
+        self.assertEqual(remover_particoes_antigas(mes_atual), [])
+        removidas = remover_particoes_antigas(proximo_mes)
+        self.assertEqual(removidas, [EventoAuditoria._meta.db_table + "_legado"])
+        self.assertFalse(EventoAuditoria.objects.filter(pk=evento.pk).exists())
+        self.assertNotIn(removidas[0], {p.nome for p in listar_particoes()})
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Particionamento so no PostgreSQL.")
+    def test_purge_remove_eventos_antigos_da_particao_legado(self):
+        antigo = EventoAuditoria.objects.create(tipo="auth_login")
+        EventoAuditoria.objects.filter(pk=antigo.pk).update(timestamp=timezone.now() - timedelta(days=400))
+        recente = EventoAuditoria.objects.create(tipo="auth_login")
+
+        out = StringIO()
+        call_command("purge_audit_events", "--dias", "180", "--pausa", "0", stdout=out)
+
+        # A legado vai ate o mes seguinte e nao pode ser descartada inteira.
+        self.assertIn(EventoAuditoria._meta.db_table + "_legado", {p.nome for p in listar_particoes()})
+        self.assertIn("1 eventos removidos", out.getvalue())
+        self.assertEqual(list(EventoAuditoria.objects.values_list("pk", flat=True)), [recente.pk])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Particionamento so no PostgreSQL.")
+    def test_particao_criada_atrasada_recebe_linhas_da_default(self):
+        agora = timezone.now()
+        evento = EventoAuditoria.objects.create(tipo="auth_login")
+        futuro = inicio_mes(agora + timedelta(days=250)) + timedelta(days=3)
+        EventoAuditoria.objects.filter(pk=evento.pk).update(timestamp=futuro)
+
+        criadas = criar_particoes(12, agora=agora)
+
+        self.assertIn(nome_particao(inicio_mes(futuro)), criadas)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {EventoAuditoria._meta.db_table} WHERE id = %s",
+                [evento.pk],
+            )
+            self.assertEqual(cursor.fetchone()[0], nome_particao(inicio_mes(futuro)))
+        self.assertEqual(criar_particoes(12, agora=agora), [])
+
+    def criar_tabela_pre_0015(self, tabela, agora):
+        with connection.cursor() as cursor:
+            # Mesmo formato da tabela criada pela 0001 (antes da 0015).
+            cursor.execute(
+                f'CREATE TABLE {tabela} ('
+                f'id bigint GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, '
+                f'tipo varchar(60) NOT NULL, '
+                f'usuario_id integer NULL REFERENCES {get_user_model()._meta.db_table} (id) DEFERRABLE INITIALLY DEFERRED, '
+                f'"timestamp" timestamp with time zone NOT NULL, '
+                f'ip inet NULL, device_id varchar(64) NOT NULL, contexto_json jsonb NOT NULL)'
+            )
+            cursor.execute(f"CREATE INDEX {tabela}_tipo_idx ON {tabela} (tipo)")
+            for momento in (agora - timedelta(days=40), agora):
+                cursor.execute(
+                    f'INSERT INTO {tabela} (tipo, "timestamp", device_id, contexto_json) VALUES (%s, %s, %s, %s)',
+                    ["auth_login", momento, "", "{}"],
+                )
+            # Na migracao real as linhas ja estao commitadas; aqui dispara as checagens da FK.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Particionamento so no PostgreSQL.")
+    def test_migracao_com_eventos_do_mes_corrente(self):
+        migracao = importlib.import_module("banco_questoes.migrations.0015_eventoauditoria_particionado")
+        tabela = "bq_teste_eventos_particionar"
+        agora = timezone.now()
+        self.criar_tabela_pre_0015(tabela, agora)
+
+        migracao.particionar_tabela(connection, tabela, get_user_model()._meta.db_table, agora=agora)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [tabela])
+            self.assertEqual(cursor.fetchone()[0], "p")
+            cursor.execute(
+                f'INSERT INTO {tabela} (tipo, "timestamp", device_id, contexto_json) VALUES (%s, %s, %s, %s) RETURNING id',
+                ["auth_login", agora, "", "{}"],
+            )
+            self.assertEqual(cursor.fetchone()[0], 3)
+            cursor.execute(f"SELECT tableoid::regclass::text, count(*) FROM {tabela} GROUP BY 1")
+            self.assertEqual(dict(cursor.fetchall()), {f"{tabela}_legado": 3})
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [tabela])
+            self.assertIn(f"{tabela}_tipo_idx", {row[0] for row in cursor.fetchall()})
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Particionamento so no PostgreSQL.")
+    def test_migracao_revertida_volta_a_tabela_simples(self):
+        migracao = importlib.import_module("banco_questoes.migrations.0015_eventoauditoria_particionado")
+        tabela = "bq_teste_eventos_particionar"
+        tabela_usuario = get_user_model()._meta.db_table
+        agora = timezone.now()
+        self.criar_tabela_pre_0015(tabela, agora)
+        migracao.particionar_tabela(connection, tabela, tabela_usuario, agora=agora)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tabela} (tipo, "timestamp", device_id, contexto_json) VALUES (%s, %s, %s, %s)',
+                ["auth_login", agora + timedelta(days=70), "", "{}"],
+            )
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        migracao.desparticionar_tabela(connection, tabela, tabela_usuario)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [tabela])
+            self.assertEqual(cursor.fetchone()[0], "r")
+            cursor.execute(f"SELECT id FROM {tabela} ORDER BY id")
+            self.assertEqual([row[0] for row in cursor.fetchall()], [1, 2, 3])
+            cursor.execute(
+                f'INSERT INTO {tabela} (tipo, "timestamp", device_id, contexto_json) VALUES (%s, %s, %s, %s) RETURNING id',
+                ["auth_login", agora, "", "{}"],
+            )
+            self.assertEqual(cursor.fetchone()[0], 4)
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [tabela])
+            self.assertEqual({row[0] for row in cursor.fetchall()}, {f"{tabela}_pkey", f"{tabela}_tipo_idx"})
+        # Pode ser particionada de novo (reaplicar a 0015).
+        migracao.particionar_tabela(connection, tabela, tabela_usuario, agora=agora)
+
+
+class PurgeAuditoriaArquivoTests(TestCase):
+    def setUp(self):
+        self._dir = TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.pasta = Path(self._dir.name)
+        self.hoje = timezone.localtime().date()
+
+    def evento(self, dias_atras, tipo="app_access_blocked"):
+        evento = EventoAuditoria.objects.create(tipo=tipo, contexto_json={"app": "simulado"})
+        momento = timezone.make_aware(datetime.combine(self.hoje - timedelta(days=dias_atras), datetime.min.time()))
+        EventoAuditoria.objects.filter(pk=evento.pk).update(timestamp=momento + timedelta(hours=10))
+        return evento
+
+    def purge(self):
+        call_command(
+            "purge_audit_events",
+            "--dias", "180",
+            "--archive-dir", str(self.pasta),
+            "--batch-size", "2",
+            "--chunk-size", "2",
+            "--pausa", "0",
+            stdout=StringIO(),
+        )
+
+    def ler(self, dias_atras):
+        arquivo = self.pasta / f"eventos_auditoria_{(self.hoje - timedelta(days=dias_atras)).isoformat()}.jsonl.gz"
+        with gzip.open(arquivo, "rt", encoding="utf-8") as fp:
+            return [json.loads(linha) for linha in fp]
+
+    def test_arquiva_por_dia_e_remove_em_lotes(self):
+        antigos = [self.evento(200), self.evento(200), self.evento(200), self.evento(190)]
+        recente = self.evento(10)
+
+        self.purge()
+
+        self.assertEqual([e["id"] for e in self.ler(200)], [e.pk for e in antigos[:3]])
+        self.assertEqual([e["id"] for e in self.ler(190)], [antigos[3].pk])
+        self.assertEqual(self.ler(190)[0]["contexto_json"], {"app": "simulado"})
+        self.assertEqual(sorted(p.name for p in self.pasta.iterdir()), [
+            f"eventos_auditoria_{(self.hoje - timedelta(days=200)).isoformat()}.jsonl.gz",
+            f"eventos_auditoria_{(self.hoje - timedelta(days=190)).isoformat()}.jsonl.gz",
+        ])
+        self.assertEqual(list(EventoAuditoria.objects.values_list("pk", flat=True)), [recente.pk])
+
+    def test_retomada_apos_interrupcao(self):
+        eventos = [self.evento(200), self.evento(200)]
+        with patch.object(PurgeAuditEventsCommand, "_remover_em_lotes", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.purge()
+        arquivo = next(self.pasta.glob("*.jsonl.gz"))
+        conteudo = arquivo.read_bytes()
+        self.assertEqual(EventoAuditoria.objects.count(), 2)
+
+        self.purge()
+
+        self.assertEqual(arquivo.read_bytes(), conteudo)
+        self.assertEqual([e["id"] for e in self.ler(200)], [e.pk for e in eventos])
+        self.assertFalse(EventoAuditoria.objects.exists())
+        self.assertFalse(list(self.pasta.glob("*.tmp")))
+
+
+@override_settings(REGISTER_COOLDOWN_ENABLED=True)
+class CadastroCooldownTests(TestCase):
+    def setUp(self):
+        # A migration de seed ja cria o plano Free.
+        Plano.objects.update_or_create(nome="Free", defaults={"ativo": True})
+
+    def registrar(self, email, ip="10.0.0.9"):
+        self.client.cookies.clear()
+        return self.client.post(
+            reverse("register"),
+            data={"username": email, "password1": "SenhaForte123!", "password2": "SenhaForte123!"},
+            REMOTE_ADDR=ip,
+        )
+
+    def test_segundo_cadastro_do_mesmo_ip_fica_bloqueado(self):
+        self.assertEqual(self.registrar("primeiro@example.com").status_code, 302)
+        self.client.logout()
+
+        response = self.registrar("segundo@example.com")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("cooldown_message", response.context)
+        self.assertFalse(get_user_model().objects.filter(username="segundo@example.com").exists())
+        self.assertTrue(CadastroRecente.objects.filter(pk=chave_cadastro("ip", "10.0.0.9")).exists())
+        self.assertFalse(CadastroRecente.objects.filter(pk__contains="10.0.0.9").exists())
+
+        self.client.logout()
+        self.assertEqual(self.registrar("terceiro@example.com", ip="10.0.0.10").status_code, 302)
+
+    def test_consulta_sem_varrer_auditoria(self):
+        registrar_cadastro("10.0.0.9", "device-1")
+        with CaptureQueriesContext(connection) as ctx:
+            restante = tempo_restante_cadastro("", "device-1")
+
+        self.assertGreater(restante, timedelta(hours=1))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("eventoauditoria", ctx.captured_queries[0]["sql"])
+
+    def test_chaves_fora_da_janela_sao_despejadas(self):
+        CadastroRecente.objects.create(chave=chave_cadastro("ip", "10.0.0.1"), ultimo_cadastro_em=timezone.now() - timedelta(hours=3))
+        self.assertIsNone(tempo_restante_cadastro("10.0.0.1", ""))
+
+        registrar_cadastro("10.0.0.2", "")
+
+        self.assertEqual(list(CadastroRecente.objects.values_list("chave", flat=True)), [chave_cadastro("ip", "10.0.0.2")])
+
+
+class ResumoAuditoriaTests(TestCase):
+    def evento(self, tipo, **contexto):
+        return EventoAuditoria.objects.create(tipo=tipo, contexto_json=contexto)
+
+    def totais(self):
+        return {
+            (r.tipo, r.app_slug, r.plano, r.motivo): r.total
+            for r in ResumoAuditoriaDiario.objects.all()
+        }
+
+    def test_soma_incremental_a_partir_da_marca(self):
+        self.evento("app_access_blocked", app_slug="simulado-digital", plano="Free", motivo="limite_atingido")
+        self.evento("app_access_blocked", app_slug="simulado-digital", plano="Free", motivo="limite_atingido")
+        self.evento("meta_capi_event_failed", app_slug="simulado-digital", reason="timeout")
+        depois = timezone.now() + timedelta(minutes=5)
+
+        self.assertEqual(atualizar_resumo(lote=2, agora=depois), 3)
+        ultimo = self.evento("app_access_blocked", app_slug="simulado-digital", plano="Free", motivo="limite_atingido")
+        self.assertEqual(atualizar_resumo(agora=depois), 1)
+        self.assertEqual(atualizar_resumo(agora=depois), 0)
+
+        self.assertEqual(
+            self.totais(),
+            {
+                ("app_access_blocked", "simulado-digital", "Free", "limite_atingido"): 3,
+                ("meta_capi_event_failed", "simulado-digital", "", "timeout"): 1,
+            },
+        )
+        self.assertEqual(ResumoAuditoriaDiario.objects.first().dia, timezone.localdate())
+        self.assertEqual(ResumoAuditoriaProgresso.objects.get().ultimo_evento_id, ultimo.pk)
+
+    def test_eventos_recentes_ficam_para_a_proxima_rodada(self):
+        antigo = self.evento("auth_login")
+        EventoAuditoria.objects.filter(pk=antigo.pk).update(timestamp=timezone.now() - timedelta(minutes=10))
+        self.evento("auth_login")
+
+        self.assertEqual(atualizar_resumo(), 1)
+        self.assertEqual(self.totais(), {("auth_login", "", "", ""): 1})
+        self.assertEqual(ResumoAuditoriaProgresso.objects.get().ultimo_evento_id, antigo.pk)
+
+    def test_relatorio_no_admin(self):
+        self.evento("auth_login")
+        atualizar_resumo(agora=timezone.now() + timedelta(minutes=5))
+        admin_user = get_user_model().objects.create_superuser("admin@example.com", "admin@example.com", "SenhaForte123!")
+        self.client.force_login(admin_user)
+
+        response = self.client.get(reverse("admin:banco_questoes_resumoauditoriadiario_changelist"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "auth_login")
+
+
+class PoliticaAuditoriaTests(TestCase):
+    def setUp(self):
+        _janela_recente.limpar()
+        self.addCleanup(_janela_recente.limpar)
+        self.user = get_user_model().objects.create_user(username="politica@example.com", password="SenhaForte123!")
+        self.request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+
+    def tipos(self):
+        return Counter(EventoAuditoria.objects.values_list("tipo", flat=True))
+
+    def test_primeiro_por_usuario_e_app_na_janela(self):
+        for _ in range(5):
+            log_event(self.request, "app_access_granted", user=self.user, contexto={"app_slug": "apostila-cnh"})
+        log_event(self.request, "app_access_granted", user=self.user, contexto={"app_slug": "simulado-digital"})
+
+        self.assertEqual(self.tipos(), {"app_access_granted": 2})
+
+    @override_settings(AUDIT_EVENT_POLICIES={"app_access_granted": "first_per_window:1"})
+    def test_janela_expirada_grava_de_novo(self):
+        log_event(self.request, "app_access_granted", user=self.user, contexto={"app_slug": "apostila-cnh"})
+        with patch("banco_questoes.auditoria.time.monotonic", return_value=time.monotonic() + 5):
+            log_event(self.request, "app_access_granted", user=self.user, contexto={"app_slug": "apostila-cnh"})
+
+        self.assertEqual(self.tipos(), {"app_access_granted": 2})
+
+    @override_settings(AUDIT_EVENT_POLICIES={"app_access_granted": "never", "app_access_blocked": "sample:4"})
+    def test_descarte_e_amostragem(self):
+        log_event(self.request, "app_access_granted", user=self.user)
+        with patch("banco_questoes.auditoria.random.randrange", side_effect=[1, 2, 0, 3]):
+            for _ in range(4):
+                log_event(self.request, "app_access_blocked", user=self.user, contexto={"motivo": "limite_atingido"})
+        log_event(self.request, "auth_login", user=self.user)
+
+        self.assertEqual(self.tipos(), {"app_access_blocked": 1, "auth_login": 1})
+        self.assertEqual(EventoAuditoria.objects.get(tipo="app_access_blocked").contexto_json["amostra_1_em"], 4)
+        atualizar_resumo(agora=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(ResumoAuditoriaDiario.objects.get(tipo="app_access_blocked").total, 4)
+
+    @override_settings(AUDIT_EVENT_POLICIES={"app_access_granted": "sample:abc"})
+    def test_politica_invalida_grava_sempre(self):
+        log_event(self.request, "app_access_granted", user=self.user)
+        log_event(self.request, "app_access_granted", user=self.user)
+
+        self.assertEqual(self.tipos(), {"app_access_granted": 2})
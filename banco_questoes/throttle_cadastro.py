@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .models import CadastroRecente
+
+
+REGISTER_COOLDOWN_SECONDS = 2 * 60 * 60
+# Mesmo salt na migration 0016 (backfill); mudar aqui invalida as chaves gravadas.
+CHAVE_SALT = "banco_questoes.throttle_cadastro"
+
+
+def chave_cadastro(tipo: str, valor: str) -> str:
+    """Hash (HMAC-SHA256 com a SECRET_KEY) de "ip:..." ou "device:...": nada legivel fica gravado."""
+    return salted_hmac(CHAVE_SALT, f"{tipo}:{valor}", algorithm="sha256").hexdigest()
+
+
+def _chaves(ip: str, device_id: str) -> list[str]:
+    chaves = []
+    if ip:
+        chaves.append(chave_cadastro("ip", ip))
+    if device_id:
+        chaves.append(chave_cadastro("device", device_id))
+    return chaves
+
+
+def _cooldown() -> timedelta:
+    return timedelta(seconds=REGISTER_COOLDOWN_SECONDS)
+
+
+def tempo_restante_cadastro(ip: str, device_id: str) -> timedelta | None:
+    """Tempo que falta para o IP/dispositivo poder cadastrar de novo (ate duas buscas por chave primaria)."""
+    if not settings.REGISTER_COOLDOWN_ENABLED:
+        return None
+    chaves = _chaves(ip, device_id)
+    if not chaves:
+        return None
+
+    agora = timezone.now()
+    ultimo = (
+        CadastroRecente.objects
+        .filter(chave__in=chaves, ultimo_cadastro_em__gte=agora - _cooldown())
+        .aggregate(ultimo=Max("ultimo_cadastro_em"))["ultimo"]
+    )
+    if ultimo is None:
+        return None
+    remaining = _cooldown() - (agora - ultimo)
+    if remaining.total_seconds() <= 0:
+        return None
+    return remaining
+
+
+def registrar_cadastro(ip: str, device_id: str) -> None:
+    """
+    Grava o cadastro para o IP e o dispositivo (upsert) e despeja as chaves que ja
+    sairam da janela: a tabela fica do tamanho dos cadastros das ultimas 2 horas.
+    """
+    chaves = _chaves(ip, device_id)
+    if not chaves:
+        return
+    agora = timezone.now()
+    CadastroRecente.objects.filter(ultimo_cadastro_em__lt=agora - _cooldown()).delete()
+    CadastroRecente.objects.bulk_create(
+        [CadastroRecente(chave=chave, ultimo_cadastro_em=agora) for chave in chaves],
+        update_conflicts=True,
+        unique_fields=["chave"],
+        update_fields=["ultimo_cadastro_em"],
+    )
@@ -10,7 +10,16 @@ urlpatterns = [
     path("questao/", views_simulado.simulado_questao, name="questao"),
     path("responder/", views_simulado.simulado_responder, name="responder"),
     path("resultado/", views_simulado.simulado_resultado, name="resultado"),
+    path("offline/<uuid:tentativa_id>/", views_simulado.simulado_offline, name="offline"),
+    path("sw.js", views_simulado.simulado_service_worker, name="service_worker"),
     # endpoint AJAX
     path("api/modulos/", views_simulado.api_modulos_por_curso, name="api_modulos"),
     path("api/stats/", views_simulado.api_stats, name="api_stats"),
+    path("api/tentativa/<uuid:tentativa_id>/", views_simulado.api_tentativa, name="api_tentativa"),
+    path(
+        "api/tentativa/<uuid:tentativa_id>/responder/",
+        views_simulado.api_tentativa_responder,
+        name="api_tentativa_responder",
+    ),
+    path("api/tentativa/<uuid:tentativa_id>/pacote/", views_simulado.api_tentativa_pacote, name="api_tentativa_pacote"),
 ]
@@ -7,7 +7,6 @@ from django.conf import settings
 from django.contrib.auth import login
 from django.contrib.auth import views as auth_views
 from django.db import IntegrityError, transaction
-from django.db.models import Q
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
@@ -18,11 +17,11 @@ from django.views.decorators.http import require_http_methods
 from .auditoria import DEVICE_COOKIE_NAME, get_client_ip, log_event
 from .forms import EmailAuthenticationForm, RegistroForm
 from .meta_capi import send_meta_event
-from .models import Assinatura, ConviteCadastroPlano, EventoAuditoria, Plano
+from .models import Assinatura, ConviteCadastroPlano, Plano
+from .throttle_cadastro import registrar_cadastro, tempo_restante_cadastro
 
 
 DEVICE_COOKIE_MAX_AGE = 60 * 60 * 24 * 365 * 2
-REGISTER_COOLDOWN_SECONDS = 2 * 60 * 60
 
 
 class EmailLoginView(auth_views.LoginView):
@@ -88,35 +87,6 @@ def _safe_next_url(request: HttpRequest) -> str:
     return reverse("menu:home")
 
 
-def _cooldown_remaining(ip: str, device_id: str) -> timedelta | None:
-    if not settings.REGISTER_COOLDOWN_ENABLED:
-        return None
-    if not ip and not device_id:
-        return None
-
-    cutoff = timezone.now() - timedelta(seconds=REGISTER_COOLDOWN_SECONDS)
-    filters = Q()
-    if ip:
-        filters |= Q(ip=ip)
-    if device_id:
-        filters |= Q(device_id=device_id)
-
-    last_event = (
-        EventoAuditoria.objects
-        .filter(tipo="auth_register", timestamp__gte=cutoff)
-        .filter(filters)
-        .order_by("-timestamp")
-        .first()
-    )
-    if not last_event:
-        return None
-    elapsed = timezone.now() - last_event.timestamp
-    remaining = timedelta(seconds=REGISTER_COOLDOWN_SECONDS) - elapsed
-    if remaining.total_seconds() <= 0:
-        return None
-    return remaining
-
-
 def _format_remaining(remaining: timedelta) -> str:
     total_minutes = int(remaining.total_seconds() // 60) + 1
     hours, minutes = divmod(total_minutes, 60)
@@ -271,7 +241,7 @@ def registrar(request: HttpRequest) -> HttpResponse:
     next_url = (request.POST.get("next") or request.GET.get("next") or "").strip()
 
     if request.method == "POST":
-        remaining = _cooldown_remaining(ip, device_id)
+        remaining = tempo_restante_cadastro(ip, device_id)
         if remaining:
             log_event(
                 request,
@@ -310,6 +280,7 @@ def registrar(request: HttpRequest) -> HttpResponse:
                     device_id=device_id,
                     contexto={"plano": assinatura.nome_plano_snapshot},
                 )
+                registrar_cadastro(ip, device_id)
                 event_id = f"reg-{user.id}"
                 _queue_pixel_event(
                     request,
@@ -352,7 +323,7 @@ def registrar_parceiro(request: HttpRequest, token: str) -> HttpResponse:
     }
 
     if request.method == "POST":
-        remaining = _cooldown_remaining(ip, device_id)
+        remaining = tempo_restante_cadastro(ip, device_id)
         if remaining:
             log_event(
                 request,
@@ -400,6 +371,7 @@ def registrar_parceiro(request: HttpRequest, token: str) -> HttpResponse:
                     device_id=device_id,
                     contexto={"plano": assinatura.nome_plano_snapshot},
                 )
+                registrar_cadastro(ip, device_id)
                 event_id = f"reg-{user.id}"
                 _queue_pixel_event(
                     request,
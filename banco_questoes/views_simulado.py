@@ -9,36 +9,54 @@ from functools import wraps
 from django.conf import settings
 from django.contrib.auth.views import redirect_to_login
 from django.db import transaction
-from django.db.models import Count, Q
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
+from django.templatetags.static import static
 from django.urls import reverse
 from django.utils import timezone
-from django.utils.dateparse import parse_datetime
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_http_methods, require_GET
 
 from banco_questoes.access_control import (
     build_access_blocked_context,
+    build_plan_status_for_app,
     check_and_increment_app_use,
-    get_regra_app,
-    is_upgrade_pix_eligible,
+    get_access_context,
 )
 from banco_questoes.auditoria import log_event
+from banco_questoes.catalogo_questoes import faceta_key, get_catalogo
+from banco_questoes.fragmentos_questao import get_fragmentos_questao
 from banco_questoes.meta_capi import send_meta_event
 from banco_questoes.models import (
-    Alternativa,
     Assinatura,
     Curso,
     CursoModulo,
-    Questao,
+    SimuladoTentativa,
     SimuladoUso,
-    UsoAppJanela,
 )
+from banco_questoes.simulado_adaptativo import sortear_adaptativo
+from banco_questoes.simulado_bundle import carregar_bundle, descartar_bundle, get_bundle
 from banco_questoes.simulado_config import get_simulado_config
+from banco_questoes.simulado_detran import planejar_prova_detran, sortear_estratificado
+from banco_questoes.simulado_tentativas import (
+    criar_tentativa,
+    decodificar_respostas,
+    finalizar_tentativa,
+    get_tentativa,
+    nova_semente,
+    registrar_resposta,
+    registrar_respostas,
+    sortear_reproduzivel,
+)
 
 
-SESSION_KEY = "simulado_state_v1"
+SESSION_KEY = "simulado_tentativa_id"
+LEGACY_SESSION_KEY = "simulado_state_v1"
 SIMULADO_APP_SLUG = "simulado-digital"
+# Modos que mostram o feedback da questao logo apos a resposta
+MODOS_COM_FEEDBACK = {"ESTUDO", "ADAPTATIVO"}
+# Sobe quando o formato do pacote offline ou o service worker mudarem (invalida o cache do navegador)
+PACOTE_OFFLINE_VERSAO = 1
 
 
 def login_required_audit(view_func):
@@ -56,17 +74,18 @@ def login_required_audit(view_func):
     return _wrapped
 
 
-def _get_state(request: HttpRequest) -> dict:
-    return request.session.get(SESSION_KEY, {})
+def _get_tentativa(request: HttpRequest) -> SimuladoTentativa | None:
+    # A sessao guarda so o id; o estado do simulado vive em SimuladoTentativa.
+    return get_tentativa(request.user, request.session.get(SESSION_KEY))
 
 
-def _set_state(request: HttpRequest, state: dict) -> None:
-    request.session[SESSION_KEY] = state
-    request.session.modified = True
+def _set_tentativa(request: HttpRequest, tentativa: SimuladoTentativa) -> None:
+    request.session[SESSION_KEY] = str(tentativa.id)
 
 
 def _clear_state(request: HttpRequest) -> None:
-    request.session.pop(SESSION_KEY, None)
+    descartar_bundle(request.session.pop(SESSION_KEY, None) or "")
+    request.session.pop(LEGACY_SESSION_KEY, None)
     request.session.modified = True
 
 
@@ -144,30 +163,6 @@ def _build_frontend_config(cfg: dict) -> tuple[dict, dict, str | None]:
     return frontend_config, quick_filters, quick_curso_id
 
 
-def _now_iso() -> str:
-    return timezone.now().isoformat()
-
-
-def _parse_ts(value: str | None):
-    if not value:
-        return None
-    dt = parse_datetime(value)
-    if dt and timezone.is_naive(dt):
-        dt = timezone.make_aware(dt, timezone.get_current_timezone())
-    return dt
-
-
-def _get_active_assinatura(user) -> Assinatura | None:
-    now = timezone.now()
-    return (
-        Assinatura.objects
-        .filter(usuario=user, status=Assinatura.Status.ATIVO)
-        .filter(Q(valid_until__isnull=True) | Q(valid_until__gte=now))
-        .order_by("-inicio", "-criado_em")
-        .first()
-    )
-
-
 def _get_period_seconds(periodo: str | None) -> int | None:
     if not periodo:
         return None
@@ -236,7 +231,11 @@ def _dual_write_legacy_simulado_uso(
 
 
 def _check_and_increment_uso(request: HttpRequest, user, assinatura: Assinatura) -> tuple[bool, str | None]:
-    allowed, reason, contexto = check_and_increment_app_use(user, SIMULADO_APP_SLUG)
+    allowed, reason, contexto = check_and_increment_app_use(
+        user,
+        SIMULADO_APP_SLUG,
+        access=get_access_context(request),
+    )
     if allowed:
         _dual_write_legacy_simulado_uso(request, user=user, assinatura=assinatura)
         return True, None
@@ -253,115 +252,24 @@ def _check_and_increment_uso(request: HttpRequest, user, assinatura: Assinatura)
     return False, reason
 
 
-def _build_plano_status_v2(user, assinatura: Assinatura) -> dict:
-    nome_plano = assinatura.nome_plano_snapshot or (assinatura.plano.nome if assinatura.plano else "Plano")
-    is_free = nome_plano.strip().lower() == "free"
-    upgrade_pix_eligible = is_upgrade_pix_eligible(assinatura)
-    regra = get_regra_app(assinatura, SIMULADO_APP_SLUG)
-    if not regra:
-        return {
-            "ativo": True,
-            "nome": nome_plano,
-            "is_free": is_free,
-            "upgrade_pix_eligible": upgrade_pix_eligible,
-            "limite_qtd": None,
-            "limite_periodo": None,
-            "limite_periodo_label": "",
-            "ilimitado": False,
-            "usos": 0,
-            "restantes": 0,
-            "janela_inicio": None,
-            "janela_fim": None,
-            "valid_until": assinatura.valid_until,
-            "regra_ausente": True,
-        }
-
-    if not regra.permitido:
-        return {
-            "ativo": True,
-            "nome": nome_plano,
-            "is_free": is_free,
-            "upgrade_pix_eligible": upgrade_pix_eligible,
-            "limite_qtd": regra.limite_qtd,
-            "limite_periodo": regra.limite_periodo,
-            "limite_periodo_label": regra.get_limite_periodo_display() if regra.limite_periodo else "",
-            "ilimitado": False,
-            "usos": 0,
-            "restantes": 0,
-            "janela_inicio": None,
-            "janela_fim": None,
-            "valid_until": assinatura.valid_until,
-            "regra_ausente": False,
-        }
-
-    limite = regra.limite_qtd
-    periodo = regra.limite_periodo
-    ilimitado = limite is None
-    usos = 0
-    restantes = None
-    janela_inicio = None
-    janela_fim = None
-    periodo_label = regra.get_limite_periodo_display() if periodo else ""
-
-    if not ilimitado and periodo:
-        period_seconds = _get_period_seconds(periodo)
-        if period_seconds:
-            inicio = assinatura.inicio
-            if inicio:
-                janela_inicio, janela_fim = _get_janela_atual(inicio, period_seconds)
-                uso = (
-                    UsoAppJanela.objects
-                    .filter(
-                        usuario=user,
-                        app_modulo=regra.app_modulo,
-                        janela_inicio=janela_inicio,
-                        janela_fim=janela_fim,
-                    )
-                    .first()
-                )
-                usos = uso.contador if uso else 0
-                restantes = max(limite - usos, 0)
-            else:
-                usos = 0
-                restantes = limite
-
-    return {
-        "ativo": True,
-        "nome": nome_plano,
-        "is_free": is_free,
-        "upgrade_pix_eligible": upgrade_pix_eligible,
-        "limite_qtd": limite,
-        "limite_periodo": periodo,
-        "limite_periodo_label": periodo_label,
-        "ilimitado": ilimitado,
-        "usos": usos,
-        "restantes": restantes,
-        "janela_inicio": janela_inicio,
-        "janela_fim": janela_fim,
-        "valid_until": assinatura.valid_until,
-        "regra_ausente": False,
-    }
-
-
-def _build_plano_status(user, assinatura: Assinatura | None = None) -> dict | None:
-    if not user.is_authenticated:
+def _build_plano_status(request: HttpRequest) -> dict | None:
+    if not request.user.is_authenticated:
         return None
 
-    assinatura = assinatura or _get_active_assinatura(user)
-    if not assinatura:
+    access = get_access_context(request)
+    if not access.assinatura:
         return {"ativo": False}
 
-    return _build_plano_status_v2(user, assinatura)
+    return build_plan_status_for_app(request.user, SIMULADO_APP_SLUG, access=access)
 
 
 def _build_error_context(
     request: HttpRequest,
     *,
     msg: str,
-    assinatura: Assinatura | None = None,
     allow_upgrade: bool = False,
 ) -> dict:
-    plano_status = _build_plano_status(request.user, assinatura)
+    plano_status = _build_plano_status(request)
     show_upgrade_cta = bool(
         allow_upgrade and plano_status and plano_status.get("ativo") and plano_status.get("upgrade_pix_eligible")
     )
@@ -378,11 +286,10 @@ def _render_access_blocked(
     request: HttpRequest,
     *,
     msg: str,
-    assinatura: Assinatura | None = None,
     allow_upgrade: bool = False,
     motivo_bloqueio: str = "",
 ) -> HttpResponse:
-    plano_status = _build_plano_status(request.user, assinatura)
+    plano_status = _build_plano_status(request)
     plano_nome = ""
     if plano_status and plano_status.get("ativo"):
         plano_nome = str(plano_status.get("nome") or "")
@@ -453,7 +360,7 @@ def _render_access_blocked(
 def simulado_inicio(request: HttpRequest) -> HttpResponse:
     cfg = get_simulado_config()
     frontend_config, quick_filters, quick_curso_id = _build_frontend_config(cfg)
-    plano_status = _build_plano_status(request.user)
+    plano_status = _build_plano_status(request)
 
     # limpa sessao anterior para evitar retomar simulados ao entrar na tela inicial
     _clear_state(request)
@@ -507,7 +414,7 @@ def simulado_config(request: HttpRequest) -> HttpResponse:
         },
         "quick_curso_id": str(quick_curso_id or ""),
     }
-    plano_status = _build_plano_status(request.user)
+    plano_status = _build_plano_status(request)
     plano_bloqueado = bool(plano_status and plano_status.get("restantes") == 0)
     return render(
         request,
@@ -528,7 +435,7 @@ def simulado_config(request: HttpRequest) -> HttpResponse:
 @login_required_audit
 @require_http_methods(["POST"])
 def simulado_iniciar(request: HttpRequest) -> HttpResponse:
-    assinatura = _get_active_assinatura(request.user)
+    assinatura = get_access_context(request).assinatura
     if not assinatura:
         log_event(
             request,
@@ -589,7 +496,7 @@ def simulado_iniciar(request: HttpRequest) -> HttpResponse:
     except (TypeError, ValueError):
         qtd = 10
 
-    # Modo: PROVA | ESTUDO
+    # Modo: PROVA | ESTUDO | ADAPTATIVO | DETRAN
     modo = (request.POST.get("modo") or "PROVA").strip().upper()
     if modo not in allowed_modes:
         modo = "PROVA"
@@ -598,6 +505,15 @@ def simulado_iniciar(request: HttpRequest) -> HttpResponse:
     dificuldade = (request.POST.get("dificuldade") or "").strip().upper()  # "" = misturado
     com_imagem = (request.POST.get("com_imagem") == "1")
     so_placas = (request.POST.get("so_placas") == "1")
+    # Offline: a prova inteira vai para o navegador como pacote e as respostas sincronizam depois
+    offline = (request.POST.get("offline") == "1")
+
+    # DETRAN: prova no formato oficial, sobre o curso inteiro; modulo e filtros nao se aplicam
+    if modo == "DETRAN":
+        modulo_id = ""
+        dificuldade = ""
+        com_imagem = False
+        so_placas = False
 
     # Aplica limites
     if qtd < qtd_min:
@@ -606,23 +522,18 @@ def simulado_iniciar(request: HttpRequest) -> HttpResponse:
         qtd = qtd_max
 
     # --------
-    # Base queryset
+    # Faceta no catalogo compartilhado (sem ida ao banco)
     # --------
-    qs = Questao.objects.filter(curso_id=curso_id)
-
-    if modulo_id:
-        qs = qs.filter(modulo_id=modulo_id)
-
-    if dificuldade in {"FACIL", "INTERMEDIARIO", "DIFICIL"}:
-        qs = qs.filter(dificuldade=dificuldade)
-
-    if com_imagem:
-        qs = qs.exclude(imagem_arquivo="")
-
-    if so_placas:
-        qs = qs.exclude(codigo_placa="")
-
-    total = qs.count()
+    catalogo = get_catalogo()
+    chave_faceta = faceta_key(curso_id, modulo_id, dificuldade, com_imagem, so_placas)
+
+    plano_detran = []
+    if modo == "DETRAN":
+        # Quantas questoes de cada estrato modulo x dificuldade (contagens do catalogo)
+        plano_detran = planejar_prova_detran(catalogo, curso_id, cfg.get("detran"))
+        total = qtd = sum(n for _, _, n in plano_detran)
+    else:
+        total = catalogo.contar(chave_faceta)
     if total == 0:
         return render(
             request,
@@ -630,7 +541,6 @@ def simulado_iniciar(request: HttpRequest) -> HttpResponse:
             _build_error_context(
                 request,
                 msg="NÃ£o existem questÃµes para esse filtro (curso/módulo/filtros).",
-                assinatura=assinatura,
             ),
             status=400,
         )
@@ -649,39 +559,55 @@ def simulado_iniciar(request: HttpRequest) -> HttpResponse:
         return _render_access_blocked(
             request,
             msg=error_msg or "Limite de uso atingido para este modulo no periodo atual.",
-            assinatura=assinatura,
             allow_upgrade=True,
             motivo_bloqueio="limite_atingido",
         )
 
-    # SeleÃ§Ã£o aleatÃ³ria eficiente
-    ids = list(qs.values_list("id", flat=True))
-    chosen = random.sample(ids, k=qtd)
-
-    state = {
-        "curso_id": str(curso_id),
-        "modulo_id": str(modulo_id) if modulo_id else "",
-        "qtd": qtd,
-        "index": 0,
-        "question_ids": [str(x) for x in chosen],
-        "answers": {},  # {question_id: {"alt_id": "...", "is_correct": True/False}}
-
-        # Modo do simulado
-        "mode": modo,  # "PROVA" | "ESTUDO"
-
-        # Guarda filtros usados (bom para exibir no resultado e depurar)
-        "filters": {
-            "dificuldade": dificuldade,  # "", FACIL, INTERMEDIARIO, DIFICIL
-            "com_imagem": com_imagem,    # bool
-            "so_placas": so_placas,      # bool
-        },
-
-        # Auditoria simples de tempo
-        "started_at": _now_iso(),
-        "finished_at": "",
+    # SeleÃ§Ã£o aleatÃ³ria eficiente (ADAPTATIVO pondera pelo historico do usuario).
+    # O sorteio uniforme e reproduzivel: a tentativa guarda so a semente.
+    semente = None
+    if modo == "ADAPTATIVO":
+        chosen = sortear_adaptativo(
+            catalogo,
+            request.user,
+            curso_id=curso_id,
+            modulo_id=modulo_id,
+            dificuldade=dificuldade,
+            com_imagem=com_imagem,
+            so_placas=so_placas,
+            k=qtd,
+        )
+    elif modo == "DETRAN":
+        semente = nova_semente()
+        chosen = sortear_estratificado(catalogo, curso_id, plano_detran, semente)
+    else:
+        semente = nova_semente()
+        chosen = sortear_reproduzivel(catalogo, chave_faceta, qtd, semente)
+
+    # Guarda filtros usados (bom para exibir no resultado e depurar)
+    filtros = {
+        "dificuldade": dificuldade,  # "", FACIL, INTERMEDIARIO, DIFICIL
+        "com_imagem": com_imagem,    # bool
+        "so_placas": so_placas,      # bool
     }
+    if plano_detran:
+        filtros["estratos"] = plano_detran  # [[modulo_id, dificuldade, qtd], ...]
 
-    _set_state(request, state)
+    _clear_state(request)
+    tentativa = criar_tentativa(
+        usuario=request.user,
+        curso_id=curso_id,
+        modulo_id=modulo_id,
+        modo=modo,  # "PROVA" | "ESTUDO" | "ADAPTATIVO" | "DETRAN"
+        filtros=filtros,
+        question_ids=chosen,
+        catalogo_versao=catalogo.versao,
+        faceta=chave_faceta,
+        semente=semente,
+    )
+    _set_tentativa(request, tentativa)
+    # Questoes + alternativas da tentativa em duas queries; o resto do fluxo le do bundle.
+    carregar_bundle(str(tentativa.id), tentativa.question_ids)
     log_event(
         request,
         "simulado_iniciado",
@@ -691,15 +617,19 @@ def simulado_iniciar(request: HttpRequest) -> HttpResponse:
             "modulo_id": str(modulo_id) if modulo_id else "",
             "qtd": qtd,
             "modo": modo,
+            "offline": offline,
         },
     )
+    if offline:
+        # O uso ja foi contabilizado acima: o pacote e so outra forma de conduzir a tentativa.
+        return redirect(reverse("simulado:offline", args=[tentativa.id]))
     return redirect(reverse("simulado:questao"))
 
 
 @login_required_audit
 @require_http_methods(["GET"])
 def simulado_questao(request: HttpRequest) -> HttpResponse:
-    assinatura = _get_active_assinatura(request.user)
+    assinatura = get_access_context(request).assinatura
     if not assinatura:
         log_event(
             request,
@@ -716,35 +646,31 @@ def simulado_questao(request: HttpRequest) -> HttpResponse:
     cfg = get_simulado_config()
     imagens_cfg = cfg.get("imagens", {}) if isinstance(cfg, dict) else {}
 
-    state = _get_state(request)
-    if not state or not state.get("question_ids"):
+    tentativa = _get_tentativa(request)
+    if not tentativa or not tentativa.question_ids:
         return redirect(reverse("simulado:inicio"))
 
-    idx = int(state.get("index", 0))
-    qids = state["question_ids"]
+    idx = len(tentativa.respostas)
+    qids = tentativa.question_ids
 
-    if idx >= len(qids):
+    if idx >= len(qids) or tentativa.finalizado_em:
         return redirect(reverse("simulado:resultado"))
 
     qid = qids[idx]
 
-    answers = state.get("answers", {})
-    acertos = sum(1 for v in answers.values() if v.get("is_correct"))
-    erros = sum(1 for v in answers.values() if v.get("is_correct") is False)
+    acertos = tentativa.acertos
+    erros = idx - acertos
 
-    questao = (
-        Questao.objects
-        .select_related("modulo", "curso")
-        .get(id=qid)
-    )
+    bundle = get_bundle(str(tentativa.id), qids)
+    questao = bundle.questao(qid)
+    if questao is None:
+        _clear_state(request)
+        return redirect(reverse("simulado:inicio"))
 
-    alternativas = list(
-        Alternativa.objects.filter(questao=questao).order_by("ordem")
-    )
+    alternativas = list(questao.alternativas)
     # Embaralha as alternativas na tela (opcional)
     random.shuffle(alternativas)
-
-    answered = state.get("answers", {}).get(qid)
+    fragmentos = get_fragmentos_questao(questao)
 
     return render(
         request,
@@ -754,10 +680,12 @@ def simulado_questao(request: HttpRequest) -> HttpResponse:
             "total": len(qids),
             "acertos": acertos,
             "erros": erros,
-            "mode": state.get("mode") or "PROVA",
+            "mode": tentativa.modo or "PROVA",
+            "mostrar_placar": tentativa.modo in MODOS_COM_FEEDBACK,
             "questao": questao,
-            "alternativas": alternativas,
-            "answered": answered,
+            "fragmentos": fragmentos,
+            "alternativas": [(a, fragmentos.alternativas[str(a.id)]) for a in alternativas],
+            "answered": None,
             "imagens_cfg_json": json.dumps(imagens_cfg, ensure_ascii=False),
         },
     )
@@ -766,7 +694,7 @@ def simulado_questao(request: HttpRequest) -> HttpResponse:
 @login_required_audit
 @require_http_methods(["POST"])
 def simulado_responder(request: HttpRequest) -> HttpResponse:
-    assinatura = _get_active_assinatura(request.user)
+    assinatura = get_access_context(request).assinatura
     if not assinatura:
         log_event(
             request,
@@ -780,13 +708,15 @@ def simulado_responder(request: HttpRequest) -> HttpResponse:
             motivo_bloqueio="assinatura_inativa",
         )
 
-    state = _get_state(request)
-    if not state or not state.get("question_ids"):
+    tentativa = _get_tentativa(request)
+    if not tentativa or not tentativa.question_ids:
         return redirect(reverse("simulado:inicio"))
 
-    idx = int(state.get("index", 0))
-    qids = state["question_ids"]
-    if idx >= len(qids):
+    idx = len(tentativa.respostas)
+    qids = tentativa.question_ids
+    # Tentativa ja finalizada (ex.: o resultado foi aberto antes da ultima questao)
+    # nao aceita mais respostas.
+    if idx >= len(qids) or tentativa.finalizado_em:
         return redirect(reverse("simulado:resultado"))
 
     qid = qids[idx]
@@ -794,9 +724,11 @@ def simulado_responder(request: HttpRequest) -> HttpResponse:
     if not alt_id:
         return redirect(reverse("simulado:questao"))
 
-    # Valida alternativa e calcula correto
-    alt = Alternativa.objects.select_related("questao").get(id=alt_id)
-    if str(alt.questao_id) != str(qid):
+    # Valida alternativa e calcula correto (em memoria, a partir do bundle da tentativa)
+    bundle = get_bundle(str(tentativa.id), qids)
+    questao = bundle.questao(qid)
+    alt = questao.alternativa(alt_id) if questao else None
+    if alt is None:
         return render(
             request,
             "simulado/erro.html",
@@ -806,34 +738,30 @@ def simulado_responder(request: HttpRequest) -> HttpResponse:
 
     is_correct = bool(alt.is_correta)
 
-    answers = state.get("answers", {})
-    answers[qid] = {"alt_id": str(alt_id), "is_correct": is_correct}
-    state["answers"] = answers
+    # PrÃ³xima questÃ£o (avan?a o Ã­ndice; feedback do modo ESTUDO ? renderizado antes de seguir).
+    # Um UPDATE acrescenta a resposta na tentativa; se outra requisicao ja respondeu esta
+    # questao (duplo clique), apenas segue o fluxo.
+    if not registrar_resposta(tentativa, alt):
+        tentativa.refresh_from_db(fields=["finalizado_em"])
+        if tentativa.finalizado_em:
+            return redirect(reverse("simulado:resultado"))
+        return redirect(reverse("simulado:questao"))
 
-    # PrÃ³xima questÃ£o (avan?a o Ã­ndice; feedback do modo ESTUDO ? renderizado antes de seguir)
-    state["index"] = idx + 1
-    if state["index"] >= len(qids) and not state.get("finished_at"):
-        state["finished_at"] = _now_iso()
-    _set_state(request, state)
+    proximo_idx = len(tentativa.respostas)
 
-    if state.get("mode") == "ESTUDO":
+    if tentativa.modo in MODOS_COM_FEEDBACK:
         cfg = get_simulado_config()
         imagens_cfg = cfg.get("imagens", {}) if isinstance(cfg, dict) else {}
 
-        questao = alt.questao
-        alternativas = list(
-            Alternativa.objects.filter(questao=questao).order_by("ordem")
-        )
-        correta = next((a for a in alternativas if a.is_correta), None)
-        answers_map = state.get("answers", {}) or {}
+        fragmentos = get_fragmentos_questao(questao)
+        correta = questao.correta
         total_respostas = len(qids) or 1  # usa total planejado para evitar % inflado no inÃ­cio
-        total_answered = len(answers_map) or 1  # usado sÃ³ para contar erros/acertos
-        acertos_so_far = sum(1 for data in answers_map.values() if data.get("is_correct"))
-        erros_so_far = sum(1 for data in answers_map.values() if data.get("is_correct") is False)
+        acertos_so_far = tentativa.acertos
+        erros_so_far = proximo_idx - acertos_so_far
         percent_acerto = round((acertos_so_far / total_respostas) * 100, 2)
         next_url = (
             reverse("simulado:resultado")
-            if state["index"] >= len(qids)
+            if proximo_idx >= len(qids)
             else reverse("simulado:questao")
         )
         return render(
@@ -844,10 +772,12 @@ def simulado_responder(request: HttpRequest) -> HttpResponse:
                 "total": len(qids),
                 "acertos": acertos_so_far,
                 "erros": erros_so_far,
-                "mode": state.get("mode") or "PROVA",
+                "mode": tentativa.modo or "PROVA",
+                "mostrar_placar": True,
                 "questao": questao,
-                "alternativas": alternativas,
-                "answered": answers.get(qid),
+                "fragmentos": fragmentos,
+                "alternativas": [(a, fragmentos.alternativas[str(a.id)]) for a in questao.alternativas],
+                "answered": {"alt_id": str(alt.id), "is_correct": is_correct},
                 "imagens_cfg_json": json.dumps(imagens_cfg, ensure_ascii=False),
                 "feedback": {
                     "is_correct": is_correct,
@@ -855,13 +785,13 @@ def simulado_responder(request: HttpRequest) -> HttpResponse:
                     "correta": correta,
                     "selecionada": alt,
                     "next_url": next_url,
-                    "is_last": state["index"] >= len(qids),
+                    "is_last": proximo_idx >= len(qids),
                     "percent_acerto": percent_acerto,
                 },
             },
         )
 
-    if state["index"] >= len(qids):
+    if proximo_idx >= len(qids):
         return redirect(reverse("simulado:resultado"))
 
     return redirect(reverse("simulado:questao"))
@@ -870,7 +800,7 @@ def simulado_responder(request: HttpRequest) -> HttpResponse:
 @login_required_audit
 @require_http_methods(["GET", "POST"])
 def simulado_resultado(request: HttpRequest) -> HttpResponse:
-    assinatura = _get_active_assinatura(request.user)
+    assinatura = get_access_context(request).assinatura
     if not assinatura:
         log_event(
             request,
@@ -884,42 +814,28 @@ def simulado_resultado(request: HttpRequest) -> HttpResponse:
             motivo_bloqueio="assinatura_inativa",
         )
 
-    state = _get_state(request)
-    if not state or not state.get("question_ids"):
+    tentativa = _get_tentativa(request)
+    if not tentativa or not tentativa.question_ids:
         return redirect(reverse("simulado:inicio"))
 
-    qids = state["question_ids"]
-    answers = state.get("answers", {})
-    mode = state.get("mode") or "PROVA"
-    filters = state.get("filters", {}) or {}
-
-    acertos = sum(1 for qid in qids if answers.get(qid, {}).get("is_correct") is True)
-    total = len(qids)
+    qids = tentativa.question_ids
+    mode = tentativa.modo or "PROVA"
+    filters = tentativa.filtros or {}
 
     # Se quiser listar revisÃµes, buscamos as questÃµes respondidas
-    questoes = list(
-        Questao.objects.filter(id__in=qids).select_related("modulo", "curso").order_by("numero_no_modulo")
-    )
-    questoes_map = {str(q.id): q for q in questoes}
+    bundle = get_bundle(str(tentativa.id), qids)
+    answers = decodificar_respostas(tentativa, bundle)
 
-    alternativas = list(
-        Alternativa.objects.filter(questao_id__in=qids).order_by("ordem")
-    )
-    alts_map: dict[str, list[Alternativa]] = {}
-    for alt in alternativas:
-        key = str(alt.questao_id)
-        alts_map.setdefault(key, []).append(alt)
+    acertos = sum(1 for qid in qids if answers.get(qid, {}).get("is_correct") is True)
+    total = len(qids)
 
     respondidas = sum(1 for qid in qids if answers.get(str(qid)))
     erros = max(respondidas - acertos, 0)
     nao_respondidas = max(total - respondidas, 0)
 
-    started_at = _parse_ts(state.get("started_at"))
-    finished_at = _parse_ts(state.get("finished_at"))
-    if not finished_at:
-        finished_at = timezone.now()
-        state["finished_at"] = finished_at.isoformat()
-        _set_state(request, state)
+    started_at = tentativa.iniciado_em
+    finalizar_tentativa(tentativa)
+    finished_at = tentativa.finalizado_em
 
     tempo_total_segundos = None
     tempo_total_human = None
@@ -931,13 +847,12 @@ def simulado_resultado(request: HttpRequest) -> HttpResponse:
 
     revisao = []
     for qid in qids:
-        q = questoes_map.get(str(qid))
+        q = bundle.questao(qid)
         if not q:
             continue
         info = answers.get(str(qid), {})
-        alts = alts_map.get(str(qid), [])
-        selecionada = next((a for a in alts if str(a.id) == str(info.get("alt_id"))), None)
-        correta = next((a for a in alts if a.is_correta), None)
+        selecionada = q.alternativa(info.get("alt_id"))
+        correta = q.correta
         revisao.append(
             {
                 "questao": q,
@@ -966,8 +881,8 @@ def simulado_resultado(request: HttpRequest) -> HttpResponse:
             "nao_respondidas": nao_respondidas,
             "modo": mode,
             "filters": filters,
-            "curso": questoes[0].curso if questoes else None,
-            "modulo": next((q.modulo for q in questoes if str(q.modulo_id) == str(state.get("modulo_id"))), None) if state.get("modulo_id") else None,
+            "curso": bundle.curso,
+            "modulo": next((q.modulo for q in bundle.em_ordem() if str(q.modulo_id) == str(tentativa.modulo_id)), None) if tentativa.modulo_id else None,
             "tempo_total_segundos": tempo_total_segundos,
             "tempo_total_human": tempo_total_human,
         },
@@ -1020,60 +935,265 @@ def api_stats(request: HttpRequest) -> JsonResponse:
     com_imagem = (request.GET.get("com_imagem") or "0").strip() == "1"
     so_placas = (request.GET.get("so_placas") or "0").strip() == "1"
 
-    qs = Questao.objects.filter(curso_id=curso_id)
+    # Total do filtro atual e contagens "de painel" (do mesmo recorte curso/modulo)
+    # saem do catalogo compartilhado: apenas lookups em memoria.
+    catalogo = get_catalogo()
+    total = catalogo.contar(faceta_key(curso_id, modulo_id, dificuldade, com_imagem, so_placas))
+    painel = catalogo.painel(curso_id, modulo_id)
+
+    return JsonResponse(
+        {
+            "ok": True,
+            "filters": {
+                "curso_id": curso_id,
+                "modulo_id": modulo_id,
+                "dificuldade": dificuldade,
+                "com_imagem": com_imagem,
+                "so_placas": so_placas,
+            },
+            "total_disponivel": total,
+            "painel": painel,
+        }
+    )
+
+
+def _api_assinatura_inativa(request: HttpRequest) -> JsonResponse | None:
+    if get_access_context(request).assinatura:
+        return None
+    log_event(
+        request,
+        "assinatura_inativa",
+        user=request.user,
+        contexto={"path": request.path},
+    )
+    return JsonResponse({"ok": False, "error": "Assinatura inativa ou expirada."}, status=403)
+
+
+def _serializar_questao(questao, com_gabarito: bool = False) -> dict:
+    # Nunca expor is_correta na prova: a correcao acontece no servidor. O gabarito so
+    # vai junto no pacote offline dos modos com feedback (que ja o mostram a cada resposta).
+    dados = {
+        "id": str(questao.id),
+        "numero_no_modulo": questao.numero_no_modulo,
+        "modulo": {"id": str(questao.modulo.id), "nome": questao.modulo.nome},
+        "enunciado": questao.enunciado,
+        "imagem_arquivo": questao.imagem_arquivo,
+        "imagem_url": static(f"placas/{questao.imagem_arquivo}") if questao.imagem_arquivo else "",
+        "alternativas": [{"id": str(alt.id), "texto": alt.texto} for alt in questao.alternativas],
+    }
+    if com_gabarito:
+        dados["correta_id"] = str(questao.correta.id) if questao.correta else ""
+        dados["comentario"] = questao.comentario
+    return dados
+
+
+def _serializar_tentativa(tentativa: SimuladoTentativa, *, com_gabarito: bool = False) -> dict:
+    bundle = get_bundle(str(tentativa.id), tentativa.question_ids)
+    answers = decodificar_respostas(tentativa, bundle)
+    return {
+        "id": str(tentativa.id),
+        "modo": tentativa.modo,
+        "filtros": tentativa.filtros or {},
+        "total": len(tentativa.question_ids),
+        "respondidas": len(tentativa.respostas),
+        "finalizada": tentativa.finalizado_em is not None,
+        "questoes": [_serializar_questao(q, com_gabarito) for q in bundle.em_ordem()],
+        "respostas": {qid: info["alt_id"] for qid, info in answers.items()},
+        "responder_url": reverse("simulado:api_tentativa_responder", args=[tentativa.id]),
+        "resultado_url": reverse("simulado:resultado"),
+    }
+
+
+def _tentativa_finalizada(tentativa: SimuladoTentativa) -> JsonResponse:
+    return JsonResponse(
+        {
+            "ok": False,
+            "error": "Tentativa ja finalizada.",
+            "finalizada": True,
+            "respondidas": len(tentativa.respostas),
+            "resultado_url": reverse("simulado:resultado"),
+        },
+        status=409,
+    )
+
+
+@login_required_audit
+@require_GET
+def api_tentativa(request: HttpRequest, tentativa_id) -> JsonResponse:
+    """
+    Retorna a prova inteira de uma tentativa (questoes, alternativas e imagens) em
+    um unico payload, mais as respostas ja registradas, para o cliente conduzir o
+    simulado sem uma ida ao servidor por questao.
+    """
+    bloqueio = _api_assinatura_inativa(request)
+    if bloqueio:
+        return bloqueio
+
+    tentativa = get_tentativa(request.user, tentativa_id)
+    if not tentativa:
+        return JsonResponse({"ok": False, "error": "Tentativa nao encontrada."}, status=404)
 
-    if modulo_id:
-        qs = qs.filter(modulo_id=modulo_id)
+    return JsonResponse({"ok": True, "tentativa": _serializar_tentativa(tentativa)})
 
-    if dificuldade in {"FACIL", "INTERMEDIARIO", "DIFICIL"}:
-        qs = qs.filter(dificuldade=dificuldade)
 
-    if com_imagem:
-        qs = qs.exclude(imagem_arquivo="")
+@login_required_audit
+@require_GET
+@gzip_page
+def api_tentativa_pacote(request: HttpRequest, tentativa_id) -> JsonResponse:
+    """
+    Pacote offline da tentativa: a prova inteira (como em api_tentativa), o gabarito
+    nos modos com feedback e a lista de imagens de placas que o service worker deve
+    guardar. Vai comprimido (gzip) para quem aceita; o uso do plano ja foi
+    contabilizado em simulado_iniciar, quando a tentativa foi criada.
+    """
+    bloqueio = _api_assinatura_inativa(request)
+    if bloqueio:
+        return bloqueio
+
+    tentativa = get_tentativa(request.user, tentativa_id)
+    if not tentativa:
+        return JsonResponse({"ok": False, "error": "Tentativa nao encontrada."}, status=404)
+    if tentativa.finalizado_em:
+        return _tentativa_finalizada(tentativa)
+
+    dados = _serializar_tentativa(tentativa, com_gabarito=tentativa.modo in MODOS_COM_FEEDBACK)
+    imagens = sorted({q["imagem_url"] for q in dados["questoes"] if q["imagem_url"]})
+    return JsonResponse(
+        {
+            "ok": True,
+            "versao": PACOTE_OFFLINE_VERSAO,
+            "gerado_em": timezone.now().isoformat(),
+            "tentativa": dados,
+            "imagens": imagens,
+        }
+    )
 
-    if so_placas:
-        qs = qs.exclude(codigo_placa="")
 
-    # Total do filtro atual
-    total = qs.count()
+@login_required_audit
+@require_http_methods(["GET"])
+def simulado_offline(request: HttpRequest, tentativa_id) -> HttpResponse:
+    """Tela que baixa o pacote, conduz a prova no navegador e sincroniza as respostas."""
+    tentativa = get_tentativa(request.user, tentativa_id)
+    if not tentativa:
+        return redirect(reverse("simulado:inicio"))
+    if tentativa.finalizado_em:
+        return redirect(reverse("simulado:resultado"))
 
-    # Contagens â€œde painelâ€ (do mesmo recorte curso/modulo, mas separadas por critÃ©rio)
-    base = Questao.objects.filter(curso_id=curso_id)
-    if modulo_id:
-        base = base.filter(modulo_id=modulo_id)
+    return render(
+        request,
+        "simulado/offline.html",
+        {
+            "tentativa": tentativa,
+            "pacote_url": reverse("simulado:api_tentativa_pacote", args=[tentativa.id]),
+            "sw_url": reverse("simulado:service_worker"),
+        },
+    )
 
-    # Com imagem e placas (para o painel)
-    with_image = base.exclude(imagem_arquivo="").count()
-    only_placas = base.exclude(codigo_placa="").count()
 
-    # Por dificuldade (no recorte base)
-    diffs = (
-        base.values("dificuldade")
-        .annotate(n=Count("id"))
+@require_GET
+def simulado_service_worker(request: HttpRequest) -> HttpResponse:
+    # Servido sob /simulado/ para que o escopo do service worker cubra as telas do simulado.
+    response = render(
+        request,
+        "simulado/offline/sw.js",
+        {
+            "cache_nome": f"simulado-offline-v{PACOTE_OFFLINE_VERSAO}",
+            "placas_prefixo": static("placas/"),
+            "estaticos_prefixo": static("simulado/"),
+            "offline_prefixo": reverse("simulado:inicio") + "offline/",
+        },
+        content_type="application/javascript",
     )
-    diff_map = {"FACIL": 0, "INTERMEDIARIO": 0, "DIFICIL": 0, "": 0, None: 0}
-    for row in diffs:
-        diff_map[row["dificuldade"]] = row["n"]
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+@login_required_audit
+@require_http_methods(["POST"])
+def api_tentativa_responder(request: HttpRequest, tentativa_id) -> HttpResponse:
+    """
+    Registra uma resposta ou um lote, em ordem. Corpo JSON:
+      - {"questao_id": "...", "alternativa_id": "..."}
+      - {"respostas": [{"questao_id": "...", "alternativa_id": "..."}, ...]}
+    Respostas de questoes ja registradas sao ignoradas (reenvio idempotente).
+    No modo PROVA responde 204; nos modos com feedback devolve o das novas respostas.
+    Respostas novas para uma tentativa ja finalizada respondem 409.
+    """
+    bloqueio = _api_assinatura_inativa(request)
+    if bloqueio:
+        return bloqueio
+
+    tentativa = get_tentativa(request.user, tentativa_id)
+    if not tentativa:
+        return JsonResponse({"ok": False, "error": "Tentativa nao encontrada."}, status=404)
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except (TypeError, ValueError):
+        return JsonResponse({"ok": False, "error": "JSON invalido."}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"ok": False, "error": "JSON invalido."}, status=400)
+
+    itens = payload.get("respostas")
+    if itens is None:
+        itens = [payload]
+    if not isinstance(itens, list) or not itens:
+        return JsonResponse({"ok": False, "error": "Nenhuma resposta enviada."}, status=400)
+
+    qids = tentativa.question_ids
+    posicoes = {qid: pos for pos, qid in enumerate(qids)}
+    bundle = get_bundle(str(tentativa.id), qids)
+    proxima = len(tentativa.respostas)
+    novas = []
+    for item in itens:
+        if not isinstance(item, dict):
+            return JsonResponse({"ok": False, "error": "Resposta invalida."}, status=400)
+        qid = str(item.get("questao_id") or "")
+        pos = posicoes.get(qid)
+        if pos is None:
+            return JsonResponse({"ok": False, "error": "Questao fora da tentativa."}, status=400)
+        if pos < proxima:
+            continue
+        if pos != proxima:
+            return JsonResponse(
+                {"ok": False, "error": "Respostas fora de ordem.", "respondidas": len(tentativa.respostas)},
+                status=409,
+            )
+        questao = bundle.questao(qid)
+        alt = questao.alternativa(item.get("alternativa_id")) if questao else None
+        if alt is None:
+            return JsonResponse({"ok": False, "error": "Alternativa invalida."}, status=400)
+        novas.append((questao, alt))
+        proxima += 1
+
+    if novas and tentativa.finalizado_em:
+        return _tentativa_finalizada(tentativa)
+    if novas and not registrar_respostas(tentativa, [alt for _, alt in novas]):
+        tentativa.refresh_from_db(fields=["respostas", "acertos", "finalizado_em"])
+        if tentativa.finalizado_em:
+            return _tentativa_finalizada(tentativa)
+        return JsonResponse(
+            {"ok": False, "error": "Tentativa alterada por outra requisicao.", "respondidas": len(tentativa.respostas)},
+            status=409,
+        )
+
+    if tentativa.modo not in MODOS_COM_FEEDBACK:
+        return HttpResponse(status=204)
 
     return JsonResponse(
         {
             "ok": True,
-            "filters": {
-                "curso_id": curso_id,
-                "modulo_id": modulo_id,
-                "dificuldade": dificuldade,
-                "com_imagem": com_imagem,
-                "so_placas": so_placas,
-            },
-            "total_disponivel": total,
-            "painel": {
-                "com_imagem": with_image,
-                "placas": only_placas,
-                "por_dificuldade": {
-                    "FACIL": diff_map.get("FACIL", 0),
-                    "INTERMEDIARIO": diff_map.get("INTERMEDIARIO", 0),
-                    "DIFICIL": diff_map.get("DIFICIL", 0),
-                },
-            },
+            "respondidas": len(tentativa.respostas),
+            "acertos": tentativa.acertos,
+            "finalizada": tentativa.finalizado_em is not None,
+            "feedback": [
+                {
+                    "questao_id": str(questao.id),
+                    "is_correct": bool(alt.is_correta),
+                    "correta_id": str(questao.correta.id) if questao.correta else "",
+                    "comentario": questao.comentario,
+                }
+                for questao, alt in novas
+            ],
         }
     )
@@ -71,6 +71,7 @@ INSTALLED_APPS = [
 # -----------------------------------------------------------------------------
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "banco_questoes.middleware.AuditoriaBufferMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "banco_questoes.middleware.MetaPageViewCapiMiddleware",
@@ -158,6 +159,19 @@ REGISTER_COOLDOWN_ENABLED = env_bool("REGISTER_COOLDOWN_ENABLED", "1")
 # Flags de rollout do controle de acesso por app (Fase 2)
 APP_ACCESS_V2_ENABLED = env_bool("APP_ACCESS_V2_ENABLED", "0")
 APP_ACCESS_DUAL_WRITE = env_bool("APP_ACCESS_DUAL_WRITE", "0")
+# Contadores de uso por app: grava direto no banco (padrao) ou no cache com
+# descarga em lote (banco_questoes.contador_uso.ContadorUsoCache).
+USO_APP_CONTADOR_BACKEND = os.getenv(
+    "USO_APP_CONTADOR_BACKEND",
+    "banco_questoes.contador_uso.ContadorUsoBanco",
+)
+USO_APP_CACHE_ALIAS = os.getenv("USO_APP_CACHE_ALIAS", "default")
+USO_APP_DESCARGA_SEGUNDOS = int(os.getenv("USO_APP_DESCARGA_SEGUNDOS", "5"))
+# Politica de gravacao por tipo de evento de auditoria: "always", "never",
+# "sample:N" (1 em N) ou "first_per_window:SEGUNDOS" (primeiro por usuario/app).
+AUDIT_EVENT_POLICIES = {
+    "app_access_granted": os.getenv("AUDIT_POLICY_APP_ACCESS_GRANTED", "first_per_window:300"),
+}
 
 
 # -----------------------------------------------------------------------------
@@ -197,6 +211,23 @@ APOSTILA_CNH_PDF_ROOT = Path(
 )
 
 
+# -----------------------------------------------------------------------------
+# Cache compartilhado entre workers (snapshots em disco)
+# -----------------------------------------------------------------------------
+# Arquivos pequenos gerados pela aplicação (ex.: catálogo de questões do simulado)
+# e lidos via mmap por todos os workers do gunicorn da mesma máquina.
+SHARED_CACHE_ROOT = Path(
+    os.getenv(
+        "SHARED_CACHE_ROOT",
+        str(BASE_DIR.parent / "shared" / "cache"),
+    )
+)
+
+# Nos testes o runner aponta o SHARED_CACHE_ROOT para um diretorio temporario e
+# descarta a matriz de acesso do processo antes de cada teste.
+TEST_RUNNER = "config.test_runner.TestRunner"
+
+
 # -----------------------------------------------------------------------------
 # Segurança / Proxy / Cloudflare
 # -----------------------------------------------------------------------------
@@ -0,0 +1,62 @@
+"""Runner dos testes do projeto (TEST_RUNNER)."""
+
+from __future__ import annotations
+
+import os
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner, ParallelTestSuite, RemoteTestResult, RemoteTestRunner
+
+from banco_questoes.matriz_acesso import descartar_matriz_local
+
+
+class _DescartaMatrizPorTeste:
+    # A matriz de acesso fica em memoria no processo e os on_commit de um TestCase
+    # nunca rodam (rollback no fim): sem isto, a matriz montada num teste valeria
+    # nos seguintes.
+    def startTest(self, test):
+        descartar_matriz_local()
+        super().startTest(test)
+
+
+class _ResultadoRemoto(_DescartaMatrizPorTeste, RemoteTestResult):
+    pass
+
+
+class _RunnerRemoto(RemoteTestRunner):
+    resultclass = _ResultadoRemoto
+
+
+class _SuiteParalela(ParallelTestSuite):
+    runner_class = _RunnerRemoto
+
+
+class TestRunner(DiscoverRunner):
+    parallel_test_suite = _SuiteParalela
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Snapshots e marcadores (catalogo, matriz de acesso) num diretorio temporario,
+        # nunca no cache compartilhado de verdade. A variavel de ambiente vale tambem
+        # para os workers do --parallel iniciados com spawn.
+        self._cache_dir = TemporaryDirectory(prefix="shared-cache-testes-")
+        self._cache_root_original = (settings.SHARED_CACHE_ROOT, os.environ.get("SHARED_CACHE_ROOT"))
+        settings.SHARED_CACHE_ROOT = Path(self._cache_dir.name)
+        os.environ["SHARED_CACHE_ROOT"] = self._cache_dir.name
+
+    def teardown_test_environment(self, **kwargs):
+        cache_root, env_original = self._cache_root_original
+        settings.SHARED_CACHE_ROOT = cache_root
+        if env_original is None:
+            os.environ.pop("SHARED_CACHE_ROOT", None)
+        else:
+            os.environ["SHARED_CACHE_ROOT"] = env_original
+        self._cache_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or unittest.TextTestResult
+        return type(f"{base.__name__}DescartaMatriz", (_DescartaMatrizPorTeste, base), {})
@@ -1,10 +1,15 @@
+from tempfile import TemporaryDirectory
+
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db import connection
 from django.test import TestCase
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+from banco_questoes.access_control import build_menu_snapshot
 from banco_questoes.models import AppModulo, Assinatura, Plano, PlanoPermissaoApp
 
 
@@ -327,3 +332,62 @@ class MenuSmokeTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Em construcao")
         self.assertContains(response, 'href="/oraculo/"')
+
+    @override_settings(APP_ACCESS_V2_ENABLED=True)
+    def test_menu_snapshot_query_budget(self):
+        cache_dir = TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        with self.settings(SHARED_CACHE_ROOT=cache_dir.name):
+            self._assert_menu_snapshot_query_budget()
+
+    def _assert_menu_snapshot_query_budget(self):
+        user = get_user_model().objects.create_user(
+            username="menu-user-budget",
+            email="menu-budget@example.com",
+            password="safe-password-123",
+        )
+        plano = Plano.objects.create(nome="Plano Teste Menu Budget", limite_periodo="DIARIO")
+        Assinatura.objects.create(
+            usuario=user,
+            plano=plano,
+            nome_plano_snapshot=plano.nome,
+            status=Assinatura.Status.ATIVO,
+            inicio=timezone.now(),
+            valid_until=None,
+        )
+        for ordem, slug in enumerate(["simulado-digital", "oraculo", "apostila-cnh"], start=1):
+            app = AppModulo.objects.create(
+                slug=slug,
+                nome=slug.title(),
+                ordem_menu=ordem,
+                em_construcao=False,
+                ativo=True,
+            )
+            PlanoPermissaoApp.objects.create(
+                plano=plano,
+                app_modulo=app,
+                permitido=True,
+                limite_qtd=5,
+                limite_periodo="DIARIO",
+            )
+
+        # Matriz fria: assinatura + apps/regras + contadores de uso.
+        with self.assertNumQueries(3):
+            snapshot = build_menu_snapshot(user)
+
+        self.assertEqual(
+            [item["slug"] for item in snapshot["acesso"]["apps"]],
+            ["simulado-digital", "oraculo", "apostila-cnh"],
+        )
+        self.assertEqual([item["restantes"] for item in snapshot["plano_modal"]["apps"]], [5, 5, 5])
+
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("menu:home"))
+
+        self.assertEqual(response.status_code, 200)
+        tabelas_acesso = [
+            q["sql"] for q in ctx.captured_queries
+            if any(f'"banco_questoes_{tabela}"' in q["sql"] for tabela in ("assinatura", "appmodulo", "usoappjanela"))
+        ]
+        self.assertEqual(len(tabelas_acesso), 2)
@@ -5,7 +5,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.urls import NoReverseMatch, reverse
 
-from banco_questoes.access_control import build_app_access_status, build_plan_modal_status
+from banco_questoes.access_control import build_menu_snapshot, get_access_context
 from .catalog import get_menu_catalog
 
 
@@ -36,8 +36,7 @@ def _build_cards_from_catalog() -> list[dict]:
     return cards
 
 
-def _build_cards_from_access(user) -> list[dict]:
-    access_status = build_app_access_status(user)
+def _build_cards_from_access(access_status: dict) -> list[dict]:
     if not access_status.get("apps"):
         return _build_cards_from_catalog()
 
@@ -87,9 +86,9 @@ def _build_cards_from_access(user) -> list[dict]:
 
 @login_required
 def home(request):
+    snapshot = build_menu_snapshot(request.user, access=get_access_context(request))
     if settings.APP_ACCESS_V2_ENABLED:
-        cards = _build_cards_from_access(request.user)
+        cards = _build_cards_from_access(snapshot["acesso"])
     else:
         cards = _build_cards_from_catalog()
-    plano_modal_status = build_plan_modal_status(request.user)
-    return render(request, "menu/home.html", {"cards": cards, "plano_modal_status": plano_modal_status})
+    return render(request, "menu/home.html", {"cards": cards, "plano_modal_status": snapshot["plano_modal"]})
@@ -8,7 +8,6 @@ from decimal import Decimal, InvalidOperation
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Q
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse
@@ -16,7 +15,7 @@ from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
-from banco_questoes.access_control import is_upgrade_pix_eligible
+from banco_questoes.access_control import get_assinatura_ativa, is_upgrade_pix_eligible
 from banco_questoes.auditoria import log_event
 from banco_questoes.meta_capi import send_meta_event
 from banco_questoes.models import Assinatura, EventoAuditoria, Plano
@@ -30,17 +29,6 @@ MANUAL_CHECK_DELAY_SECONDS = 60
 CHECK_COOLDOWN_SECONDS = 30
 
 
-def _get_active_assinatura(user) -> Assinatura | None:
-    now = timezone.now()
-    return (
-        Assinatura.objects
-        .filter(usuario=user, status=Assinatura.Status.ATIVO)
-        .filter(Q(valid_until__isnull=True) | Q(valid_until__gte=now))
-        .order_by("-inicio", "-criado_em")
-        .first()
-    )
-
-
 def _get_plano_upgrade() -> Plano | None:
     return Plano.objects.filter(nome__iexact=UPGRADE_PLAN_NAME, ativo=True).first()
 
@@ -106,7 +94,7 @@ def _registrar_troca_plano(
 
 def _ativar_plano_upgrade(*, user, plano_upgrade: Plano, billing: Billing) -> None:
     now = timezone.now()
-    assinatura_origem = _get_active_assinatura(user)
+    assinatura_origem = get_assinatura_ativa(user)
     plano_origem = "Desconhecido"
     if assinatura_origem:
         plano_origem = assinatura_origem.nome_plano_snapshot or (
@@ -117,6 +105,7 @@ def _ativar_plano_upgrade(*, user, plano_upgrade: Plano, billing: Billing) -> No
         valid_until = now + timedelta(days=plano_upgrade.validade_dias)
 
     with transaction.atomic():
+        # O create abaixo dispara o signal que recalcula o ponteiro AssinaturaAtual.
         Assinatura.objects.filter(usuario=user, status=Assinatura.Status.ATIVO).update(
             status=Assinatura.Status.EXPIRADO,
         )
@@ -154,7 +143,7 @@ def _finalizar_billing_pago(billing: Billing, payload: dict) -> bool:
 @login_required
 @require_http_methods(["GET", "POST"])
 def upgrade_free(request: HttpRequest) -> HttpResponse:
-    assinatura = _get_active_assinatura(request.user)
+    assinatura = get_assinatura_ativa(request.user)
     if not assinatura or not is_upgrade_pix_eligible(assinatura):
         return render(
             request,
@@ -75,6 +75,7 @@
   const soPlacas = $("#so_placas");
 
   const btnIniciar = $("#btn-iniciar");
+  const btnOffline = $("#btn-offline");
   const btnLimpar = $("#btn-limpar");
 
   const lockMsg = getMsg(
@@ -98,6 +99,12 @@
     el.disabled = !enabled;
   }
 
+  // "Iniciar" e "Baixar para offline" enviam o mesmo formulario
+  function setStartEnabled(enabled) {
+    setEnabled(btnIniciar, enabled);
+    setEnabled(btnOffline, enabled);
+  }
+
   function showError(msg) {
     statsError.textContent = msg;
     statsError.classList.remove("is-hidden");
@@ -229,7 +236,7 @@
     statDificil.textContent = String(d);
 
     const okToStart = Number(totalDisponivel || 0) > 0;
-    setEnabled(btnIniciar, okToStart);
+    setStartEnabled(okToStart);
     setEnabled(qtd, true);
     setEnabled(dificuldade, true);
     setEnabled(comImagem, true);
@@ -268,7 +275,7 @@
 
     if (!cursoId) {
       modulo.innerHTML = `<option value="">Selecione um curso primeiro...</option>`;
-      setEnabled(btnIniciar, false);
+      setStartEnabled(false);
       setHint(getMsg("selecione_curso", "Selecione um curso para ver as estatísticas."));
       return;
     }
@@ -278,7 +285,7 @@
       await refreshStats();
     } catch (e) {
       showError(e.message);
-      setEnabled(btnIniciar, false);
+      setStartEnabled(false);
       setHint(getMsg("erro_generico", "Falha ao carregar dados."));
     }
   });
@@ -289,7 +296,7 @@
         await refreshStats();
       } catch (e) {
         showError(e.message);
-        setEnabled(btnIniciar, false);
+        setStartEnabled(false);
         setHint(getMsg("erro_generico", "Falha ao carregar estatísticas."));
       }
     });
@@ -309,7 +316,7 @@
   setEnabled(qtd, false);
   setEnabled(comImagem, false);
   setEnabled(soPlacas, false);
-  setEnabled(btnIniciar, false);
+  setStartEnabled(false);
   setEnabled(btnLimpar, false);
   if (modo) setEnabled(modo, false);
   applyLockState(true);